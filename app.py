@@ -21,10 +21,14 @@ from sections.resumen_rebano import show_resumen_rebano
 
 # Import export functions
 from exporters import export_to_word, export_to_excel
+from jobs import init_jobs
 
 # Initialize database
 db.create_tables()
 
+# Recover background jobs interrupted by a restart
+init_jobs()
+
 # Ensure data directory exists (for backward compatibility)
 if not os.path.exists("data"):
     os.makedirs("data")
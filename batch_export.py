@@ -0,0 +1,104 @@
+import os
+import shutil
+import tempfile
+import zipfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+import database as db
+from utils import format_filename
+
+# Formats that can be produced per farm
+FARM_FORMATS = ('xlsx', 'docx', 'pdf')
+
+def _init_worker():
+    """Drop database connections inherited from the parent process"""
+    db.engine.dispose(close=False)
+
+def _export_farm(farm_id, farm_name, formats, out_dir):
+    """Write the requested reports of one farm to out_dir (runs in a worker process)"""
+    # Imported here so worker processes only load the report builders they need
+    from exporters import build_word_report, write_excel_workbook
+    
+    folder = f"{format_filename(farm_name) or 'tambo'}_{farm_id[:8]}"
+    base_name = f"FieldLens_{format_filename(farm_name) or 'tambo'}"
+    os.makedirs(os.path.join(out_dir, folder), exist_ok=True)
+    
+    files = []
+    if 'xlsx' in formats:
+        arcname = f"{folder}/{base_name}.xlsx"
+        write_excel_workbook(os.path.join(out_dir, arcname), farm_id=farm_id)
+        files.append(arcname)
+    if 'docx' in formats:
+        arcname = f"{folder}/{base_name}.docx"
+        with open(os.path.join(out_dir, arcname), 'wb') as f:
+            f.write(build_word_report(farm_id))
+        files.append(arcname)
+    if 'pdf' in formats:
+        # Fonts and page defaults are loaded on the first report of each worker
+        from pdf_report import build_pdf_report
+        arcname = f"{folder}/{base_name}.pdf"
+        with open(os.path.join(out_dir, arcname), 'wb') as f:
+            f.write(build_pdf_report(farm_id))
+        files.append(arcname)
+    return files
+
+def run_batch_export(zip_path, farm_ids=None, formats=('xlsx', 'docx'), consolidated=False, workers=None, progress=None):
+    """Export reports for many farms in parallel and stream them into one ZIP file
+    
+    Each worker writes the reports of one farm to a scratch directory; the
+    parent moves every finished file into the archive and deletes it, so disk
+    usage stays bounded. With consolidated=True a single workbook with one
+    sheet per section (and a farm column) is added as well.
+    progress(done, total) is called after each farm; an exception raised by it
+    (e.g. a job cancellation) stops the export.
+    """
+    from exporters import write_excel_workbook
+    
+    farms = db.list_farms()
+    if farm_ids is not None:
+        farms = [(farm_id, name) for farm_id, name in farms if farm_id in set(farm_ids)]
+    
+    total = len(farms) + (1 if consolidated else 0)
+    done = 0
+    scratch_dir = tempfile.mkdtemp(prefix='fieldlens_batch_')
+    
+    try:
+        with zipfile.ZipFile(zip_path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            if consolidated:
+                arcname = f"FieldLens_consolidado_{datetime.now().strftime('%Y%m%d')}.xlsx"
+                path = os.path.join(scratch_dir, arcname)
+                write_excel_workbook(path, all_farms=True)
+                archive.write(path, arcname)
+                os.remove(path)
+                done += 1
+                if progress:
+                    progress(done, total)
+            
+            if farms and formats:
+                with ProcessPoolExecutor(
+                    max_workers=workers or os.cpu_count() or 1,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker
+                ) as executor:
+                    futures = [
+                        executor.submit(_export_farm, farm_id, name, tuple(formats), scratch_dir)
+                        for farm_id, name in farms
+                    ]
+                    try:
+                        for future in as_completed(futures):
+                            for arcname in future.result():
+                                path = os.path.join(scratch_dir, arcname)
+                                archive.write(path, arcname)
+                                os.remove(path)
+                            done += 1
+                            if progress:
+                                progress(done, total)
+                    except BaseException:
+                        # Don't render the remaining farms when the export fails or is cancelled
+                        executor.shutdown(wait=False, cancel_futures=True)
+                        raise
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+    
+    return zip_path
@@ -0,0 +1,165 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+from sqlalchemy import select, func
+import database as db
+from emissions import get_farm_factor_set_ids
+from kpis import get_farm_kpis, refresh_kpis, KPI_SECTIONS
+
+# KPI key -> (label, unit, higher is better; None when neither direction is better)
+KPIS = {
+    'produccion_por_vaca': ("Producción por vaca", "l/vaca/día", True),
+    'animales_por_ha': ("Carga animal", "animales/ha", None),
+    'diesel_por_litro': ("Diesel por litro de leche", "L diesel/L leche", False),
+    'agua_por_vaca': ("Agua por vaca", "consumo/vaca en ordeñe", False),
+    'huella_fpcm': ("Huella de carbono", "kg CO2e/kg FPCM", False)
+}
+
+# Herd size classes by milking cows
+SIZE_BINS = [0, 100, 300, 600, np.inf]
+SIZE_LABELS = ["Chico (<100 VO)", "Mediano (100-299 VO)", "Grande (300-599 VO)", "Muy grande (600+ VO)"]
+
+# Peer groups from the most to the least specific
+PEER_GROUPS = [
+    ('raza', 'ciudad'),
+    ('raza', 'tamaño'),
+    ('raza',),
+    ('ciudad',),
+    ('tamaño',),
+    ()
+]
+
+# Smallest peer group that is reported
+MIN_PEERS = 5
+
+# Sections the KPIs are computed from
+BENCHMARK_SECTIONS = KPI_SECTIONS + ['riego']
+
+def _latest_per_farm(session, model, column):
+    """Value of a column in the most recent row of each farm"""
+    ranked = select(
+        model.farm_id,
+        column.label('value'),
+        func.row_number().over(partition_by=model.farm_id, order_by=model.created_at.desc()).label('rank')
+    ).subquery()
+    rows = session.execute(select(ranked.c.farm_id, ranked.c.value).where(ranked.c.rank == 1)).all()
+    return pd.Series(dict(rows), dtype=float)
+
+def load_farm_kpis():
+    """KPIs of every farm from SQL aggregates (one row per farm)"""
+    session = db.get_session()
+    try:
+        farms = pd.DataFrame(session.execute(select(
+            db.Farm.id, db.Farm.breed, db.Farm.city, db.Farm.total_area,
+            db.Farm.production_per_cow, db.Farm.milking_cows
+        )).all(), columns=['farm_id', 'raza', 'ciudad', 'total_area', 'production_per_cow', 'milking_cows'])
+        animals = pd.Series(dict(session.execute(
+            select(db.Herd.farm_id, func.sum(db.Herd.animal_count)).group_by(db.Herd.farm_id)
+        ).all()), dtype=float)
+        diesel = _latest_per_farm(session, db.Energy, db.Energy.diesel_consumption)
+        water = _latest_per_farm(session, db.Irrigation, db.Irrigation.total_consumption)
+    finally:
+        session.close()
+
+    farms = farms.set_index('farm_id')
+    for col in ['total_area', 'production_per_cow', 'milking_cows']:
+        farms[col] = pd.to_numeric(farms[col], errors='coerce')
+
+    # Zero denominators mean the data is missing, not an infinite KPI
+    area = farms['total_area'].where(farms['total_area'] > 0)
+    cows = farms['milking_cows'].where(farms['milking_cows'] > 0)
+    yearly_milk = (farms['production_per_cow'] * cows * 365).where(lambda liters: liters > 0)
+
+    kpis = pd.DataFrame(index=farms.index)
+    kpis['raza'] = farms['raza'].fillna('').str.strip().str.title().replace('', 'Sin dato')
+    kpis['ciudad'] = farms['ciudad'].fillna('').str.strip().str.title().replace('', 'Sin dato')
+    kpis['tamaño'] = pd.cut(farms['milking_cows'], SIZE_BINS, labels=SIZE_LABELS, right=False).astype(object).fillna('Sin dato')
+    kpis['produccion_por_vaca'] = farms['production_per_cow'].where(farms['production_per_cow'] > 0)
+    kpis['animales_por_ha'] = animals.reindex(farms.index) / area
+    kpis['diesel_por_litro'] = diesel.reindex(farms.index) / yearly_milk
+    kpis['agua_por_vaca'] = water.reindex(farms.index) / cows
+    # The footprint comes precomputed from the KPI pipeline
+    kpis['huella_fpcm'] = get_farm_kpis()['co2e_per_kg_fpcm'].reindex(farms.index)
+    return kpis
+
+def compute_percentiles(kpis):
+    """Percentile rank and peer count of every farm and KPI within each peer group
+
+    Returns a dict keyed by peer group with a frame of '<kpi>_pct' and
+    '<kpi>_n' columns indexed by farm id.
+    """
+    tables = {}
+    kpi_columns = list(KPIS)
+    for group in PEER_GROUPS:
+        if group:
+            grouped = kpis.groupby(list(group), sort=False)[kpi_columns]
+            percentiles = grouped.rank(pct=True) * 100
+            counts = grouped.transform('count')
+        else:
+            percentiles = kpis[kpi_columns].rank(pct=True) * 100
+            counts = pd.DataFrame(
+                np.broadcast_to(kpis[kpi_columns].notna().sum().to_numpy(), percentiles.shape),
+                index=kpis.index, columns=kpi_columns
+            )
+        tables[group] = pd.concat([percentiles.add_suffix('_pct'), counts.add_suffix('_n')], axis=1)
+    return tables
+
+def benchmark_version():
+    """Cache key of the benchmarks: section data versions, factor sets in use and the last KPI computation
+
+    Stale KPIs are refreshed first, so the key already reflects the
+    footprints the benchmarks will read.
+    """
+    refresh_kpis()
+    session = db.get_session()
+    try:
+        computed_at = session.scalar(select(func.max(db.FarmKpi.computed_at)))
+    finally:
+        session.close()
+    factor_sets = tuple(sorted(get_farm_factor_set_ids().unique().tolist()))
+    return db.get_data_version(BENCHMARK_SECTIONS), factor_sets, computed_at
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def get_benchmarks(version):
+    """KPIs and percentile tables of all farms, cached per data version"""
+    kpis = load_farm_kpis()
+    return kpis, compute_percentiles(kpis)
+
+def describe_peer_group(group, farm):
+    """Readable name of a peer group, e.g. 'tambos Holstein en Córdoba'"""
+    parts = ["tambos"]
+    if 'raza' in group:
+        parts.append(farm['raza'])
+    if 'tamaño' in group:
+        parts.append(farm['tamaño'].split(' (')[0].lower())
+    if 'ciudad' in group:
+        parts.append(f"en {farm['ciudad']}")
+    return " ".join(parts) if group else "todos los tambos"
+
+def benchmark_farm(farm_id):
+    """Position of a farm against its most specific peer group with enough farms, per KPI"""
+    kpis, tables = get_benchmarks(benchmark_version())
+    if farm_id not in kpis.index:
+        return []
+
+    farm = kpis.loc[farm_id]
+    results = []
+    for kpi, (label, unit, higher_is_better) in KPIS.items():
+        value = farm[kpi]
+        if pd.isna(value):
+            continue
+        for group in PEER_GROUPS:
+            row = tables[group].loc[farm_id]
+            if row[f"{kpi}_n"] >= MIN_PEERS or not group:
+                results.append({
+                    'kpi': kpi,
+                    'label': label,
+                    'unit': unit,
+                    'value': value,
+                    'percentile': row[f"{kpi}_pct"],
+                    'peers': int(row[f"{kpi}_n"]),
+                    'peer_group': describe_peer_group(group, farm),
+                    'higher_is_better': higher_is_better
+                })
+                break
+    return results
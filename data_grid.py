@@ -0,0 +1,102 @@
+import re
+import streamlit as st
+from sqlalchemy import Integer, Float
+import database as db
+
+PAGE_SIZES = [25, 50, 100, 250]
+
+# Numeric filters accept an optional comparison before the number, e.g. ">= 100"
+NUMERIC_FILTER = re.compile(r'^\s*(>=|<=|>|<|=)?\s*(-?\d+(?:[.,]\d+)?)\s*$')
+
+DEFAULT_SORT = "(orden de carga)"
+NO_FILTER = "(ninguna)"
+
+def is_numeric_column(section, column):
+    """Check whether a CSV column of a section is stored as a number"""
+    attribute = db.SECTION_COLUMNS[section].get(column)
+    if attribute is None:
+        return False
+    column_type = db.SECTION_MODELS[section].__table__.columns[attribute].type
+    return isinstance(column_type, (Integer, Float))
+
+def parse_filter(section, column, value):
+    """Turn the filter text into a (column, operator, value) filter, or None if invalid"""
+    value = value.strip()
+    if not value:
+        return None
+    if not is_numeric_column(section, column):
+        return (column, 'contains', value)
+
+    match = NUMERIC_FILTER.match(value)
+    if not match:
+        return None
+    return (column, match.group(1) or '=', float(match.group(2).replace(',', '.')))
+
+@st.fragment
+def show_data_grid(section, farm_id=None, include_farm=False, key=None):
+    """Paginated table of a section; paging, sorting and filtering run in the database
+
+    Only the visible page is queried and sent to the browser, and the controls
+    rerun just this fragment instead of the whole page.
+    """
+    key = key or f"grid_{section}"
+    columns = db.get_section_columns(section, include_farm=include_farm)
+
+    col1, col2, col3, col4 = st.columns([2, 1, 2, 2])
+    with col1:
+        sort_by = st.selectbox("Ordenar por", [DEFAULT_SORT] + columns, key=f"{key}_sort")
+    with col2:
+        descending = st.toggle("Descendente", key=f"{key}_desc")
+    with col3:
+        filter_column = st.selectbox("Filtrar por", [NO_FILTER] + columns, key=f"{key}_filter_column")
+    with col4:
+        filter_value = st.text_input(
+            "Valor del filtro",
+            key=f"{key}_filter_value",
+            disabled=filter_column == NO_FILTER,
+            help="Texto a buscar, o un número con >, >=, <, <= o = para columnas numéricas"
+        )
+
+    filters = []
+    if filter_column != NO_FILTER and filter_value.strip():
+        parsed = parse_filter(section, filter_column, filter_value)
+        if parsed is None:
+            st.warning("⚠️ Filtro numérico inválido. Use por ejemplo: >= 100")
+        else:
+            filters.append(parsed)
+
+    total = db.count_section_rows(section, farm_id, include_farm, filters)
+    if total == 0:
+        st.info("No hay registros que coincidan.")
+        return
+
+    col1, col2, col3 = st.columns([1, 1, 2])
+    with col1:
+        page_size = st.selectbox("Filas por página", PAGE_SIZES, index=1, key=f"{key}_page_size")
+    pages = max(1, -(-total // page_size))
+
+    # Go back to the first page whenever the query changes
+    signature = (sort_by, descending, tuple(filters), page_size)
+    if st.session_state.get(f"{key}_signature") != signature:
+        st.session_state[f"{key}_signature"] = signature
+        st.session_state[f"{key}_page"] = 1
+    st.session_state[f"{key}_page"] = min(st.session_state.get(f"{key}_page", 1), pages)
+
+    with col2:
+        page = st.number_input("Página", min_value=1, max_value=pages, step=1, key=f"{key}_page")
+
+    offset = (page - 1) * page_size
+    page_df = db.get_section_page(
+        section,
+        farm_id=farm_id,
+        include_farm=include_farm,
+        filters=filters,
+        sort_by=None if sort_by == DEFAULT_SORT else sort_by,
+        descending=descending,
+        limit=page_size,
+        offset=offset
+    )
+
+    with col3:
+        st.caption(f"Mostrando {offset + 1}–{offset + len(page_df)} de {total} registros")
+    st.dataframe(page_df, hide_index=True, use_container_width=True)
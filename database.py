@@ -1,25 +1,31 @@
 import os
 import pandas as pd
-from sqlalchemy import create_engine, Column, String, Integer, Float, Boolean, DateTime, Text, ForeignKey
+from sqlalchemy import create_engine, Column, String, Integer, Float, Boolean, DateTime, Text, ForeignKey, insert, update, select, inspect, text, func
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 import datetime
+import hashlib
 import uuid
 
 # Create engine using the DATABASE_URL environment variable
-try:
-    # Try to connect with SSL parameters first
-    engine = create_engine(os.environ['DATABASE_URL'], connect_args={'sslmode': 'require'})
-except Exception as e:
+database_url = os.environ.get('DATABASE_URL', '')
+if database_url.startswith('sqlite'):
+    # Local SQLite file (tests, offline copies); SSL options do not apply
+    engine = create_engine(database_url)
+else:
     try:
-        # Try with SSL disabled if first attempt fails
-        engine = create_engine(os.environ['DATABASE_URL'], connect_args={'sslmode': 'disable'})
+        # Try to connect with SSL parameters first
+        engine = create_engine(os.environ['DATABASE_URL'], connect_args={'sslmode': 'require'})
     except Exception as e:
-        # Fallback to a SQLite database if PostgreSQL connection fails
-        print(f"Database connection error: {e}")
-        db_path = os.path.join(os.path.dirname(__file__), 'data', 'fieldlens.db')
-        os.makedirs(os.path.dirname(db_path), exist_ok=True)
-        engine = create_engine(f"sqlite:///{db_path}")
+        try:
+            # Try with SSL disabled if first attempt fails
+            engine = create_engine(os.environ['DATABASE_URL'], connect_args={'sslmode': 'disable'})
+        except Exception as e:
+            # Fallback to a SQLite database if PostgreSQL connection fails
+            print(f"Database connection error: {e}")
+            db_path = os.path.join(os.path.dirname(__file__), 'data', 'fieldlens.db')
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+            engine = create_engine(f"sqlite:///{db_path}")
 
 # Create declarative base
 Base = declarative_base()
@@ -35,6 +41,7 @@ class Farm(Base):
     id = Column(String, primary_key=True)
     name = Column(String, nullable=False)
     city = Column(String)
+    country = Column(String)
     breed = Column(String)
     year = Column(Integer)
     month = Column(String)
@@ -47,6 +54,7 @@ class Farm(Base):
     discard_percentage = Column(Integer)
     protein_percentage = Column(Float)
     fat_percentage = Column(Float)
+    content_hash = Column(String, index=True)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     
     # Relationships
@@ -65,13 +73,14 @@ class Surface(Base):
     __tablename__ = 'surfaces'
     
     id = Column(String, primary_key=True)
-    farm_id = Column(String, ForeignKey('farms.id'))
+    farm_id = Column(String, ForeignKey('farms.id'), index=True)
     crop = Column(String, nullable=False)
     season = Column(String)
     hectares = Column(Float)
     green_matter_productivity = Column(Float)
     waste_generated = Column(Float)
     waste_destination = Column(String)
+    content_hash = Column(String, index=True)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     
     # Relationship
@@ -82,12 +91,13 @@ class Management(Base):
     __tablename__ = 'management'
     
     id = Column(String, primary_key=True)
-    farm_id = Column(String, ForeignKey('farms.id'))
+    farm_id = Column(String, ForeignKey('farms.id'), index=True)
     tillage_type = Column(String)
     coverage_proportion = Column(Integer)
     no_coverage_proportion = Column(Integer)
     soil_changes = Column(String)
     soil_change_year = Column(Integer)
+    content_hash = Column(String, index=True)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     
     # Relationship
@@ -98,7 +108,7 @@ class Fertilization(Base):
     __tablename__ = 'fertilization'
     
     id = Column(String, primary_key=True)
-    farm_id = Column(String, ForeignKey('farms.id'))
+    farm_id = Column(String, ForeignKey('farms.id'), index=True)
     area = Column(String)
     hectares = Column(Float)
     type = Column(String)
@@ -109,6 +119,7 @@ class Fertilization(Base):
     use_inhibitors = Column(String)
     protected_urea = Column(String)
     n_adjustment = Column(String)
+    content_hash = Column(String, index=True)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     
     # Relationship
@@ -119,7 +130,7 @@ class CropProtection(Base):
     __tablename__ = 'crop_protection'
     
     id = Column(String, primary_key=True)
-    farm_id = Column(String, ForeignKey('farms.id'))
+    farm_id = Column(String, ForeignKey('farms.id'), index=True)
     area = Column(String)
     product = Column(String)
     category = Column(String)
@@ -127,6 +138,7 @@ class CropProtection(Base):
     active_ingredient_percentage = Column(Float)
     dose = Column(Float)
     active_ingredient = Column(String)
+    content_hash = Column(String, index=True)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     
     # Relationship
@@ -137,7 +149,7 @@ class Irrigation(Base):
     __tablename__ = 'irrigation'
     
     id = Column(String, primary_key=True)
-    farm_id = Column(String, ForeignKey('farms.id'))
+    farm_id = Column(String, ForeignKey('farms.id'), index=True)
     source_type = Column(String)
     total_consumption = Column(Float)
     drinking_use = Column(Integer)
@@ -146,6 +158,7 @@ class Irrigation(Base):
     water_permit = Column(String)
     irrigation_monitoring = Column(String)
     irrigation_events = Column(Text)
+    content_hash = Column(String, index=True)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     
     # Relationship
@@ -156,7 +169,7 @@ class Energy(Base):
     __tablename__ = 'energy'
     
     id = Column(String, primary_key=True)
-    farm_id = Column(String, ForeignKey('farms.id'))
+    farm_id = Column(String, ForeignKey('farms.id'), index=True)
     diesel_consumption = Column(Float)
     gasoline_consumption = Column(Float)
     gnc_consumption = Column(Float)
@@ -165,6 +178,7 @@ class Energy(Base):
     solar_panels_capacity = Column(Float)
     use_biodigesters = Column(String)
     biodigesters_capacity = Column(Float)
+    content_hash = Column(String, index=True)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     
     # Relationship
@@ -175,7 +189,7 @@ class Herd(Base):
     __tablename__ = 'herd'
     
     id = Column(String, primary_key=True)
-    farm_id = Column(String, ForeignKey('farms.id'))
+    farm_id = Column(String, ForeignKey('farms.id'), index=True)
     category = Column(String)
     animal_count = Column(Integer)
     average_weight = Column(Float)
@@ -184,6 +198,7 @@ class Herd(Base):
     pasture_percentage = Column(Integer)
     concentrate_percentage = Column(Integer)
     others_percentage = Column(Integer)
+    content_hash = Column(String, index=True)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     
     # Relationship
@@ -194,13 +209,14 @@ class Effluent(Base):
     __tablename__ = 'effluents'
     
     id = Column(String, primary_key=True)
-    farm_id = Column(String, ForeignKey('farms.id'))
+    farm_id = Column(String, ForeignKey('farms.id'), index=True)
     sector = Column(String)
     hours_per_day = Column(Integer)
     excreta_management = Column(String)
     separation_efficiency = Column(Integer)
     liquid_destination = Column(String)
     solid_destination = Column(String)
+    content_hash = Column(String, index=True)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     
     # Relationship
@@ -211,7 +227,7 @@ class Transport(Base):
     __tablename__ = 'transport'
     
     id = Column(String, primary_key=True)
-    farm_id = Column(String, ForeignKey('farms.id'))
+    farm_id = Column(String, ForeignKey('farms.id'), index=True)
     transported_product = Column(String)
     origin = Column(String)
     destination = Column(String)
@@ -220,20 +236,567 @@ class Transport(Base):
     frequency = Column(String)
     fuel_type = Column(String)
     average_load = Column(Float)
+    content_hash = Column(String, index=True)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     
     # Relationship
     farm = relationship("Farm", back_populates="transport")
 
+class ImportCheckpoint(Base):
+    """Progress of a CSV import, committed together with each imported chunk"""
+    __tablename__ = 'import_checkpoints'
+    
+    source = Column(String, primary_key=True)
+    file_size = Column(Integer)
+    file_mtime = Column(Float)
+    rows_done = Column(Integer, default=0)
+    completed = Column(Boolean, default=False)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
+class SectionState(Base):
+    """Data version and row count of each section per farm, updated by every write and delete"""
+    __tablename__ = 'section_state'
+    
+    farm_id = Column(String, primary_key=True)
+    section = Column(String, primary_key=True)
+    version = Column(Integer, default=0, nullable=False)
+    row_count = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class Job(Base):
+    """Background job (exports, imports, recomputations) and its progress"""
+    __tablename__ = 'jobs'
+    
+    id = Column(String, primary_key=True)
+    kind = Column(String, nullable=False)
+    label = Column(String)
+    status = Column(String, default='queued', index=True)
+    progress = Column(Float, default=0.0)
+    message = Column(String)
+    result_path = Column(String)
+    error = Column(Text)
+    cancel_requested = Column(Boolean, default=False)
+    # Server process running the job ("host:pid:token") and its last sign of life
+    owner = Column(String, index=True)
+    heartbeat_at = Column(DateTime)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
+class EmissionFactorSet(Base):
+    """Versioned set of emission factors; each farm uses the active set for its year"""
+    __tablename__ = 'emission_factor_sets'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    name = Column(String, nullable=False)
+    country = Column(String)
+    year = Column(Integer)
+    version = Column(Integer, default=1, nullable=False)
+    active = Column(Boolean, default=True, index=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class EmissionFactor(Base):
+    """One factor (e.g. kg CO2e per liter of diesel) of a factor set"""
+    __tablename__ = 'emission_factors'
+    
+    set_id = Column(Integer, ForeignKey('emission_factor_sets.id'), primary_key=True)
+    key = Column(String, primary_key=True)
+    value = Column(Float, nullable=False)
+    unit = Column(String)
+
+class EmissionResult(Base):
+    """Emissions of a farm by source (kg CO2e per year), recomputed in batch"""
+    __tablename__ = 'emission_results'
+    
+    farm_id = Column(String, primary_key=True)
+    source = Column(String, primary_key=True)
+    co2e_kg = Column(Float)
+    factor_set_id = Column(Integer)
+    computed_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class FarmKpi(Base):
+    """Production and carbon footprint KPIs of a farm period, written by the KPI pipeline"""
+    __tablename__ = 'farm_kpis'
+    
+    farm_id = Column(String, primary_key=True)
+    year = Column(Integer)
+    month = Column(String)
+    milk_liters = Column(Float)
+    fpcm_kg = Column(Float)
+    animals = Column(Integer)
+    co2e_kg = Column(Float)
+    co2e_energy_kg = Column(Float)
+    co2e_transport_kg = Column(Float)
+    co2e_methane_kg = Column(Float)
+    co2e_n2o_kg = Column(Float)
+    co2e_per_liter = Column(Float)
+    co2e_per_kg_fpcm = Column(Float)
+    co2e_per_ha = Column(Float)
+    co2e_per_cow = Column(Float)
+    n_per_ha = Column(Float)
+    factor_set_id = Column(Integer)
+    computed_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+
+class DerivedMetric(Base):
+    """Stored value of a derived metric of a farm; marked dirty when one of its input sections changes"""
+    __tablename__ = 'derived_metrics'
+    
+    farm_id = Column(String, primary_key=True)
+    metric = Column(String, primary_key=True)
+    value = Column(Float)
+    dirty = Column(Boolean, default=False, nullable=False, index=True)
+    computed_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class MetricDependency(Base):
+    """Input section of a derived metric, so any writer can mark dependent metrics dirty"""
+    __tablename__ = 'metric_dependencies'
+    
+    metric = Column(String, primary_key=True)
+    section = Column(String, primary_key=True)
+
+# Map section keys to their model class
+SECTION_MODELS = {
+    'datos_generales': Farm,
+    'superficies_insumos': Surface,
+    'manejo': Management,
+    'fertilizacion': Fertilization,
+    'proteccion_cultivos': CropProtection,
+    'riego': Irrigation,
+    'energia': Energy,
+    'rebano': Herd,
+    'efluentes': Effluent,
+    'transporte': Transport
+}
+
+# Map CSV column names to model attribute names for every section
+SECTION_COLUMNS = {
+    'datos_generales': {
+        'nombre_tambo': 'name',
+        'ciudad': 'city',
+        'país': 'country',
+        'raza': 'breed',
+        'año': 'year',
+        'mes': 'month',
+        'sup_total': 'total_area',
+        'sup_vt': 'total_cows_area',
+        'produccion_ind': 'production_per_cow',
+        'vacas_ordeñe': 'milking_cows',
+        'venta_industria': 'industry_sales_percentage',
+        'uso_queseria': 'cheese_usage_percentage',
+        'descarte': 'discard_percentage',
+        'porcentaje_proteina': 'protein_percentage',
+        'porcentaje_grasa': 'fat_percentage'
+    },
+    'superficies_insumos': {
+        'cultivo': 'crop',
+        'temporada': 'season',
+        'hectareas': 'hectares',
+        'productividad_materia_verde': 'green_matter_productivity',
+        'residuos_generados': 'waste_generated',
+        'destino_residuos': 'waste_destination'
+    },
+    'manejo': {
+        'tipo_labranza': 'tillage_type',
+        'proporción_cobertura': 'coverage_proportion',
+        'proporción_suelo_sin_cobertura': 'no_coverage_proportion',
+        'manejo_suelos_cambios': 'soil_changes',
+        'año_cambio_manejo': 'soil_change_year'
+    },
+    'fertilizacion': {
+        'área': 'area',
+        'hectareas': 'hectares',
+        'tipo': 'type',
+        '%_área_total': 'area_percentage',
+        'cantidad_aplicada_kg_ha': 'applied_quantity_kg_ha',
+        'cantidad_aplicada_total': 'applied_quantity_total',
+        'método_aplicación': 'application_method',
+        'uso_inhibidores': 'use_inhibitors',
+        'urea_protegida': 'protected_urea',
+        'ajuste_por_N': 'n_adjustment'
+    },
+    'proteccion_cultivos': {
+        'área': 'area',
+        'producto': 'product',
+        'categoría': 'category',
+        'tipo_aplicacion': 'application_type',
+        '%_ingrediente_activo': 'active_ingredient_percentage',
+        'dosis': 'dose',
+        'ingrediente_activo': 'active_ingredient'
+    },
+    'riego': {
+        'tipo_fuente': 'source_type',
+        'consumo_total': 'total_consumption',
+        'uso_para_bebida': 'drinking_use',
+        'uso_para_limpieza': 'cleaning_use',
+        'uso_para_riego': 'irrigation_use',
+        'permiso_agua': 'water_permit',
+        'monitoreo_riego': 'irrigation_monitoring',
+        'eventos_riego': 'irrigation_events'
+    },
+    'energia': {
+        'consumo_diesel': 'diesel_consumption',
+        'consumo_gasolina': 'gasoline_consumption',
+        'consumo_GNC': 'gnc_consumption',
+        'consumo_electricidad': 'electricity_consumption',
+        'uso_paneles_solares': 'use_solar_panels',
+        'capacidad_paneles': 'solar_panels_capacity',
+        'uso_biodigestores': 'use_biodigesters',
+        'capacidad_biodigestores': 'biodigesters_capacity'
+    },
+    'rebano': {
+        'categoría': 'category',
+        'número_animales': 'animal_count',
+        'peso_promedio': 'average_weight',
+        'horas_pastoreo': 'grazing_hours',
+        'dieta_materia_seca': 'dry_matter_diet',
+        'porcentaje_pastura': 'pasture_percentage',
+        'porcentaje_concentrado': 'concentrate_percentage',
+        'porcentaje_otros': 'others_percentage'
+    },
+    'efluentes': {
+        'sector': 'sector',
+        'horas_dia': 'hours_per_day',
+        'manejo_excretas': 'excreta_management',
+        'eficiencia_separación': 'separation_efficiency',
+        'destino_liquidos': 'liquid_destination',
+        'destino_solidos': 'solid_destination'
+    },
+    'transporte': {
+        'producto_transportado': 'transported_product',
+        'inicio': 'origin',
+        'destino': 'destination',
+        'distancia_km': 'distance_km',
+        'tipo_vehiculo': 'vehicle_type',
+        'frecuencia': 'frequency',
+        'tipo_combustible': 'fuel_type',
+        'carga_promedio': 'average_load'
+    }
+}
+
 # Function to create all tables
 def create_tables():
     Base.metadata.create_all(engine)
+    upgrade_schema()
+    
+    # Row counts are only maintained from now on; count data written before
+    # section_state (or its row counts) existed once
+    session = get_session()
+    try:
+        uncounted = has_uncounted_sections(session)
+    finally:
+        session.close()
+    if uncounted:
+        rebuild_section_counts()
+
+def upgrade_schema():
+    """Add columns and indexes introduced after a table was first created
+    
+    Returns the (table, column) pairs that were added.
+    """
+    inspector = inspect(engine)
+    added_columns = []
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing_columns:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+                    added_columns.append((table.name, column.name))
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+    return added_columns
 
 # Data handling functions
 def get_session():
     """Get a new database session"""
     return Session()
 
+def _count_section_rows(session, section, farm_ids=None):
+    """Rows stored per farm in a section (only farms that have rows)"""
+    model = SECTION_MODELS[section]
+    farm_column = model.id if model is Farm else model.farm_id
+    query = select(farm_column, func.count()).where(farm_column.isnot(None)).group_by(farm_column)
+    if farm_ids is not None:
+        query = query.where(farm_column.in_(farm_ids))
+    return dict(session.execute(query).all())
+
+def touch_section(session, section, farm_ids):
+    """Bump the data version and recount the rows of a section for some farms in the caller's transaction"""
+    farm_ids = {farm_ids} if isinstance(farm_ids, str) else set(farm_ids)
+    farm_ids.discard(None)
+    if not farm_ids:
+        return
+    
+    now = datetime.datetime.utcnow()
+    existing = set(session.scalars(
+        select(SectionState.farm_id).where(SectionState.section == section, SectionState.farm_id.in_(farm_ids))
+    ))
+    # Recounting the touched farms (indexed by farm_id) keeps counts exact for inserts, updates and deletes
+    counts = _count_section_rows(session, section, farm_ids)
+    
+    if existing:
+        session.execute(
+            update(SectionState)
+            .where(SectionState.section == section, SectionState.farm_id.in_(existing))
+            .values(version=SectionState.version + 1, updated_at=now),
+            execution_options={'synchronize_session': False}
+        )
+        session.execute(update(SectionState), [
+            {'farm_id': farm_id, 'section': section, 'row_count': counts.get(farm_id, 0)}
+            for farm_id in existing
+        ])
+    
+    # Farms seen for the first time start at version 1
+    new_states = [
+        {'farm_id': farm_id, 'section': section, 'version': 1, 'row_count': counts.get(farm_id, 0), 'updated_at': now}
+        for farm_id in farm_ids - existing
+    ]
+    if new_states:
+        session.execute(insert(SectionState), new_states)
+    
+    mark_metrics_dirty(session, section, farm_ids)
+
+def mark_metrics_dirty(session, section, farm_ids=None):
+    """Flag the stored metrics that depend on a section (for some farms or all) for recomputation"""
+    dependents = select(MetricDependency.metric).where(MetricDependency.section == section)
+    query = update(DerivedMetric).where(DerivedMetric.metric.in_(dependents), DerivedMetric.dirty.is_(False))
+    if farm_ids is not None:
+        query = query.where(DerivedMetric.farm_id.in_(list(farm_ids)))
+    session.execute(query.values(dirty=True), execution_options={'synchronize_session': False})
+
+def has_uncounted_sections(session):
+    """Whether some farm has rows in a section without a counted section state for it"""
+    for section, model in SECTION_MODELS.items():
+        farm_column = model.id if model is Farm else model.farm_id
+        counted = select(SectionState.farm_id).where(SectionState.section == section, SectionState.row_count.isnot(None))
+        query = select(farm_column).where(farm_column.isnot(None), farm_column.not_in(counted)).limit(1)
+        if session.execute(query).first() is not None:
+            return True
+    return False
+
+def rebuild_section_counts():
+    """Recount every section for every farm (for data written before counts were kept)"""
+    session = get_session()
+    try:
+        for section in SECTION_MODELS:
+            counts = _count_section_rows(session, section)
+            states = set(session.scalars(select(SectionState.farm_id).where(SectionState.section == section)))
+            if states:
+                session.execute(update(SectionState), [
+                    {'farm_id': farm_id, 'section': section, 'row_count': counts.get(farm_id, 0)}
+                    for farm_id in states
+                ])
+            new_states = [
+                {'farm_id': farm_id, 'section': section, 'version': 1, 'row_count': count}
+                for farm_id, count in counts.items() if farm_id not in states
+            ]
+            if new_states:
+                session.execute(insert(SectionState), new_states)
+        session.commit()
+    finally:
+        session.close()
+
+def get_completeness(farm_id=None):
+    """Row counts per farm (index) and section (columns) from the section state table
+    
+    A single scan of section_state, so completeness of hundreds of farms does
+    not touch the section tables.
+    """
+    session = get_session()
+    query = select(SectionState.farm_id, SectionState.section, SectionState.row_count).where(SectionState.row_count > 0)
+    if farm_id is not None:
+        query = query.where(SectionState.farm_id == farm_id)
+    rows = session.execute(query).all()
+    session.close()
+    
+    counts = pd.DataFrame(rows, columns=['farm_id', 'section', 'row_count'])
+    counts = counts.pivot(index='farm_id', columns='section', values='row_count')
+    return counts.reindex(columns=list(SECTION_MODELS)).fillna(0).astype(int)
+
+def get_section_versions(farm_id=None):
+    """Sorted (farm_id, section, version) rows for one farm or for all farms"""
+    session = get_session()
+    query = select(SectionState.farm_id, SectionState.section, SectionState.version)
+    if farm_id is not None:
+        query = query.where(SectionState.farm_id == farm_id)
+    versions = sorted(tuple(row) for row in session.execute(query))
+    session.close()
+    return versions
+
+def get_data_version(sections=None):
+    """Cheap fingerprint of the data of some sections across all farms
+    
+    Every write or delete bumps a section version, so the total changes whenever
+    any farm's data in those sections changes.
+    """
+    session = get_session()
+    query = select(func.count(), func.coalesce(func.sum(SectionState.version), 0), func.max(SectionState.updated_at))
+    if sections is not None:
+        query = query.where(SectionState.section.in_(sections))
+    version = tuple(session.execute(query).one())
+    session.close()
+    return version
+
+# Column map_section_frame adds to flag ids it generated (rows without an id in the source)
+GENERATED_ID = '_generated_id'
+
+def map_section_frame(section, df, keep_created_at=False):
+    """Rename and coerce a CSV dataframe into model columns for a section
+    
+    created_at is dropped (rows are stamped when written) unless
+    keep_created_at is set, e.g. for a database export being restored;
+    missing timestamps are then filled with the current time.
+    """
+    model = SECTION_MODELS[section]
+    columns = SECTION_COLUMNS[section]
+    
+    # Rename CSV columns to model attributes and keep only known ones
+    mapped = df.rename(columns=columns)
+    if 'uuid' in mapped.columns:
+        mapped = mapped.rename(columns={'uuid': 'id'})
+    keep = [col for col in mapped.columns if col in model.__table__.columns and (keep_created_at or col != 'created_at')]
+    mapped = mapped[keep].copy()
+    if 'created_at' in mapped.columns:
+        mapped['created_at'] = pd.to_datetime(mapped['created_at'], errors='coerce').fillna(pd.Timestamp(datetime.datetime.utcnow()))
+    
+    # Generate ids for rows that don't have one
+    if 'id' not in mapped.columns:
+        mapped['id'] = None
+    missing_ids = mapped['id'].isna()
+    if missing_ids.any():
+        mapped.loc[missing_ids, 'id'] = [str(uuid.uuid4()) for _ in range(int(missing_ids.sum()))]
+    mapped = mapped.drop_duplicates(subset='id', keep='last')
+    
+    # Coerce each column to the type declared on the model
+    for col in mapped.columns:
+        column_type = model.__table__.columns[col].type
+        if isinstance(column_type, Integer):
+            mapped[col] = pd.to_numeric(mapped[col], errors='coerce').round().astype('Int64')
+        elif isinstance(column_type, Float):
+            mapped[col] = pd.to_numeric(mapped[col], errors='coerce')
+        elif isinstance(column_type, (String, Text)):
+            mapped[col] = mapped[col].where(mapped[col].isna(), mapped[col].astype(str))
+    
+    # Required text columns default to an empty string like the add_* functions
+    for col in model.__table__.columns:
+        if not col.nullable and not col.primary_key:
+            mapped[col.name] = mapped[col.name].fillna('') if col.name in mapped.columns else ''
+    
+    # upsert_records matches rows that came without an id by their content
+    mapped[GENERATED_ID] = missing_ids.reindex(mapped.index)
+    return mapped
+
+def frame_to_records(df):
+    """Convert a mapped dataframe to a list of dicts with None for missing values"""
+    return df.astype(object).where(df.notna(), None).to_dict('records')
+
+def compute_content_hashes(section, df):
+    """Fingerprint records by a hash of their normalized content (ids excluded)"""
+    model = SECTION_MODELS[section]
+    columns = sorted(SECTION_COLUMNS[section].values())
+    if section != 'datos_generales':
+        columns = ['farm_id'] + columns
+    
+    # Normalize every column to text so equal values always hash the same
+    parts = []
+    for col in columns:
+        if col not in df.columns:
+            parts.append(pd.Series('', index=df.index))
+            continue
+        column_type = model.__table__.columns[col].type
+        if isinstance(column_type, Integer):
+            values = pd.to_numeric(df[col], errors='coerce').round().astype('Int64')
+        elif isinstance(column_type, Float):
+            values = pd.to_numeric(df[col], errors='coerce').round(6)
+        else:
+            values = df[col].where(df[col].isna(), df[col].astype(str).str.strip().str.lower())
+        parts.append(values.astype(str).where(values.notna(), ''))
+    
+    joined = parts[0].str.cat(parts[1:], sep='\x1f')
+    return joined.map(lambda value: hashlib.sha1(value.encode('utf-8')).hexdigest())
+
+def set_content_hash(section, obj):
+    """Store the content hash of a model instance before it is saved"""
+    columns = ['farm_id'] + list(SECTION_COLUMNS[section].values())
+    record = {col: getattr(obj, col, None) for col in columns}
+    obj.content_hash = compute_content_hashes(section, pd.DataFrame([record])).iloc[0]
+
+def upsert_records(session, section, records, claimed=None):
+    """Write only the delta of a batch: insert new records, update changed ones, skip the rest
+    
+    Records that carry an id are matched by id only: updated when their
+    content hash changed, skipped when it did not, inserted otherwise.
+    Records whose id was generated on import (no id in the source) are
+    matched by content instead, one stored row per record, so a repeated
+    import does not duplicate them while legitimately repeated rows (two
+    identical routes) are all kept. Those matches are counted as duplicates
+    and their id is reported in id_map so related rows can point at the
+    stored one. claimed collects the stored ids already matched or written,
+    so it can be shared by the batches of one import.
+    """
+    result = {'inserted': 0, 'updated': 0, 'skipped': 0, 'duplicates': 0, 'id_map': {}}
+    if not records:
+        return result
+    claimed = set() if claimed is None else claimed
+    
+    model = SECTION_MODELS[section]
+    generated = [bool(record.pop(GENERATED_ID, False)) for record in records]
+    hashes = compute_content_hashes(section, pd.DataFrame.from_records(records))
+    for record, content_hash in zip(records, hashes):
+        record['content_hash'] = content_hash
+    
+    ids = [record['id'] for record, is_generated in zip(records, generated) if not is_generated]
+    existing_by_id = dict(session.execute(
+        select(model.id, model.content_hash).where(model.id.in_(ids))
+    ).all()) if ids else {}
+    
+    # Stored rows that records without a source id may correspond to
+    generated_hashes = {content_hash for content_hash, is_generated in zip(hashes, generated) if is_generated}
+    stored_by_hash = {}
+    if generated_hashes:
+        for content_hash, stored_id in session.execute(
+            select(model.content_hash, model.id).where(model.content_hash.in_(generated_hashes))
+        ):
+            if stored_id not in claimed:
+                stored_by_hash.setdefault(content_hash, []).append(stored_id)
+    
+    new_records = []
+    changed_records = []
+    for record, is_generated in zip(records, generated):
+        if not is_generated:
+            if record['id'] not in existing_by_id:
+                new_records.append(record)
+            elif existing_by_id[record['id']] == record['content_hash']:
+                result['skipped'] += 1
+            else:
+                changed_records.append(record)
+        elif stored_by_hash.get(record['content_hash']):
+            stored_id = stored_by_hash[record['content_hash']].pop(0)
+            claimed.add(stored_id)
+            result['duplicates'] += 1
+            result['id_map'][record['id']] = stored_id
+        else:
+            new_records.append(record)
+    claimed.update(record['id'] for record in new_records + changed_records)
+    
+    if new_records:
+        session.execute(insert(model), new_records)
+    if changed_records:
+        session.execute(update(model), changed_records)
+    
+    written = new_records + changed_records
+    farm_key = 'id' if model is Farm else 'farm_id'
+    touch_section(session, section, (record[farm_key] for record in written))
+    
+    result['inserted'] = len(new_records)
+    result['updated'] = len(changed_records)
+    return result
+
+def get_farm_ids_by_name(session):
+    """Map farm names to ids (most recent farm wins for duplicated names)"""
+    farms = session.execute(select(Farm.name, Farm.id).order_by(Farm.created_at)).all()
+    return {name: farm_id for name, farm_id in farms}
+
 def add_farm(farm_data):
     """Add a new farm or update existing farm data"""
     session = get_session()
@@ -250,6 +813,7 @@ def add_farm(farm_data):
                 mapped_key = {
                     'nombre_tambo': 'name',
                     'ciudad': 'city',
+                    'país': 'country',
                     'raza': 'breed',
                     'año': 'year',
                     'mes': 'month',
@@ -266,12 +830,14 @@ def add_farm(farm_data):
                 
                 if hasattr(existing_farm, mapped_key):
                     setattr(existing_farm, mapped_key, value)
+        set_content_hash('datos_generales', existing_farm)
     else:
         # Create new farm
         new_farm = Farm(
             id=farm_id,
             name=farm_data.get('nombre_tambo', ''),
             city=farm_data.get('ciudad', ''),
+            country=farm_data.get('país'),
             breed=farm_data.get('raza', ''),
             year=farm_data.get('año', None),
             month=farm_data.get('mes', ''),
@@ -285,8 +851,10 @@ def add_farm(farm_data):
             protein_percentage=farm_data.get('porcentaje_proteina', 0.0),
             fat_percentage=farm_data.get('porcentaje_grasa', 0.0)
         )
+        set_content_hash('datos_generales', new_farm)
         session.add(new_farm)
     
+    touch_section(session, 'datos_generales', farm_id)
     session.commit()
     farm_id = farm_id  # Return the farm ID for reference in other tables
     session.close()
@@ -319,7 +887,9 @@ def add_surface(surface_data, farm_id=None):
         waste_destination=surface_data.get('destino_residuos', '')
     )
     
+    set_content_hash('superficies_insumos', new_surface)
     session.add(new_surface)
+    touch_section(session, 'superficies_insumos', farm_id)
     session.commit()
     surface_id = new_surface.id
     session.close()
@@ -351,7 +921,9 @@ def add_management(management_data, farm_id=None):
         soil_change_year=management_data.get('año_cambio_manejo', None)
     )
     
+    set_content_hash('manejo', new_management)
     session.add(new_management)
+    touch_section(session, 'manejo', farm_id)
     session.commit()
     management_id = new_management.id
     session.close()
@@ -388,7 +960,9 @@ def add_fertilization(fertilization_data, farm_id=None):
         n_adjustment=fertilization_data.get('ajuste_por_N', 'No')
     )
     
+    set_content_hash('fertilizacion', new_fertilization)
     session.add(new_fertilization)
+    touch_section(session, 'fertilizacion', farm_id)
     session.commit()
     fertilization_id = new_fertilization.id
     session.close()
@@ -422,7 +996,9 @@ def add_crop_protection(protection_data, farm_id=None):
         active_ingredient=protection_data.get('ingrediente_activo', '')
     )
     
+    set_content_hash('proteccion_cultivos', new_protection)
     session.add(new_protection)
+    touch_section(session, 'proteccion_cultivos', farm_id)
     session.commit()
     protection_id = new_protection.id
     session.close()
@@ -457,7 +1033,9 @@ def add_irrigation(irrigation_data, farm_id=None):
         irrigation_events=irrigation_data.get('eventos_riego', '')
     )
     
+    set_content_hash('riego', new_irrigation)
     session.add(new_irrigation)
+    touch_section(session, 'riego', farm_id)
     session.commit()
     irrigation_id = new_irrigation.id
     session.close()
@@ -492,7 +1070,9 @@ def add_energy(energy_data, farm_id=None):
         biodigesters_capacity=energy_data.get('capacidad_biodigestores', 0.0)
     )
     
+    set_content_hash('energia', new_energy)
     session.add(new_energy)
+    touch_section(session, 'energia', farm_id)
     session.commit()
     energy_id = new_energy.id
     session.close()
@@ -527,7 +1107,9 @@ def add_herd(herd_data, farm_id=None):
         others_percentage=herd_data.get('porcentaje_otros', 0)
     )
     
+    set_content_hash('rebano', new_herd)
     session.add(new_herd)
+    touch_section(session, 'rebano', farm_id)
     session.commit()
     herd_id = new_herd.id
     session.close()
@@ -560,7 +1142,9 @@ def add_effluent(effluent_data, farm_id=None):
         solid_destination=effluent_data.get('destino_solidos', '')
     )
     
+    set_content_hash('efluentes', new_effluent)
     session.add(new_effluent)
+    touch_section(session, 'efluentes', farm_id)
     session.commit()
     effluent_id = new_effluent.id
     session.close()
@@ -595,7 +1179,9 @@ def add_transport(transport_data, farm_id=None):
         average_load=transport_data.get('carga_promedio', 0.0)
     )
     
+    set_content_hash('transporte', new_transport)
     session.add(new_transport)
+    touch_section(session, 'transporte', farm_id)
     session.commit()
     transport_id = new_transport.id
     session.close()
@@ -621,6 +1207,7 @@ def get_farm_data(farm_id=None):
             'uuid': farm.id,
             'nombre_tambo': farm.name,
             'ciudad': farm.city,
+            'país': farm.country,
             'raza': farm.breed,
             'año': farm.year,
             'mes': farm.month,
@@ -929,19 +1516,19 @@ def get_transport_data(farm_id=None):
     session.close()
     return pd.DataFrame(data) if data else pd.DataFrame()
 
-def get_all_data():
-    """Get all data as a dictionary of dataframes"""
+def get_all_data(farm_id=None):
+    """Get all data as a dictionary of dataframes (for one farm if farm_id is given)"""
     return {
-        'datos_generales': get_farm_data(),
-        'superficies_insumos': get_surfaces_data(),
-        'manejo': get_management_data(),
-        'fertilizacion': get_fertilization_data(),
-        'proteccion_cultivos': get_crop_protection_data(),
-        'riego': get_irrigation_data(),
-        'energia': get_energy_data(),
-        'rebano': get_herd_data(),
-        'efluentes': get_effluent_data(),
-        'transporte': get_transport_data()
+        'datos_generales': get_farm_data(farm_id),
+        'superficies_insumos': get_surfaces_data(farm_id),
+        'manejo': get_management_data(farm_id),
+        'fertilizacion': get_fertilization_data(farm_id),
+        'proteccion_cultivos': get_crop_protection_data(farm_id),
+        'riego': get_irrigation_data(farm_id),
+        'energia': get_energy_data(farm_id),
+        'rebano': get_herd_data(farm_id),
+        'efluentes': get_effluent_data(farm_id),
+        'transporte': get_transport_data(farm_id)
     }
 
 def remove_last_entry(table_name):
@@ -971,7 +1558,9 @@ def remove_last_entry(table_name):
     # Get last entry
     last_entry = session.query(model_class).order_by(model_class.created_at.desc()).first()
     if last_entry:
+        farm_id = last_entry.id if model_class is Farm else last_entry.farm_id
         session.delete(last_entry)
+        touch_section(session, table_name, farm_id)
         session.commit()
         session.close()
         return True
@@ -979,6 +1568,211 @@ def remove_last_entry(table_name):
     session.close()
     return False
 
+def get_latest_farm_id():
+    """Get the id of the most recently created farm"""
+    session = get_session()
+    farm_id = session.scalar(select(Farm.id).order_by(Farm.created_at.desc()).limit(1))
+    session.close()
+    return farm_id
+
+def list_farms():
+    """List (id, name) of every farm ordered by name"""
+    session = get_session()
+    farms = session.execute(select(Farm.id, Farm.name).order_by(Farm.name)).all()
+    session.close()
+    return [tuple(farm) for farm in farms]
+
+def get_section_columns(section, include_farm=False, include_ids=False):
+    """Column names (as in the CSV files) of the rows yielded by iter_section_rows"""
+    columns = list(SECTION_COLUMNS[section].keys())
+    if include_ids:
+        columns = ['uuid'] + ([] if section == 'datos_generales' else ['farm_id']) + columns + ['created_at']
+    if include_farm and section != 'datos_generales':
+        columns = ['nombre_tambo'] + columns
+    return columns
+
+def iter_section_rows(section, farm_id=None, include_farm=False, include_ids=False, chunk_size=1000):
+    """Stream the rows of a section as tuples without loading the whole table
+    
+    Rows are limited to one farm when farm_id is given. With include_farm the
+    farm name is prepended so rows from several farms can share one sheet, and
+    include_ids adds the row id, farm id and creation time for full extracts.
+    """
+    model = SECTION_MODELS[section]
+    columns = [getattr(model, attr) for attr in SECTION_COLUMNS[section].values()]
+    if include_ids:
+        columns = [model.id] + ([] if model is Farm else [model.farm_id]) + columns + [model.created_at]
+    
+    if include_farm and section != 'datos_generales':
+        query = select(Farm.name, *columns).join(Farm, model.farm_id == Farm.id)
+    else:
+        query = select(*columns)
+    
+    if farm_id is not None:
+        query = query.where((model.id if model is Farm else model.farm_id) == farm_id)
+    query = query.order_by(model.created_at)
+    
+    session = get_session()
+    try:
+        for row in session.execute(query.execution_options(yield_per=chunk_size)):
+            yield tuple(row)
+    finally:
+        session.close()
+
+def _section_query_columns(section, include_farm=False):
+    """Map the CSV column names of a section to the SQL columns that back them"""
+    model = SECTION_MODELS[section]
+    columns = {name: getattr(model, attr) for name, attr in SECTION_COLUMNS[section].items()}
+    if include_farm and section != 'datos_generales':
+        columns = {'nombre_tambo': Farm.name, **columns}
+    return columns
+
+def _filtered_section_query(query, section, farm_id=None, include_farm=False, filters=None):
+    """Apply the farm scope, the farm join and column filters to a section query"""
+    model = SECTION_MODELS[section]
+    columns = _section_query_columns(section, include_farm)
+    
+    if include_farm and section != 'datos_generales':
+        query = query.join(Farm, model.farm_id == Farm.id)
+    if farm_id is not None:
+        query = query.where((model.id if model is Farm else model.farm_id) == farm_id)
+    
+    # Filters are (column, operator, value); text columns use a case-insensitive contains
+    for name, operator, value in filters or []:
+        column = columns[name]
+        if operator == 'contains':
+            query = query.where(column.ilike(f"%{value}%"))
+        elif operator == '=':
+            query = query.where(column == value)
+        elif operator == '>':
+            query = query.where(column > value)
+        elif operator == '>=':
+            query = query.where(column >= value)
+        elif operator == '<':
+            query = query.where(column < value)
+        elif operator == '<=':
+            query = query.where(column <= value)
+    return query
+
+def count_section_rows(section, farm_id=None, include_farm=False, filters=None):
+    """Number of rows of a section that match the farm scope and filters"""
+    model = SECTION_MODELS[section]
+    query = _filtered_section_query(select(func.count(model.id)), section, farm_id, include_farm, filters)
+    
+    session = get_session()
+    try:
+        return session.execute(query).scalar_one()
+    finally:
+        session.close()
+
+def get_section_page(section, farm_id=None, include_farm=False, filters=None,
+                     sort_by=None, descending=False, limit=50, offset=0):
+    """Fetch one page of a section as a dataframe, sorting and filtering in SQL
+    
+    Only the requested window is read; the row id breaks ties so pages stay
+    stable when the sort column has repeated values.
+    """
+    model = SECTION_MODELS[section]
+    columns = _section_query_columns(section, include_farm)
+    query = select(*[column.label(name) for name, column in columns.items()])
+    query = _filtered_section_query(query, section, farm_id, include_farm, filters)
+    
+    sort_column = columns[sort_by] if sort_by in columns else model.created_at
+    if descending:
+        query = query.order_by(sort_column.desc(), model.id.desc())
+    else:
+        query = query.order_by(sort_column, model.id)
+    query = query.limit(limit).offset(offset)
+    
+    session = get_session()
+    try:
+        rows = session.execute(query).all()
+    finally:
+        session.close()
+    return pd.DataFrame(rows, columns=list(columns.keys()))
+
+LONG_COLUMNS = ['section', 'record_id', 'field', 'value']
+
+def get_long_summary(farm_id=None, sections=None):
+    """Records and set values per section, counted in the database with one select per table"""
+    sections = list(sections or SECTION_MODELS)
+    counts = {}
+    session = get_session()
+    try:
+        for section in sections:
+            model = SECTION_MODELS[section]
+            columns = [getattr(model, attr) for attr in SECTION_COLUMNS[section].values()]
+            query = _filtered_section_query(
+                select(func.count(model.id), *[func.count(column) for column in columns]), section, farm_id
+            )
+            records, *values = session.execute(query).one()
+            counts[section] = (records, sum(values))
+    finally:
+        session.close()
+    return pd.DataFrame.from_dict(counts, orient='index', columns=['records', 'values']).rename_axis('section')
+
+def _unpivot_section(section, rows):
+    """Long (section, record_id, field, value) rows of one section, keeping only the values that are set"""
+    fields = list(SECTION_COLUMNS[section])
+    wide = pd.DataFrame(rows, columns=['record_id', *fields])
+    wide['position'] = range(len(wide))
+    long_df = wide.melt(id_vars=['position', 'record_id'], value_vars=fields, var_name='field', value_name='value')
+    # Record by record in load order, each with its fields in section order
+    long_df = long_df.dropna(subset=['value']).sort_values('position', kind='stable').drop(columns='position')
+    long_df['value'] = long_df['value'].astype(str)
+    long_df.insert(0, 'section', section)
+    return long_df
+
+def get_long_records(farm_id=None, sections=None, limit=None, offset=0, record_counts=None):
+    """Fields of a farm's records in long format (section, record_id, field, value)
+    
+    Every section is read with one select of its table and unpivoted in
+    pandas, so only the values that are actually set are returned. limit and
+    offset page over the records (not the values), in section order and then
+    load order, so only the tables that overlap the page are queried;
+    record_counts (section -> records, e.g. from get_long_summary) saves
+    counting them again.
+    """
+    sections = list(sections or SECTION_MODELS)
+    if limit is not None and record_counts is None:
+        record_counts = get_long_summary(farm_id, sections)['records']
+    
+    frames = []
+    session = get_session()
+    try:
+        for section in sections:
+            section_offset, section_limit = 0, None
+            if limit is not None:
+                records = int(record_counts.get(section, 0))
+                if offset >= records:
+                    offset -= records
+                    continue
+                if limit <= 0:
+                    break
+                section_offset, section_limit = offset, limit
+                offset = 0
+                limit -= min(records - section_offset, section_limit)
+            
+            model = SECTION_MODELS[section]
+            columns = [getattr(model, attr) for attr in SECTION_COLUMNS[section].values()]
+            query = _filtered_section_query(select(model.id, *columns), section, farm_id)
+            query = query.order_by(model.created_at, model.id).offset(section_offset)
+            if section_limit is not None:
+                query = query.limit(section_limit)
+            rows = session.execute(query).all()
+            if rows:
+                frames.append(_unpivot_section(section, rows))
+    finally:
+        session.close()
+    
+    df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=LONG_COLUMNS)
+    df = df[LONG_COLUMNS]
+    # Repeated labels are stored once per category instead of once per row
+    df['section'] = pd.Categorical(df['section'], categories=sections)
+    df['record_id'] = df['record_id'].astype('category')
+    df['field'] = df['field'].astype(str).astype('category')
+    return df.reset_index(drop=True)
+
 def check_data_exists():
     """Check if any data exists in the database"""
     session = get_session()
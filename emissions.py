@@ -0,0 +1,336 @@
+import datetime
+import numpy as np
+import pandas as pd
+from sqlalchemy import select, insert, update, delete, func
+import database as db
+from methane import load_herd, load_effluents, herd_methane, methane_emissions
+from nitrogen import load_fertilization, fertilizer_nitrogen, n2o_emissions
+
+# Factors of the default set: key -> (value, unit)
+DEFAULT_FACTORS = {
+    'diesel': (2.68, 'kg CO2e/L'),
+    'gasolina': (2.31, 'kg CO2e/L'),
+    'gnc': (1.86, 'kg CO2e/m³'),
+    'electricidad': (0.38, 'kg CO2e/kWh'),
+    'rendimiento_camion': (0.35, 'L/km'),
+    'rendimiento_camioneta': (0.12, 'L/km'),
+    'rendimiento_tractor': (0.50, 'L/km'),
+    'rendimiento_otro': (0.20, 'L/km'),
+    # Methane (IPCC 2019 Tier 2)
+    'gwp_ch4': (27.0, 'kg CO2e/kg CH4'),
+    'ch4_energia_bruta': (18.45, 'MJ/kg MS'),
+    'ch4_ym_forraje': (6.5, '% EB'),
+    'ch4_ym_concentrado': (3.0, '% EB'),
+    'ch4_dig_forraje': (65.0, '% EB'),
+    'ch4_dig_concentrado': (80.0, '% EB'),
+    'ch4_b0': (0.24, 'm³ CH4/kg SV'),
+    'ch4_mcf_pastura': (0.47, '%'),
+    'ch4_mcf_corral': (1.5, '%'),
+    'ch4_mcf_solidos': (4.0, '%'),
+    'ch4_mcf_liquido': (35.0, '%'),
+    'ch4_mcf_laguna': (77.0, '%'),
+    'ch4_mcf_compostaje': (1.0, '%'),
+    'ch4_mcf_aplicacion': (0.5, '%'),
+    # Nitrous oxide from fertilizers (IPCC 2019 Tier 1)
+    'gwp_n2o': (273.0, 'kg CO2e/kg N2O'),
+    'n_urea': (46.0, '% N'),
+    'n_fosfato_diamonico': (18.0, '% N'),
+    'n_nitrato_amonio': (34.0, '% N'),
+    'n_npk': (15.0, '% N'),
+    'n_organico': (2.0, '% N'),
+    'n_otro': (0.0, '% N'),
+    'n2o_ef_directo': (1.0, '% N aplicado'),
+    'n2o_frac_vol_urea': (15.0, '% N aplicado'),
+    'n2o_frac_vol_sintetico': (11.0, '% N aplicado'),
+    'n2o_frac_vol_organico': (21.0, '% N aplicado'),
+    'n2o_ef_volatilizacion': (1.0, '% N volatilizado'),
+    'n2o_frac_lixiviacion': (24.0, '% N aplicado'),
+    'n2o_ef_lixiviacion': (1.1, '% N lixiviado'),
+    'n2o_reduccion_inhibidor': (35.0, '% del N2O directo'),
+    'n2o_reduccion_urea_protegida': (50.0, '% de la volatilización'),
+    # Mitigation scenarios
+    'solar_rendimiento': (1400.0, 'kWh/kW/año'),
+    'biodigestor_captura': (85.0, '% CH4 del estiércol confinado'),
+    'biodigestor_eficiencia_electrica': (35.0, '%')
+}
+
+DEFAULT_SET_NAME = "Factores por defecto"
+
+# Pseudo-section of the derived metrics that depend on the emission factors
+FACTORS_SECTION = 'emission_factors'
+
+# Energy sources and the Energy columns they are computed from
+ENERGY_SOURCES = {
+    'diesel': 'diesel_consumption',
+    'gasolina': 'gasoline_consumption',
+    'gnc': 'gnc_consumption',
+    'electricidad': 'electricity_consumption'
+}
+
+# Transport activity: trips per year, fuel economy and fuel factor of each option
+TRIPS_PER_YEAR = {'Diario': 365, 'Semanal': 52, 'Mensual': 12, 'Anual': 1, 'Ocasional': 4}
+VEHICLE_FACTORS = {'Camión': 'rendimiento_camion', 'Camioneta': 'rendimiento_camioneta', 'Tractor': 'rendimiento_tractor'}
+FUEL_FACTORS = {'Diesel': 'diesel', 'Gasolina': 'gasolina', 'GNC': 'gnc'}
+
+SOURCE_LABELS = {
+    'diesel': "Diesel",
+    'gasolina': "Gasolina",
+    'gnc': "GNC",
+    'electricidad': "Electricidad",
+    'transporte': "Transporte",
+    'ch4_enterico': "CH4 entérico",
+    'ch4_estiercol': "CH4 estiércol",
+    'n2o_directo': "N2O directo",
+    'n2o_indirecto': "N2O indirecto"
+}
+
+def ensure_default_factor_set(session):
+    """Create the default factor set the first time factors are needed"""
+    if session.scalar(select(func.count(db.EmissionFactorSet.id))):
+        return
+    save_factor_set(DEFAULT_SET_NAME, {key: value for key, (value, _) in DEFAULT_FACTORS.items()}, session=session)
+
+def save_factor_set(name, factors, year=None, country=None, session=None):
+    """Store factors as a new version of a set (replacing the active version) and return its id"""
+    own_session = session is None
+    session = session or db.get_session()
+    try:
+        previous = session.execute(
+            select(func.max(db.EmissionFactorSet.version)).where(db.EmissionFactorSet.name == name)
+        ).scalar()
+        session.execute(
+            update(db.EmissionFactorSet)
+            .where(db.EmissionFactorSet.name == name, db.EmissionFactorSet.active.is_(True))
+            .values(active=False)
+        )
+        factor_set = db.EmissionFactorSet(name=name, year=year, country=country, version=(previous or 0) + 1, active=True)
+        session.add(factor_set)
+        session.flush()
+        session.execute(insert(db.EmissionFactor), [
+            {'set_id': factor_set.id, 'key': key, 'value': float(value), 'unit': DEFAULT_FACTORS.get(key, (None, None))[1]}
+            for key, value in factors.items()
+        ])
+        # Every farm's emission-based metrics depend on the active factors
+        db.mark_metrics_dirty(session, FACTORS_SECTION)
+        if own_session:
+            session.commit()
+        return factor_set.id
+    finally:
+        if own_session:
+            session.close()
+
+def list_factor_sets(active_only=True):
+    """Factor sets as a dataframe (id, name, country, year, version, active)"""
+    session = db.get_session()
+    try:
+        ensure_default_factor_set(session)
+        session.commit()
+        model = db.EmissionFactorSet
+        query = select(model.id, model.name, model.country, model.year, model.version, model.active).order_by(model.name, model.version)
+        if active_only:
+            query = query.where(model.active.is_(True))
+        rows = session.execute(query).all()
+    finally:
+        session.close()
+    return pd.DataFrame(rows, columns=['id', 'name', 'country', 'year', 'version', 'active'])
+
+def get_factor_table(set_ids):
+    """Factors of some sets as a frame (set id x factor key); keys a set lacks take the default value"""
+    session = db.get_session()
+    try:
+        rows = session.execute(
+            select(db.EmissionFactor.set_id, db.EmissionFactor.key, db.EmissionFactor.value)
+            .where(db.EmissionFactor.set_id.in_(set_ids))
+        ).all()
+    finally:
+        session.close()
+
+    table = pd.DataFrame(rows, columns=['set_id', 'key', 'value']).pivot(index='set_id', columns='key', values='value')
+    table = table.reindex(index=list(set_ids))
+    for key, (value, _) in DEFAULT_FACTORS.items():
+        table[key] = table[key].fillna(value) if key in table.columns else value
+    return table
+
+def _country_key(values):
+    """Country names compared without case or surrounding spaces ('' when missing)"""
+    return values.fillna('').astype(str).str.strip().str.casefold()
+
+def _match_year(farms, sets, default_ids):
+    """Set id of each farm among some sets
+
+    The set with the latest year not after the farm's year wins; farms
+    without such a set take the undated one of the sets, or default_ids.
+    """
+    undated = sets[sets['year'].isna()]
+    matched = pd.Series(undated['id'].iloc[-1], index=farms.index) if not undated.empty else default_ids.copy()
+    dated = sets.dropna(subset=['year']).astype({'year': 'int64'}).sort_values('year')
+    known_year = pd.to_numeric(farms['year'], errors='coerce').notna()
+    if not dated.empty and known_year.any():
+        with_year = farms.loc[known_year, ['year']].astype('int64').sort_values('year')
+        found = pd.merge_asof(with_year.reset_index(drop=True), dated[['year', 'id']], on='year', direction='backward')['id']
+        matched.loc[with_year.index[found.notna().to_numpy()]] = found.dropna().to_numpy()
+    return matched
+
+def get_farm_factor_set_ids(farm_ids=None):
+    """Factor set that applies to each farm, as a Series indexed by farm id
+
+    Farms pick among the active sets of their own country and fall back to
+    the general sets (no country) when their country has none, or none for
+    their year. Within those, the set with the latest year not after the
+    farm's year applies; sets without a year (and farms without one) use
+    the undated set.
+    """
+    sets = list_factor_sets()
+    session = db.get_session()
+    try:
+        query = select(db.Farm.id, db.Farm.year, db.Farm.country)
+        if farm_ids is not None:
+            query = query.where(db.Farm.id.in_(list(farm_ids)))
+        farms = pd.DataFrame(session.execute(query).all(), columns=['farm_id', 'year', 'country']).set_index('farm_id')
+    finally:
+        session.close()
+
+    sets['country'] = _country_key(sets['country'])
+    general = sets[sets['country'] == '']
+    general_undated = general[general['year'].isna()]
+    fallback_id = general_undated['id'].iloc[-1] if not general_undated.empty else sets['id'].iloc[0]
+
+    set_ids = _match_year(farms, general, pd.Series(fallback_id, index=farms.index))
+    countries = _country_key(farms['country'])
+    for country in countries.unique():
+        own = sets[sets['country'] == country]
+        if country and not own.empty:
+            in_country = (countries == country).to_numpy()
+            set_ids[in_country] = _match_year(farms[in_country], own, set_ids[in_country])
+    return set_ids.astype('int64').rename('factor_set_id')
+
+def get_farm_factors(farm_ids=None):
+    """Factors that apply to each farm (farm id x factor key, plus factor_set_id)"""
+    set_ids = get_farm_factor_set_ids(farm_ids)
+    table = get_factor_table(set_ids.unique().tolist())
+    factors = table.reindex(set_ids.to_numpy())
+    factors.index = set_ids.index
+    factors['factor_set_id'] = set_ids.to_numpy()
+    return factors
+
+def _pick(values, keys, default_key):
+    """Row-wise lookup: for row i take the column named keys[i] (default_key when unknown)"""
+    keys = pd.Series(keys).where(lambda key: key.isin(values.columns), default_key)
+    columns = values.columns.get_indexer(keys)
+    return values.to_numpy(dtype=float)[np.arange(len(values)), columns]
+
+def load_energy(farm_ids=None):
+    """Latest energy row of each farm"""
+    model = db.Energy
+    query = select(model.farm_id, model.created_at, *[getattr(model, column) for column in ENERGY_SOURCES.values()])
+    if farm_ids is not None:
+        query = query.where(model.farm_id.in_(list(farm_ids)))
+    session = db.get_session()
+    try:
+        rows = session.execute(query).all()
+    finally:
+        session.close()
+    energy = pd.DataFrame(rows, columns=['farm_id', 'created_at'] + list(ENERGY_SOURCES.values()))
+    return energy.sort_values('created_at').drop_duplicates('farm_id', keep='last')
+
+def load_transport(farm_ids=None):
+    """Every transport route of the farms"""
+    model = db.Transport
+    query = select(model.farm_id, model.distance_km, model.vehicle_type, model.frequency, model.fuel_type)
+    if farm_ids is not None:
+        query = query.where(model.farm_id.in_(list(farm_ids)))
+    session = db.get_session()
+    try:
+        rows = session.execute(query).all()
+    finally:
+        session.close()
+    return pd.DataFrame(rows, columns=['farm_id', 'distance_km', 'vehicle_type', 'frequency', 'fuel_type'])
+
+def energy_emissions(energy, factors):
+    """kg CO2e per energy source for each energy row (long format)"""
+    if energy.empty:
+        return pd.DataFrame(columns=['farm_id', 'source', 'co2e_kg'])
+    farm_factors = factors.reindex(energy['farm_id'].to_numpy())
+    wide = pd.DataFrame({'farm_id': energy['farm_id'].to_numpy()})
+    for source, column in ENERGY_SOURCES.items():
+        consumption = pd.to_numeric(energy[column], errors='coerce').fillna(0).to_numpy(dtype=float)
+        wide[source] = consumption * farm_factors[source].to_numpy(dtype=float)
+    return wide.melt(id_vars='farm_id', var_name='source', value_name='co2e_kg')
+
+def transport_emissions(transport, factors):
+    """kg CO2e of transport for each route (long format)"""
+    if transport.empty:
+        return pd.DataFrame(columns=['farm_id', 'source', 'co2e_kg'])
+    farm_factors = factors.reindex(transport['farm_id'].to_numpy())
+    trips = transport['frequency'].map(TRIPS_PER_YEAR).fillna(1).to_numpy(dtype=float)
+    distance = pd.to_numeric(transport['distance_km'], errors='coerce').fillna(0).to_numpy(dtype=float)
+    # Unknown vehicles and fuels use the generic economy and the diesel factor
+    liters_per_km = _pick(farm_factors, transport['vehicle_type'].map(VEHICLE_FACTORS).to_numpy(), 'rendimiento_otro')
+    fuel_factor = _pick(farm_factors, transport['fuel_type'].map(FUEL_FACTORS).to_numpy(), 'diesel')
+    return pd.DataFrame({
+        'farm_id': transport['farm_id'].to_numpy(),
+        'source': 'transporte',
+        'co2e_kg': trips * distance * liters_per_km * fuel_factor
+    })
+
+def compute_emissions(farm_ids=None):
+    """Emissions of the farms by source (farm_id, source, co2e_kg, factor_set_id)"""
+    factors = get_farm_factors(farm_ids)
+    parts = [
+        energy_emissions(load_energy(farm_ids), factors),
+        transport_emissions(load_transport(farm_ids), factors),
+        methane_emissions(herd_methane(load_herd(farm_ids), load_effluents(farm_ids), factors)),
+        n2o_emissions(fertilizer_nitrogen(load_fertilization(farm_ids), factors))
+    ]
+    parts = [part for part in parts if not part.empty]
+    if not parts:
+        return pd.DataFrame(columns=['farm_id', 'source', 'co2e_kg', 'factor_set_id'])
+
+    results = pd.concat(parts, ignore_index=True)
+    results = results[results['farm_id'].isin(factors.index)]
+    results = results.groupby(['farm_id', 'source'], as_index=False, sort=False)['co2e_kg'].sum()
+    results['factor_set_id'] = factors['factor_set_id'].reindex(results['farm_id']).to_numpy()
+    return results
+
+def store_emissions(session, results, farm_ids=None, computed_at=None):
+    """Replace the stored emissions of some farms (all farms by default) in the caller's transaction"""
+    query = delete(db.EmissionResult)
+    if farm_ids is not None:
+        query = query.where(db.EmissionResult.farm_id.in_(list(farm_ids)))
+    session.execute(query)
+    if not results.empty:
+        records = results.assign(computed_at=computed_at or datetime.datetime.utcnow()).to_dict('records')
+        session.execute(insert(db.EmissionResult), records)
+
+def recompute_emissions(farm_ids=None):
+    """Recompute and store emissions of some farms (all farms by default) in one batch"""
+    results = compute_emissions(farm_ids)
+
+    session = db.get_session()
+    try:
+        store_emissions(session, results, farm_ids)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+    return len(results)
+
+def recompute_emissions_job(job):
+    """Background job that recomputes the emissions of every farm"""
+    job.progress(0.0, "Recalculando emisiones de todos los tambos...")
+    rows = recompute_emissions()
+    job.progress(1.0, f"{rows} resultados actualizados")
+
+def get_emissions(farm_ids=None):
+    """Stored emissions (farm_id, source, co2e_kg, factor_set_id)"""
+    query = select(db.EmissionResult.farm_id, db.EmissionResult.source, db.EmissionResult.co2e_kg, db.EmissionResult.factor_set_id)
+    if farm_ids is not None:
+        query = query.where(db.EmissionResult.farm_id.in_(list(farm_ids)))
+    session = db.get_session()
+    try:
+        rows = session.execute(query).all()
+    finally:
+        session.close()
+    return pd.DataFrame(rows, columns=['farm_id', 'source', 'co2e_kg', 'factor_set_id'])
@@ -0,0 +1,93 @@
+import os
+import json
+import hashlib
+import tempfile
+import database as db
+from emissions import get_farm_factor_set_ids
+
+# Generated reports are kept here, keyed by the data they were built from
+CACHE_DIR = os.path.join(os.path.dirname(__file__), 'data', 'export_cache')
+
+# Total size of cached artifacts before the least recently used are evicted
+MAX_CACHE_BYTES = int(os.environ.get('FIELDLENS_EXPORT_CACHE_MB', '500')) * 1024 * 1024
+
+def cache_key(kind, farm_id, template_version):
+    """Hash of (artifact kind, farm, section data versions, factor sets, template version)
+    
+    Reports embed footprint KPIs, so saving a factor set (a new set id) also
+    invalidates them.
+    """
+    payload = json.dumps({
+        'kind': kind,
+        'farm_id': farm_id,
+        'versions': db.get_section_versions(farm_id),
+        'factor_sets': sorted(get_farm_factor_set_ids(None if farm_id is None else [farm_id]).unique().tolist()),
+        'template_version': template_version
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def artifact_path(kind, farm_id, template_version, suffix=''):
+    """Cache file of an artifact for the current data (it may not exist yet)"""
+    return os.path.join(CACHE_DIR, f"{cache_key(kind, farm_id, template_version)}{suffix}")
+
+def get_or_build_path(kind, farm_id, write, template_version, suffix=''):
+    """Return the path of a cached artifact, writing it with write(path) on a miss
+    
+    The artifact goes straight from the writer to disk, so large exports never
+    have to be held in memory. farm_id=None keys the artifact on the versions
+    of every farm.
+    """
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = artifact_path(kind, farm_id, template_version, suffix)
+    
+    if os.path.exists(path):
+        try:
+            # Refresh the modification time so eviction is least recently used
+            os.utime(path)
+            return path
+        except FileNotFoundError:
+            # Evicted by another session in between
+            pass
+    
+    # Write atomically so concurrent readers never see a partial file; every
+    # writer (sessions are threads of one process) gets its own temp file
+    fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, suffix='.tmp')
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    
+    evict()
+    return path
+
+def evict(max_bytes=MAX_CACHE_BYTES):
+    """Delete the least recently used artifacts until the cache fits in max_bytes"""
+    entries = []
+    for name in os.listdir(CACHE_DIR):
+        if name.endswith('.tmp'):
+            continue
+        try:
+            stat = os.stat(os.path.join(CACHE_DIR, name))
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, name))
+    
+    total = sum(size for _, size, _ in entries)
+    for _, size, name in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(os.path.join(CACHE_DIR, name))
+        except FileNotFoundError:
+            pass
+        total -= size
+
+def clear():
+    """Remove every cached artifact"""
+    if os.path.exists(CACHE_DIR):
+        for name in os.listdir(CACHE_DIR):
+            os.remove(os.path.join(CACHE_DIR, name))
@@ -1,28 +1,95 @@
 import streamlit as st
 import pandas as pd
 import os
+import shutil
 from datetime import datetime
 import base64
+import re
 from io import BytesIO
+from xml.sax.saxutils import escape
 from docx import Document
 from docx.shared import Pt, RGBColor, Inches
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls, qn
 import xlsxwriter
 from utils import get_all_data, check_data_exists, format_filename
+import database as db
+from batch_export import run_batch_export
+import export_cache
+from jobs import submit_job, show_job_status
+from pdf_report import build_pdf_report
+from parquet_io import build_parquet_zip
+from data_grid import show_data_grid, PAGE_SIZES
+from kpis import get_kpi_table
+from herd import get_herd_table
 
-def export_to_word():
-    """Generate and download a Word report of all collected data"""
-    st.title("Exportar Reporte (Word + PDF)")
+# Sheet names and section keys exported to Excel
+EXCEL_SECTIONS = [
+    ("Datos Generales", 'datos_generales'),
+    ("Superficies e Insumos", 'superficies_insumos'),
+    ("Manejo y Recursos", 'manejo'),
+    ("Fertilización", 'fertilizacion'),
+    ("Protección de Cultivos", 'proteccion_cultivos'),
+    ("Riego / Uso de Agua", 'riego'),
+    ("Energía", 'energia'),
+    ("Rebaño", 'rebano'),
+    ("Gestión de Efluentes", 'efluentes'),
+    ("Transporte", 'transporte')
+]
+
+# Bump whenever the layout of the generated reports changes to invalidate cached exports
+REPORT_TEMPLATE_VERSION = 3
+
+# Rows sampled per sheet to estimate column widths
+WIDTH_SAMPLE_ROWS = 200
+MAX_COLUMN_WIDTH = 60
+
+# Characters that are not allowed in WordprocessingML text
+INVALID_XML_CHARS = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+def add_dataframe_table(doc, df):
+    """Add a 'Table Grid' table for a dataframe, building all data rows in one pass"""
+    columns = [column for column in df.columns if column != 'uuid']  # Skip UUID column
+    
+    # Create table with the header row
+    table = doc.add_table(rows=1, cols=len(columns))
+    table.style = 'Table Grid'
+    header_cells = table.rows[0].cells
+    for col_idx, column in enumerate(columns):
+        header_cells[col_idx].text = column.replace('_', ' ').title()
+    
+    if df.empty:
+        return table
+    
+    # Cell widths come from the grid, like table.add_row() does
+    cell_props = [
+        f'<w:tcPr><w:tcW w:type="dxa" w:w="{grid_col.get(qn("w:w"))}"/></w:tcPr>'
+        for grid_col in table._tbl.tblGrid.gridCol_lst
+    ]
     
-    if not check_data_exists():
-        st.warning("⚠️ No hay datos para exportar. Por favor complete al menos una sección.")
-        return
+    # Generate the XML of every data row from the column arrays and append it at once
+    values = df[columns].astype(object).to_numpy()
+    rows_xml = []
+    for row in values:
+        cells_xml = ''.join(
+            f'<w:tc>{props}<w:p><w:r><w:t xml:space="preserve">{escape(INVALID_XML_CHARS.sub("", str(value)))}</w:t></w:r></w:p></w:tc>'
+            for props, value in zip(cell_props, row)
+        )
+        rows_xml.append(f'<w:tr>{cells_xml}</w:tr>')
     
-    # Get farm name from datos_generales if available
-    datos_df = pd.DataFrame()
-    if os.path.exists("data/datos_generales.csv"):
-        datos_df = pd.read_csv("data/datos_generales.csv")
+    fragment = parse_xml(f'<w:tbl {nsdecls("w")}>{"".join(rows_xml)}</w:tbl>')
+    table._tbl.extend(list(fragment))
+    
+    return table
+
+def build_word_report(farm_id=None):
+    """Build the Word report of a farm and return the .docx bytes"""
+    # Load all data
+    all_data = get_all_data(farm_id)
     
+    # Get farm name from datos_generales if available
     farm_name = "tambo"
+    datos_df = all_data['datos_generales']
     if not datos_df.empty and 'nombre_tambo' in datos_df.columns:
         farm_name = datos_df['nombre_tambo'].iloc[0]
     
@@ -57,9 +124,6 @@ def export_to_word():
     doc.add_paragraph("Contenido:")
     doc.add_paragraph("...")
     
-    # Load all data
-    all_data = get_all_data()
-    
     # Datos Generales section
     if not all_data['datos_generales'].empty:
         doc.add_heading("Datos Generales", 1)
@@ -70,89 +134,249 @@ def export_to_word():
             if column != 'uuid':  # Skip UUID column
                 doc.add_paragraph(f"{column.replace('_', ' ').title()}: {df[column].iloc[0]}")
     
-    # Superficies e Insumos section
-    if not all_data['superficies_insumos'].empty:
-        doc.add_heading("Superficies e Insumos", 1)
-        df = all_data['superficies_insumos']
-        
-        # Create table
-        table = doc.add_table(rows=1, cols=len(df.columns) - 1 if 'uuid' in df.columns else len(df.columns))
-        table.style = 'Table Grid'
-        
-        # Add header row
-        header_cells = table.rows[0].cells
-        col_idx = 0
-        for column in df.columns:
-            if column != 'uuid':  # Skip UUID column
-                header_cells[col_idx].text = column.replace('_', ' ').title()
-                col_idx += 1
-        
-        # Add data rows
-        for _, row in df.iterrows():
-            cells = table.add_row().cells
-            col_idx = 0
-            for column in df.columns:
-                if column != 'uuid':  # Skip UUID column
-                    cells[col_idx].text = str(row[column])
-                    col_idx += 1
-    
-    # Add remaining sections with similar pattern
-    sections = [
-        ("Manejo y Recursos", 'manejo'),
-        ("Fertilización", 'fertilizacion'),
-        ("Protección de Cultivos", 'proteccion_cultivos'),
-        ("Riego / Uso de Agua", 'riego'),
-        ("Energía", 'energia'),
-        ("Rebaño", 'rebano'),
-        ("Gestión de Efluentes", 'efluentes'),
-        ("Transporte", 'transporte')
-    ]
-    
-    for section_title, data_key in sections:
+    # Remaining sections are rendered as tables
+    for section_title, data_key in EXCEL_SECTIONS[1:]:
         if not all_data[data_key].empty:
             doc.add_heading(section_title, 1)
             df = all_data[data_key]
             
             # Create table
-            table = doc.add_table(rows=1, cols=len(df.columns) - 1 if 'uuid' in df.columns else len(df.columns))
-            table.style = 'Table Grid'
-            
-            # Add header row
-            header_cells = table.rows[0].cells
-            col_idx = 0
-            for column in df.columns:
-                if column != 'uuid':  # Skip UUID column
-                    header_cells[col_idx].text = column.replace('_', ' ').title()
-                    col_idx += 1
-            
-            # Add data rows
-            for _, row in df.iterrows():
-                cells = table.add_row().cells
-                col_idx = 0
-                for column in df.columns:
-                    if column != 'uuid':  # Skip UUID column
-                        cells[col_idx].text = str(row[column])
-                        col_idx += 1
+            add_dataframe_table(doc, df)
+    
+    # Precomputed KPIs of the farm
+    kpi_df = get_kpi_table([farm_id or db.get_latest_farm_id()])
+    if not kpi_df.empty:
+        doc.add_heading("Indicadores y Huella de Carbono", 1)
+        for column, value in kpi_df.iloc[0].items():
+            if pd.notna(value):
+                doc.add_paragraph(f"{column}: {value:,.2f}" if isinstance(value, float) else f"{column}: {value}")
     
     # Save document to BytesIO object
     doc_io = BytesIO()
     doc.save(doc_io)
-    doc_io.seek(0)
+    return doc_io.getvalue()
+
+def write_bytes(path, data):
+    """Write a report built in memory to its cache file"""
+    with open(path, 'wb') as f:
+        f.write(data)
+
+def show_cached_download(kind, farm_id, write, suffix, prepare_label, spinner_text, download_label, file_name, mime):
+    """Prepare button that writes a report into the export cache on request, then its download button
+    
+    Nothing is rendered on reruns until the user asks for the report; the
+    download streams the cached file instead of holding it in memory.
+    """
+    path = export_cache.artifact_path(kind, farm_id, REPORT_TEMPLATE_VERSION, suffix)
+    state_key = f"{kind}_export_path"
+    if st.session_state.get(state_key) != path or not os.path.exists(path):
+        if st.button(prepare_label, key=f"prepare_{kind}"):
+            with st.spinner(spinner_text):
+                st.session_state[state_key] = export_cache.get_or_build_path(kind, farm_id, write, REPORT_TEMPLATE_VERSION, suffix)
+    if st.session_state.get(state_key) == path and os.path.exists(path):
+        with open(path, 'rb') as f:
+            st.download_button(label=download_label, data=f, file_name=file_name, mime=mime, key=f"download_{kind}")
+
+def export_to_word():
+    """Generate and download a Word report of all collected data"""
+    st.title("Exportar Reporte (Word + PDF)")
+    
+    if not check_data_exists():
+        st.warning("⚠️ No hay datos para exportar. Por favor complete al menos una sección.")
+        return
+    
+    farm_name = st.session_state.get('farm_name') or "tambo"
+    farm_id = st.session_state.get('farm_id') or db.get_latest_farm_id()
     
     # Create download button for Word document
     safe_farm_name = format_filename(farm_name)
     word_filename = f"FieldLens_{safe_farm_name}_{datetime.now().strftime('%Y%m%d')}.docx"
     
-    st.download_button(
-        label="📥 Descargar Reporte Word (.docx)",
-        data=doc_io,
-        file_name=word_filename,
-        mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    # Reports are only rendered when asked for, straight into the export cache
+    col1, col2 = st.columns(2)
+    with col1:
+        show_cached_download(
+            'docx', farm_id, lambda path: write_bytes(path, build_word_report(farm_id)), '.docx',
+            "📝 Preparar Reporte Word", "Generando reporte Word...",
+            "📥 Descargar Reporte Word (.docx)", word_filename,
+            "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+        )
+    with col2:
+        # Rendered straight to PDF, no Word conversion needed
+        show_cached_download(
+            'pdf', farm_id, lambda path: write_bytes(path, build_pdf_report(farm_id)), '.pdf',
+            "📄 Preparar Reporte PDF", "Generando reporte PDF...",
+            "📥 Descargar Reporte PDF", word_filename.replace('.docx', '.pdf'), "application/pdf"
+        )
+
+
+def excel_sheet_name(name):
+    """Sheet name Excel accepts: no []:*?/\\ characters and at most 31 characters"""
+    return re.sub(r'[\[\]:*?/\\]', '-', name)[:31]
+
+def write_table_sheet(workbook, sheet_name, df, header_format):
+    """Write a small computed table (KPIs, herd totals) to its own sheet, skipped when empty"""
+    if df.empty:
+        return
+    worksheet = workbook.add_worksheet(excel_sheet_name(sheet_name))
+    worksheet.write_row(0, 0, list(df.columns), header_format)
+    for row_num, row in enumerate(df.itertuples(index=False), start=1):
+        worksheet.write_row(row_num, 0, [None if pd.isna(value) else value for value in row])
+    for i, column in enumerate(df.columns):
+        worksheet.set_column(i, i, min(len(column), MAX_COLUMN_WIDTH) + 2)
+
+def write_excel_workbook(path, farm_id=None, all_farms=False):
+    """Write the Excel export to a file, streaming rows so memory stays flat
+    
+    Uses xlsxwriter's constant_memory mode: each row is flushed to disk as it
+    is written. Column widths are estimated from the first rows of each sheet.
+    """
+    workbook = xlsxwriter.Workbook(path, {'constant_memory': True, 'nan_inf_to_errors': True})
+    header_format = workbook.add_format({
+        'bold': True,
+        'font_color': 'white',
+        'bg_color': '#4380fa',
+        'border': 1
+    })
+    
+    record_counts = []
+    
+    # Write each section to a separate sheet
+    for sheet_name, data_key in EXCEL_SECTIONS:
+        columns = db.get_section_columns(data_key, include_farm=all_farms)
+        rows = db.iter_section_rows(data_key, farm_id=None if all_farms else farm_id, include_farm=all_farms)
+        
+        worksheet = None
+        widths = [len(col) for col in columns]
+        row_num = 0
+        for row_num, row in enumerate(rows, start=1):
+            # Only create sheets for sections that have data
+            if worksheet is None:
+                worksheet = workbook.add_worksheet(excel_sheet_name(sheet_name))
+                worksheet.write_row(0, 0, columns, header_format)
+            
+            worksheet.write_row(row_num, 0, row)
+            
+            # Estimate column widths from a bounded sample
+            if row_num <= WIDTH_SAMPLE_ROWS:
+                widths = [max(width, len(str(value))) for width, value in zip(widths, row)]
+        
+        if worksheet is not None:
+            for i, width in enumerate(widths):
+                worksheet.set_column(i, i, min(width, MAX_COLUMN_WIDTH) + 2)
+        record_counts.append(row_num)
+    
+    # Precomputed KPIs (footprint per liter, per hectare, ...) and herd totals of the same farms
+    summary_farms = None if all_farms or farm_id is None else [farm_id]
+    write_table_sheet(workbook, 'Indicadores', get_kpi_table(summary_farms, include_farm=summary_farms is None), header_format)
+    write_table_sheet(workbook, 'Resumen Rebaño', get_herd_table(summary_farms, include_farm=summary_farms is None), header_format)
+    
+    # Create summary sheet
+    worksheet = workbook.add_worksheet('Resumen')
+    worksheet.write_row(0, 0, ['Sección', 'Registros'], header_format)
+    for row_num, ((sheet_name, _), count) in enumerate(zip(EXCEL_SECTIONS, record_counts), start=1):
+        worksheet.write_row(row_num, 0, [sheet_name, count])
+    worksheet.set_column(0, 0, max(len(name) for name, _ in EXCEL_SECTIONS) + 2)
+    worksheet.set_column(1, 1, len('Registros') + 2)
+    
+    workbook.close()
+    return path
+
+def batch_export_job(job, consolidated=False, formats=('xlsx', 'docx')):
+    """Background job that writes the all-farms ZIP and returns its path
+    
+    The ZIP is written straight into the export cache and linked (or copied)
+    to the job's result file, so it is never held in memory.
+    """
+    cached_path = export_cache.get_or_build_path(
+        '_'.join(('zip',) + tuple(formats) + (('consolidated',) if consolidated else ())),
+        None,
+        lambda path: run_batch_export(
+            path,
+            formats=formats,
+            consolidated=consolidated,
+            progress=lambda done, total: job.progress(done / total, f"Tambos procesados: {done}/{total}")
+        ),
+        REPORT_TEMPLATE_VERSION,
+        '.zip'
     )
-    
-    # Display note about PDF conversion
-    st.info("📝 Nota: Para obtener una versión PDF, descargue el documento Word y conviértalo a PDF con su programa preferido.")
+    path = job.result_path('.zip')
+    try:
+        os.link(cached_path, path)
+    except OSError:
+        # Other filesystem, or no hard links
+        shutil.copyfile(cached_path, path)
+    return path
+
+def parquet_export_job(job):
+    """Background job that writes the Parquet dataset ZIP and returns its path"""
+    path = job.result_path('.zip')
+    build_parquet_zip(
+        path,
+        progress=lambda done, total: job.progress(done / total, f"Secciones exportadas: {done}/{total}")
+    )
+    return path
 
+@st.fragment
+def show_combined_view(farm_id, section_titles):
+    """Every section of a farm in long format (one row per field) with grouping and pivoting
+
+    Records are paged like data_grid: the overview is counted in the database
+    and only the records of the visible page are read and unpivoted.
+    """
+    summary = db.get_long_summary(farm_id, list(section_titles))
+    summary = summary[summary['values'] > 0]
+    if summary.empty:
+        st.warning("No hay datos disponibles para mostrar.")
+        return
+    
+    # Overview grouped by section
+    overview = summary.rename(columns={'records': 'Registros', 'values': 'Valores'})
+    overview.index = overview.index.map(lambda key: section_titles.get(key, key))
+    st.dataframe(overview.rename_axis('Sección'), use_container_width=True)
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        sections = [key for key in section_titles if key in summary.index]
+        selected = st.multiselect("Secciones", sections, format_func=section_titles.get, key="export_long_sections")
+    with col2:
+        pivot = st.toggle("Pivotar (una fila por registro)", key="export_long_pivot", disabled=len(selected) != 1)
+    
+    shown = selected or sections
+    record_counts = summary['records'].reindex(shown)
+    total = int(record_counts.sum())
+    
+    col1, col2, col3 = st.columns([1, 1, 2])
+    with col1:
+        page_size = st.selectbox("Registros por página", PAGE_SIZES, index=1, key="export_long_page_size")
+    pages = max(1, -(-total // page_size))
+    
+    # Go back to the first page whenever the selection changes
+    signature = (tuple(shown), page_size)
+    if st.session_state.get("export_long_signature") != signature:
+        st.session_state["export_long_signature"] = signature
+        st.session_state["export_long_page"] = 1
+    st.session_state["export_long_page"] = min(st.session_state.get("export_long_page", 1), pages)
+    
+    with col2:
+        page = st.number_input("Página", min_value=1, max_value=pages, step=1, key="export_long_page")
+    
+    offset = (page - 1) * page_size
+    view_df = db.get_long_records(farm_id, shown, limit=page_size, offset=offset, record_counts=record_counts)
+    with col3:
+        st.caption(f"Mostrando registros {offset + 1}–{min(offset + page_size, total)} de {total}")
+    
+    if pivot and len(selected) == 1:
+        # Only the selected section is widened, so no empty columns from other tables
+        fields = [field for field in db.SECTION_COLUMNS[selected[0]] if field in set(view_df['field'])]
+        view_df = view_df.pivot(index='record_id', columns='field', values='value')
+        view_df = view_df.reindex(columns=fields).rename_axis(columns=None).reset_index(drop=True)
+    else:
+        view_df = view_df.assign(section=view_df['section'].cat.rename_categories(
+            lambda key: section_titles.get(key, key)
+        )).rename(columns={'section': 'Sección', 'record_id': 'Registro', 'field': 'Campo', 'value': 'Valor'})
+    
+    st.dataframe(view_df, hide_index=True, use_container_width=True)
 
 def export_to_excel(farm_id=None, all_farms=False):
     """Generate and download an Excel file with farm data"""
@@ -165,170 +389,71 @@ def export_to_excel(farm_id=None, all_farms=False):
     farm_name = "tambo"
     if "farm_name" in st.session_state:
         farm_name = st.session_state.farm_name
+    
+    if farm_id is None:
+        farm_id = st.session_state.get('farm_id') or db.get_latest_farm_id()
         
     safe_farm_name = format_filename(farm_name)
     excel_filename = f"FieldLens_{safe_farm_name}_{datetime.now().strftime('%Y%m%d')}.xlsx"
     
-    # Create BytesIO object
-    excel_io = BytesIO()
-    
-    # Create Excel writer
-    with pd.ExcelWriter(excel_io, engine='xlsxwriter') as writer:
-        # Get all data
-        all_data = get_all_data()
-        
-        # Define section names and keys
-        sections = [
-            ("Datos Generales", 'datos_generales'),
-            ("Superficies e Insumos", 'superficies_insumos'),
-            ("Manejo y Recursos", 'manejo'),
-            ("Fertilización", 'fertilizacion'),
-            ("Protección de Cultivos", 'proteccion_cultivos'),
-            ("Riego / Uso de Agua", 'riego'),
-            ("Energía", 'energia'),
-            ("Rebaño", 'rebano'),
-            ("Gestión de Efluentes", 'efluentes'),
-            ("Transporte", 'transporte')
-        ]
-        
-        # Write each dataframe to a separate sheet
-        for sheet_name, data_key in sections:
-            df = all_data[data_key]
-            if not df.empty:
-                # Remove UUID column if present
-                if 'uuid' in df.columns:
-                    df = df.drop(columns=['uuid'])
-                    
-                # Write to Excel
-                df.to_excel(writer, sheet_name=sheet_name, index=False)
-                
-                # Get workbook and worksheet
-                workbook = writer.book
-                worksheet = writer.sheets[sheet_name]
-                
-                # Add formats
-                header_format = workbook.add_format({
-                    'bold': True,
-                    'font_color': 'white',
-                    'bg_color': '#4380fa',
-                    'border': 1
-                })
-                
-                # Apply header format
-                for col_num, value in enumerate(df.columns.values):
-                    worksheet.write(0, col_num, value, header_format)
-                    
-                # Auto-fit columns
-                for i, col in enumerate(df.columns):
-                    column_width = max(df[col].astype(str).map(len).max(), len(col)) + 2
-                    worksheet.set_column(i, i, column_width)
-        
-        # Create summary sheet
-        summary_df = pd.DataFrame({
-            'Sección': [name for name, _ in sections],
-            'Registros': [len(all_data[key]) if not all_data[key].empty else 0 for _, key in sections]
-        })
-        
-        summary_df.to_excel(writer, sheet_name='Resumen', index=False)
-        
-        # Format summary sheet
-        workbook = writer.book
-        worksheet = writer.sheets['Resumen']
-        
-        header_format = workbook.add_format({
-            'bold': True,
-            'font_color': 'white',
-            'bg_color': '#4380fa',
-            'border': 1
-        })
-        
-        # Apply header format
-        for col_num, value in enumerate(summary_df.columns.values):
-            worksheet.write(0, col_num, value, header_format)
-            
-        # Auto-fit columns
-        for i, col in enumerate(summary_df.columns):
-            column_width = max(summary_df[col].astype(str).map(len).max(), len(col)) + 2
-            worksheet.set_column(i, i, column_width)
-    
-    # Reset pointer to start of BytesIO object
-    excel_io.seek(0)
-    
-    # Create download button for Excel file
-    st.download_button(
-        label="📥 Descargar Excel Completo",
-        data=excel_io,
-        file_name=excel_filename,
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-    )
-    
     col1, col2 = st.columns([2, 1])
     with col1:
-        st.download_button(
-            label="📥 Exportar Datos del Tambo Actual",
-            data=excel_io,
-            file_name=excel_filename,
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        # The workbook is only written when asked for, straight into the export cache
+        show_cached_download(
+            'xlsx', farm_id, lambda path: write_excel_workbook(path, farm_id=farm_id), '.xlsx',
+            "📄 Preparar Excel del Tambo Actual", "Generando Excel...",
+            "📥 Exportar Datos del Tambo Actual", excel_filename,
+            "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
         )
     with col2:
+        consolidated = st.checkbox("Incluir libro consolidado", value=True)
+        include_pdf = st.checkbox("Incluir reportes PDF", value=False)
         if st.button("📊 Exportar Todos los Tambos"):
-            export_to_excel(all_farms=True)
+            # Run in the background pool so the session stays responsive
+            formats = ('xlsx', 'docx', 'pdf') if include_pdf else ('xlsx', 'docx')
+            job_id = submit_job('batch_export', batch_export_job, consolidated, formats, label="Exportar todos los tambos")
+            if job_id is None:
+                st.warning("⚠️ Hay demasiadas tareas en curso. Intente nuevamente en unos minutos.")
+            else:
+                st.session_state.batch_export_job = job_id
+        
+        if "batch_export_job" in st.session_state:
+            show_job_status(
+                st.session_state.batch_export_job,
+                "📥 Descargar Todos los Tambos (.zip)",
+                f"FieldLens_todos_{datetime.now().strftime('%Y%m%d')}.zip",
+                "application/zip"
+            )
     
     st.info("📊 Los datos se exportarán organizados por secciones en diferentes hojas de Excel.")
     
+    # Columnar extract for analysts: every section of every farm, typed and compressed
+    with st.expander("Exportar para análisis (Parquet)"):
+        st.caption("Un directorio por sección con todos los tambos y la columna farm_id. Se lee con pandas.read_parquet.")
+        if st.button("🗂️ Exportar Dataset Parquet"):
+            job_id = submit_job('parquet_export', parquet_export_job, label="Exportar dataset Parquet")
+            if job_id is None:
+                st.warning("⚠️ Hay demasiadas tareas en curso. Intente nuevamente en unos minutos.")
+            else:
+                st.session_state.parquet_export_job = job_id
+        
+        if "parquet_export_job" in st.session_state:
+            show_job_status(
+                st.session_state.parquet_export_job,
+                "📥 Descargar Dataset Parquet (.zip)",
+                f"FieldLens_parquet_{datetime.now().strftime('%Y%m%d')}.zip",
+                "application/zip"
+            )
+    
     # Display current farm data in a user-friendly table
     st.subheader("Vista de Datos Recolectados")
     
-    from st_aggrid import AgGrid, GridOptionsBuilder
-    from st_aggrid.grid_options_builder import GridOptionsBuilder
-    
-    # Get current farm data and combine into one table
-    current_farm_name = st.session_state.get('farm_name', '')
-    all_data = get_all_data()
-    combined_data = []
-    
-    for section_name, df in all_data.items():
-        if not df.empty:
-            # Filter for current farm name
-            if 'nombre_tambo' in df.columns:
-                df = df[df['nombre_tambo'] == current_farm_name]
-            elif section_name != 'datos_generales':  # For other sections, keep all rows as they belong to current farm
-                pass
-            
-            # Remove technical columns
-            for col in ['uuid', 'farm_id']:
-                if col in df.columns:
-                    df = df.drop(columns=[col])
-            
-            # Add section information
-            if not df.empty:
-                df['Sección'] = section_name.replace('_', ' ').title()
-                combined_data.append(df)
+    section_titles = dict((key, title) for title, key in EXCEL_SECTIONS)
+    view = st.radio("Vista", ["Por sección", "Combinada"], horizontal=True, key="export_view")
     
-    if combined_data:
-        combined_df = pd.concat(combined_data, ignore_index=True)
-        
-        # Configure grid options
-        gb = GridOptionsBuilder.from_dataframe(combined_df)
-        gb.configure_default_column(
-            groupable=True,
-            value=True,
-            enableRowGroup=True,
-            aggFunc='sum',
-            editable=False
-        )
-        gb.configure_grid_options(domLayout='normal')
-        gb.configure_side_bar()
-        
-        # Create grid
-        grid_response = AgGrid(
-            combined_df,
-            gridOptions=gb.build(),
-            enable_enterprise_modules=True,
-            update_mode='MODEL_CHANGED',
-            data_return_mode='FILTERED',
-            theme='streamlit',
-            height=500
-        )
+    if view == "Por sección":
+        # One section at a time, paged in the database
+        section = st.selectbox("Sección", list(section_titles), format_func=section_titles.get, key="export_grid_section")
+        show_data_grid(section, farm_id, key=f"export_grid_{section}")
     else:
-        st.warning("No hay datos disponibles para mostrar.")
+        show_combined_view(farm_id, section_titles)
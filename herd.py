@@ -0,0 +1,88 @@
+import pandas as pd
+import database as db
+from methane import load_herd
+
+# Category value of the rows that summarize a whole farm
+TOTAL_CATEGORY = 'Total'
+
+# Per-head columns averaged with the animal counts as weights
+WEIGHTED_COLUMNS = {
+    'average_weight': 'average_weight_kg',
+    'dry_matter_diet': 'dry_matter_kg',
+    'grazing_hours': 'grazing_hours',
+    'pasture_percentage': 'pasture_pct',
+    'concentrate_percentage': 'concentrate_pct',
+    'others_percentage': 'others_pct'
+}
+
+# Summary column -> (label, unit) for pages and exports
+HERD_LABELS = {
+    'animal_count': ("Animales", "cabezas"),
+    'total_weight_kg': ("Peso total", "kg"),
+    'average_weight_kg': ("Peso promedio", "kg"),
+    'dry_matter_total_kg': ("Consumo MS total", "kg MS/día"),
+    'dry_matter_kg': ("Consumo MS promedio", "kg MS/animal/día"),
+    'grazing_hours': ("Horas de pastoreo", "h/día"),
+    'pasture_pct': ("Pastura en la dieta", "%"),
+    'concentrate_pct': ("Concentrado en la dieta", "%"),
+    'others_pct': ("Otros en la dieta", "%")
+}
+
+def herd_summary(farm_ids=None, herd=None):
+    """Herd totals and animal-weighted averages per farm and category, as one tidy frame
+
+    Every farm gets one row per category followed by a TOTAL_CATEGORY row.
+    Averages are np.average-style weighted by the animal counts, computed as
+    grouped sums of products over all farms at once; rows missing a value do
+    not weigh in that column's average.
+    """
+    if herd is None:
+        herd = load_herd(farm_ids)
+    columns = ['farm_id', 'category', *HERD_LABELS]
+    if herd.empty:
+        return pd.DataFrame(columns=columns)
+
+    values = herd[['animal_count', *WEIGHTED_COLUMNS]].apply(pd.to_numeric, errors='coerce')
+    animals = values['animal_count'].fillna(0)
+    per_head = values[list(WEIGHTED_COLUMNS)]
+    # Weight of each value (its animals) and its weighted contribution
+    weights = per_head.notna().mul(animals, axis=0)
+    products = per_head.fillna(0).mul(animals, axis=0)
+
+    frame = pd.concat([
+        herd[['farm_id']],
+        herd['category'].fillna('Sin categoría').rename('category'),
+        animals.rename('animal_count'),
+        products.add_suffix('_product'),
+        weights.add_suffix('_weight')
+    ], axis=1)
+    sums = frame.columns.drop(['farm_id', 'category'])
+    by_category = frame.groupby(['farm_id', 'category'])[sums].sum()
+    by_farm = frame.groupby('farm_id')[sums].sum()
+    by_farm['category'] = TOTAL_CATEGORY
+    totals = pd.concat([by_category.reset_index(), by_farm.reset_index()], ignore_index=True)
+
+    summary = totals[['farm_id', 'category', 'animal_count']].copy()
+    for column, name in WEIGHTED_COLUMNS.items():
+        weight = totals[f"{column}_weight"]
+        summary[name] = totals[f"{column}_product"] / weight.where(weight > 0)
+    summary['total_weight_kg'] = totals['average_weight_product']
+    summary['dry_matter_total_kg'] = totals['dry_matter_diet_product']
+    return summary[columns].sort_values('farm_id', kind='stable', ignore_index=True)
+
+def farm_herd_totals(farm_ids=None, herd=None):
+    """Farm-level rows of herd_summary, indexed by farm id"""
+    summary = herd_summary(farm_ids, herd)
+    return summary[summary['category'] == TOTAL_CATEGORY].drop(columns='category').set_index('farm_id')
+
+def get_herd_table(farm_ids=None, include_farm=False):
+    """Farm herd totals with readable 'Label (unit)' headers for reports, optionally with the farm name first"""
+    totals = farm_herd_totals(farm_ids)
+    table = pd.DataFrame(index=totals.index)
+    for column, (label, unit) in HERD_LABELS.items():
+        table[f"{label} ({unit})"] = totals[column].astype(float).round(2)
+    if include_farm:
+        names = pd.Series(dict(db.list_farms()))
+        table.insert(0, 'nombre_tambo', names.reindex(table.index).to_numpy())
+        table = table.sort_values('nombre_tambo')
+    return table.reset_index(drop=True)
@@ -0,0 +1,266 @@
+import os
+import time
+import uuid
+import socket
+import datetime
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+import streamlit as st
+import database as db
+
+# Jobs share one pool per server process, which caps heavy work across all sessions
+MAX_RUNNING_JOBS = int(os.environ.get('FIELDLENS_MAX_JOBS', '2'))
+MAX_PENDING_JOBS = MAX_RUNNING_JOBS * 4
+
+# Files produced by jobs (export archives, ...)
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'data', 'jobs')
+RESULTS_MAX_AGE = datetime.timedelta(days=1)
+
+# Minimum seconds between progress writes to the database
+PROGRESS_INTERVAL = 0.5
+
+FINISHED_STATUSES = ('done', 'failed', 'cancelled')
+ACTIVE_STATUSES = ('queued', 'running')
+
+# Every process refreshes the heartbeat of its own jobs; jobs whose owner stops
+# beating for HEARTBEAT_TIMEOUT are considered orphaned
+HEARTBEAT_INTERVAL = 10
+HEARTBEAT_TIMEOUT = datetime.timedelta(seconds=60)
+
+# Identity of this server process; the token tells it apart from an earlier process with the same pid
+PROCESS_OWNER = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+_executor = ThreadPoolExecutor(max_workers=MAX_RUNNING_JOBS, thread_name_prefix='fieldlens-job')
+_lock = threading.Lock()
+
+class JobCancelled(Exception):
+    """Raised inside a job when cancellation was requested"""
+
+class JobContext:
+    """Handle passed to a running job to report progress and check for cancellation"""
+    
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self._last_write = 0.0
+    
+    def result_path(self, suffix):
+        """Path where the job should write its result file"""
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        return os.path.join(RESULTS_DIR, f"{self.job_id}{suffix}")
+    
+    def progress(self, fraction, message=None):
+        """Report progress (0-1); raises JobCancelled if the job was cancelled"""
+        now = time.monotonic()
+        if now - self._last_write < PROGRESS_INTERVAL and fraction < 1:
+            return
+        self._last_write = now
+        
+        session = db.get_session()
+        job = session.get(db.Job, self.job_id)
+        job.progress = min(max(fraction, 0.0), 1.0)
+        if message:
+            job.message = message
+        cancel_requested = job.cancel_requested
+        session.commit()
+        session.close()
+        
+        if cancel_requested:
+            raise JobCancelled()
+
+def _update_job(job_id, **values):
+    """Update the stored state of a job"""
+    session = db.get_session()
+    job = session.get(db.Job, job_id)
+    for key, value in values.items():
+        setattr(job, key, value)
+    session.commit()
+    session.close()
+
+def _run_job(job_id, func, args, kwargs):
+    """Run a job function in a pool thread and record its outcome"""
+    session = db.get_session()
+    job = session.get(db.Job, job_id)
+    cancelled_before_start = job.cancel_requested
+    session.close()
+    
+    if cancelled_before_start:
+        _update_job(job_id, status='cancelled', message="Cancelado")
+        return
+    
+    _update_job(job_id, status='running')
+    try:
+        result_path = func(JobContext(job_id), *args, **kwargs)
+        _update_job(job_id, status='done', progress=1.0, result_path=result_path, message="Completado")
+    except JobCancelled:
+        _update_job(job_id, status='cancelled', message="Cancelado")
+    except Exception as e:
+        _update_job(job_id, status='failed', error=traceback.format_exc(), message=str(e))
+
+def count_active_jobs():
+    """Number of queued or running jobs"""
+    session = db.get_session()
+    count = session.query(db.Job).filter(db.Job.status.in_(ACTIVE_STATUSES)).count()
+    session.close()
+    return count
+
+def submit_job(kind, func, *args, label=None, **kwargs):
+    """Queue func(context, *args, **kwargs) in the background pool
+    
+    func must return the path of its result file (or None). Returns the job
+    id, or None when too many jobs are already pending.
+    """
+    with _lock:
+        if count_active_jobs() >= MAX_PENDING_JOBS:
+            return None
+        
+        job_id = str(uuid.uuid4())
+        session = db.get_session()
+        session.add(db.Job(
+            id=job_id, kind=kind, label=label, status='queued', progress=0.0, message="En cola",
+            owner=PROCESS_OWNER, heartbeat_at=datetime.datetime.utcnow()
+        ))
+        session.commit()
+        session.close()
+    
+    _executor.submit(_run_job, job_id, func, args, kwargs)
+    return job_id
+
+def get_job(job_id):
+    """Get the current state of a job as a dict, or None if it doesn't exist"""
+    session = db.get_session()
+    job = session.get(db.Job, job_id)
+    data = None
+    if job:
+        data = {
+            'id': job.id,
+            'kind': job.kind,
+            'label': job.label,
+            'status': job.status,
+            'progress': job.progress or 0.0,
+            'message': job.message,
+            'result_path': job.result_path,
+            'error': job.error
+        }
+    session.close()
+    return data
+
+def request_cancel(job_id):
+    """Ask a queued or running job to stop at its next progress report"""
+    session = db.get_session()
+    job = session.get(db.Job, job_id)
+    if job and job.status not in FINISHED_STATUSES:
+        job.cancel_requested = True
+        session.commit()
+    session.close()
+
+def _owner_is_gone(owner):
+    """Whether the process that owns a job is known to have exited (same host only)"""
+    host, _, rest = (owner or '').partition(':')
+    pid, _, token = rest.partition(':')
+    if host != socket.gethostname() or not pid.isdigit():
+        return False
+    if int(pid) == os.getpid():
+        # Same pid but another token: an earlier process that was restarted
+        return owner != PROCESS_OWNER
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        pass
+    return False
+
+def heartbeat():
+    """Refresh the heartbeat of this process's jobs"""
+    session = db.get_session()
+    try:
+        session.query(db.Job).filter(db.Job.owner == PROCESS_OWNER, db.Job.status.in_(ACTIVE_STATUSES)).update(
+            {'heartbeat_at': datetime.datetime.utcnow()}, synchronize_session=False
+        )
+        session.commit()
+    finally:
+        session.close()
+
+def fail_orphaned_jobs():
+    """Mark as failed the active jobs whose owning process is gone
+    
+    A job is orphaned when its owner exited (checked directly on this host)
+    or stopped refreshing its heartbeat, so jobs that another live server
+    process is still running are left alone.
+    """
+    cutoff = datetime.datetime.utcnow() - HEARTBEAT_TIMEOUT
+    session = db.get_session()
+    try:
+        jobs = session.query(db.Job.id, db.Job.owner, db.Job.heartbeat_at, db.Job.updated_at).filter(
+            db.Job.status.in_(ACTIVE_STATUSES), db.Job.owner.is_(None) | (db.Job.owner != PROCESS_OWNER)
+        ).all()
+        orphaned = [
+            job.id for job in jobs
+            if _owner_is_gone(job.owner) or (job.heartbeat_at or job.updated_at or cutoff) <= cutoff
+        ]
+        if orphaned:
+            session.query(db.Job).filter(db.Job.id.in_(orphaned), db.Job.status.in_(ACTIVE_STATUSES)).update(
+                {'status': 'failed', 'message': "Interrumpido por un reinicio del servidor"},
+                synchronize_session=False
+            )
+            session.commit()
+    finally:
+        session.close()
+    return len(orphaned)
+
+def _heartbeat_loop():
+    """Keep this process's jobs alive and fail the orphans of other processes"""
+    while True:
+        time.sleep(HEARTBEAT_INTERVAL)
+        try:
+            heartbeat()
+            fail_orphaned_jobs()
+        except Exception:
+            traceback.print_exc()
+
+def recover_jobs():
+    """Fail jobs interrupted by a restart and delete old result files"""
+    fail_orphaned_jobs()
+    
+    if os.path.exists(RESULTS_DIR):
+        cutoff = time.time() - RESULTS_MAX_AGE.total_seconds()
+        for name in os.listdir(RESULTS_DIR):
+            path = os.path.join(RESULTS_DIR, name)
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+
+@st.cache_resource
+def init_jobs():
+    """Recover interrupted jobs and start the heartbeat once per server process"""
+    recover_jobs()
+    threading.Thread(target=_heartbeat_loop, name='fieldlens-job-heartbeat', daemon=True).start()
+    return True
+
+@st.fragment(run_every=1.0)
+def _poll_job(job_id):
+    """Refresh the progress of an active job without rerunning the whole page"""
+    job = get_job(job_id)
+    if job is None or job['status'] not in ('queued', 'running'):
+        # Finished: rerun the page once so the result is shown outside the poller
+        st.rerun()
+    
+    st.progress(job['progress'], text=job['message'] or "Procesando...")
+    if st.button("✖ Cancelar", key=f"cancel_{job_id}"):
+        request_cancel(job_id)
+
+def show_job_status(job_id, download_label, file_name, mime):
+    """Show the progress of a job, or its download button once it is done"""
+    job = get_job(job_id)
+    if job is None:
+        return
+    
+    if job['status'] in ('queued', 'running'):
+        _poll_job(job_id)
+    elif job['status'] == 'done' and job['result_path'] and os.path.exists(job['result_path']):
+        with open(job['result_path'], 'rb') as f:
+            st.download_button(label=download_label, data=f, file_name=file_name, mime=mime, key=f"download_{job_id}")
+    elif job['status'] == 'cancelled':
+        st.info("Tarea cancelada.")
+    elif job['status'] == 'failed':
+        st.error(f"⚠️ La tarea falló: {job['message']}")
@@ -0,0 +1,205 @@
+import datetime
+import pandas as pd
+from sqlalchemy import select, insert, delete, func, or_
+import database as db
+from emissions import compute_emissions, store_emissions, get_emissions, get_farm_factors, ENERGY_SOURCES, FACTORS_SECTION
+from nitrogen import load_fertilization, load_farm_areas, fertilizer_nitrogen, nitrogen_balance
+
+# Sections the KPIs are computed from; a write to any of them makes the farm's KPIs stale
+KPI_SECTIONS = ['datos_generales', 'rebano', 'energia', 'fertilizacion', 'transporte', 'efluentes']
+
+# Emission sources added up into each footprint component
+SOURCE_GROUPS = {
+    'co2e_energy_kg': list(ENERGY_SOURCES),
+    'co2e_transport_kg': ['transporte'],
+    'co2e_methane_kg': ['ch4_enterico', 'ch4_estiercol'],
+    'co2e_n2o_kg': ['n2o_directo', 'n2o_indirecto']
+}
+
+# KPI column -> (label, unit) for dashboards and exports
+KPI_LABELS = {
+    'milk_liters': ("Leche producida", "L/año"),
+    'fpcm_kg': ("Leche corregida (FPCM)", "kg/año"),
+    'animals': ("Animales", "cabezas"),
+    'co2e_kg': ("Emisiones totales", "kg CO2e/año"),
+    'co2e_energy_kg': ("Emisiones de energía", "kg CO2e/año"),
+    'co2e_transport_kg': ("Emisiones de transporte", "kg CO2e/año"),
+    'co2e_methane_kg': ("Emisiones de metano", "kg CO2e/año"),
+    'co2e_n2o_kg': ("Emisiones de N2O", "kg CO2e/año"),
+    'co2e_per_liter': ("Huella por litro", "kg CO2e/L"),
+    'co2e_per_kg_fpcm': ("Huella por kg FPCM", "kg CO2e/kg FPCM"),
+    'co2e_per_ha': ("Emisiones por hectárea", "kg CO2e/ha"),
+    'co2e_per_cow': ("Emisiones por vaca en ordeñe", "kg CO2e/vaca"),
+    'n_per_ha': ("N aplicado por hectárea", "kg N/ha")
+}
+
+# kg per liter of milk
+MILK_DENSITY = 1.03
+
+# Standard milk composition, used when a farm has no fat or protein data
+STANDARD_FAT = 4.0
+STANDARD_PROTEIN = 3.3
+
+def load_farms(farm_ids=None):
+    """Period and production data of the farms"""
+    columns = ['farm_id', 'year', 'month', 'total_area', 'milking_cows', 'production_per_cow',
+               'fat_percentage', 'protein_percentage']
+    query = select(db.Farm.id, db.Farm.year, db.Farm.month, db.Farm.total_area, db.Farm.milking_cows,
+                   db.Farm.production_per_cow, db.Farm.fat_percentage, db.Farm.protein_percentage)
+    if farm_ids is not None:
+        query = query.where(db.Farm.id.in_(list(farm_ids)))
+    session = db.get_session()
+    try:
+        animals = select(db.Herd.farm_id, func.sum(db.Herd.animal_count)).group_by(db.Herd.farm_id)
+        if farm_ids is not None:
+            animals = animals.where(db.Herd.farm_id.in_(list(farm_ids)))
+        animals = pd.Series(dict(session.execute(animals).all()), dtype=float)
+        farms = pd.DataFrame(session.execute(query).all(), columns=columns).set_index('farm_id')
+    finally:
+        session.close()
+    farms['animals'] = animals.reindex(farms.index)
+    return farms
+
+def fpcm(milk_kg, fat, protein):
+    """Fat and protein corrected milk (IDF 2015), with the standard composition for missing data"""
+    fat = fat.where(fat > 0, STANDARD_FAT)
+    protein = protein.where(protein > 0, STANDARD_PROTEIN)
+    return milk_kg * (0.1226 * fat + 0.0776 * protein + 0.2534)
+
+def compute_kpis(farm_ids=None, emissions=None):
+    """KPIs of every farm period in one batch, one row per farm
+
+    All emissions are allocated to milk. Intensities are left empty when their
+    denominator (milk, area, cows) is missing or zero.
+    """
+    farms = load_farms(farm_ids)
+    if emissions is None:
+        emissions = compute_emissions(farm_ids)
+    numeric = farms[['total_area', 'milking_cows', 'production_per_cow', 'fat_percentage', 'protein_percentage']].apply(pd.to_numeric, errors='coerce')
+
+    area = numeric['total_area'].where(numeric['total_area'] > 0)
+    cows = numeric['milking_cows'].where(numeric['milking_cows'] > 0)
+    milk_liters = (numeric['production_per_cow'] * cows * 365).where(lambda liters: liters > 0)
+
+    kpis = pd.DataFrame(index=farms.index)
+    kpis['year'] = farms['year']
+    kpis['month'] = farms['month']
+    kpis['milk_liters'] = milk_liters
+    kpis['fpcm_kg'] = fpcm(milk_liters * MILK_DENSITY, numeric['fat_percentage'], numeric['protein_percentage'])
+    kpis['animals'] = farms['animals'].round().astype('Int64')
+
+    # Components without any emission row stay empty instead of adding up to zero
+    by_source = emissions.pivot_table(index='farm_id', columns='source', values='co2e_kg', aggfunc='sum')
+    for column, sources in SOURCE_GROUPS.items():
+        kpis[column] = by_source.reindex(index=kpis.index, columns=sources).sum(axis=1, min_count=1)
+    kpis['co2e_kg'] = kpis[list(SOURCE_GROUPS)].sum(axis=1, min_count=1)
+
+    kpis['co2e_per_liter'] = kpis['co2e_kg'] / kpis['milk_liters']
+    kpis['co2e_per_kg_fpcm'] = kpis['co2e_kg'] / kpis['fpcm_kg']
+    kpis['co2e_per_ha'] = kpis['co2e_kg'] / area
+    kpis['co2e_per_cow'] = kpis['co2e_kg'] / cows
+
+    factors = get_farm_factors(farm_ids)
+    balance = nitrogen_balance(fertilizer_nitrogen(load_fertilization(farm_ids), factors), load_farm_areas(farm_ids))
+    kpis['n_per_ha'] = balance['n_per_ha'].reindex(kpis.index)
+    kpis['factor_set_id'] = factors['factor_set_id'].reindex(kpis.index)
+    return kpis.rename_axis('farm_id').reset_index()
+
+def _records(kpis, computed_at):
+    """Table rows of a KPI frame, with None for missing values"""
+    kpis = kpis.assign(computed_at=computed_at).astype(object)
+    return kpis.where(kpis.notna(), None).to_dict('records')
+
+def recompute_kpis(farm_ids=None):
+    """Run the pipeline for some farms (all farms by default): emissions and KPIs, stored in one transaction"""
+    emissions = compute_emissions(farm_ids)
+    kpis = compute_kpis(farm_ids, emissions)
+    now = datetime.datetime.utcnow()
+
+    session = db.get_session()
+    try:
+        store_emissions(session, emissions, farm_ids, now)
+        query = delete(db.FarmKpi)
+        if farm_ids is not None:
+            query = query.where(db.FarmKpi.farm_id.in_(list(farm_ids)))
+        session.execute(query)
+        if not kpis.empty:
+            session.execute(insert(db.FarmKpi), _records(kpis, now))
+        # Metrics read from the KPIs may have been stored from the previous ones (e.g. old factors)
+        db.mark_metrics_dirty(session, FACTORS_SECTION, farm_ids)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+    return len(kpis)
+
+def recompute_kpis_job(job):
+    """Background job that recomputes emissions and KPIs of every farm"""
+    job.progress(0.0, "Recalculando emisiones e indicadores de todos los tambos...")
+    rows = recompute_kpis()
+    job.progress(1.0, f"Indicadores de {rows} tambos actualizados")
+
+def get_stale_farm_ids(farm_ids=None):
+    """Farms whose KPIs are missing or older than their last data change"""
+    updated = (
+        select(db.SectionState.farm_id, func.max(db.SectionState.updated_at).label('updated_at'))
+        .where(db.SectionState.section.in_(KPI_SECTIONS))
+        .group_by(db.SectionState.farm_id)
+        .subquery()
+    )
+    query = (
+        select(db.Farm.id)
+        .outerjoin(db.FarmKpi, db.FarmKpi.farm_id == db.Farm.id)
+        .outerjoin(updated, updated.c.farm_id == db.Farm.id)
+        .where(or_(db.FarmKpi.farm_id.is_(None), updated.c.updated_at > db.FarmKpi.computed_at))
+    )
+    if farm_ids is not None:
+        query = query.where(db.Farm.id.in_(list(farm_ids)))
+    session = db.get_session()
+    try:
+        return list(session.scalars(query))
+    finally:
+        session.close()
+
+def refresh_kpis(farm_ids=None):
+    """Recompute only the farms whose data changed since their KPIs were written"""
+    stale = get_stale_farm_ids(farm_ids)
+    if stale:
+        recompute_kpis(stale)
+    return len(stale)
+
+def get_farm_kpis(farm_ids=None):
+    """Stored KPIs of the farms (refreshed first if their data changed), indexed by farm id"""
+    refresh_kpis(farm_ids)
+    columns = ['farm_id', 'year', 'month', *KPI_LABELS, 'factor_set_id', 'computed_at']
+    query = select(*[getattr(db.FarmKpi, column) for column in columns])
+    if farm_ids is not None:
+        query = query.where(db.FarmKpi.farm_id.in_(list(farm_ids)))
+    session = db.get_session()
+    try:
+        rows = session.execute(query).all()
+    finally:
+        session.close()
+    kpis = pd.DataFrame(rows, columns=columns).set_index('farm_id')
+    # Empty KPIs come back as None; keep them as NaN in numeric columns
+    kpis[list(KPI_LABELS)] = kpis[list(KPI_LABELS)].apply(pd.to_numeric)
+    return kpis
+
+def get_farm_emissions(farm_ids=None):
+    """Stored emissions by source of the farms, refreshed like the KPIs"""
+    refresh_kpis(farm_ids)
+    return get_emissions(farm_ids)
+
+def get_kpi_table(farm_ids=None, include_farm=False):
+    """KPIs with readable 'Label (unit)' headers for reports, optionally with the farm name first"""
+    kpis = get_farm_kpis(farm_ids)
+    table = pd.DataFrame({'Año': kpis['year'], 'Mes': kpis['month']}, index=kpis.index)
+    for column, (label, unit) in KPI_LABELS.items():
+        table[f"{label} ({unit})"] = kpis[column].astype(float).round(4)
+    if include_farm:
+        names = pd.Series(dict(db.list_farms()))
+        table.insert(0, 'nombre_tambo', names.reindex(table.index).to_numpy())
+        table = table.sort_values('nombre_tambo')
+    return table.reset_index(drop=True)
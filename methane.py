@@ -0,0 +1,201 @@
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+import database as db
+
+# Default live weight (kg) and dry matter intake (% of live weight) per herd category
+CATEGORY_DEFAULTS = {
+    'Guachera': (80.0, 2.5),
+    'Recría': (200.0, 2.5),
+    'Vaquillonas': (350.0, 2.3),
+    'Vacas en Ordeñe': (600.0, 3.2),
+    'Vacas Secas': (600.0, 2.0),
+    'Toros': (800.0, 2.0),
+    'Otro': (400.0, 2.3)
+}
+
+# Methane conversion factor of each excreta management option
+MANAGEMENT_MCF = {
+    'Almacenaje sólidos': 'ch4_mcf_solidos',
+    'Laguna anaeróbica': 'ch4_mcf_laguna',
+    'Compostaje': 'ch4_mcf_compostaje',
+    'Aplicación directa': 'ch4_mcf_aplicacion',
+    'Sin manejo': 'ch4_mcf_corral'
+}
+SEPARATION = 'Separación sólidos/líquidos'
+
+# IPCC Tier 2 constants
+CH4_ENERGY = 55.65          # MJ per kg CH4
+URINARY_ENERGY = 0.04       # fraction of gross energy
+ASH = 0.08                  # ash content of manure (fraction of dry matter)
+CH4_DENSITY = 0.67          # kg CH4 per m³
+
+def load_herd(farm_ids=None):
+    """Herd rows of the farms"""
+    model = db.Herd
+    columns = ['farm_id', 'category', 'animal_count', 'average_weight', 'grazing_hours',
+               'dry_matter_diet', 'pasture_percentage', 'concentrate_percentage', 'others_percentage']
+    query = select(*[getattr(model, column) for column in columns])
+    if farm_ids is not None:
+        query = query.where(model.farm_id.in_(list(farm_ids)))
+    session = db.get_session()
+    try:
+        rows = session.execute(query).all()
+    finally:
+        session.close()
+    return pd.DataFrame(rows, columns=columns)
+
+def load_effluents(farm_ids=None):
+    """Effluent management rows of the farms"""
+    model = db.Effluent
+    columns = ['farm_id', 'sector', 'hours_per_day', 'excreta_management', 'separation_efficiency']
+    query = select(*[getattr(model, column) for column in columns])
+    if farm_ids is not None:
+        query = query.where(model.farm_id.in_(list(farm_ids)))
+    session = db.get_session()
+    try:
+        rows = session.execute(query).all()
+    finally:
+        session.close()
+    return pd.DataFrame(rows, columns=columns)
+
+def _numeric(series):
+    """Column as a float array with NaN for missing or invalid values"""
+    return pd.to_numeric(series, errors='coerce').to_numpy(dtype=float)
+
+def confined_mcf(effluents, factors):
+    """Hours-weighted methane conversion factor (fraction) of the manure collected off pasture, per farm
+
+    Pasture sectors are left out (grazing time is taken from the herd rows) and
+    solid/liquid separation splits the manure by the separation efficiency.
+    Farms without effluent rows use the open corral factor.
+    """
+    corral = factors['ch4_mcf_corral'] / 100
+    if effluents.empty:
+        return corral
+
+    rows = effluents[effluents['sector'] != 'Pastura']
+    farm_factors = factors.reindex(rows['farm_id'].to_numpy())
+    keys = rows['excreta_management'].map(MANAGEMENT_MCF).fillna('ch4_mcf_corral')
+    columns = farm_factors.columns.get_indexer(keys)
+    mcf = farm_factors.to_numpy(dtype=float)[np.arange(len(rows)), columns]
+
+    separated = (rows['excreta_management'] == SEPARATION).to_numpy()
+    efficiency = np.clip(np.nan_to_num(_numeric(rows['separation_efficiency'])), 0, 100) / 100
+    mcf = np.where(
+        separated,
+        efficiency * farm_factors['ch4_mcf_solidos'].to_numpy() + (1 - efficiency) * farm_factors['ch4_mcf_liquido'].to_numpy(),
+        mcf
+    ) / 100
+
+    hours = np.clip(np.nan_to_num(_numeric(rows['hours_per_day'])), 0, 24)
+    weighted = pd.DataFrame({'farm_id': rows['farm_id'].to_numpy(), 'mcf_hours': mcf * hours, 'hours': hours})
+    totals = weighted.groupby('farm_id')[['mcf_hours', 'hours']].sum()
+    by_farm = (totals['mcf_hours'] / totals['hours'].where(totals['hours'] > 0)).reindex(factors.index)
+    return by_farm.fillna(corral)
+
+# Factor keys the Tier 2 equations read per herd row
+TIER2_FACTORS = ['ch4_energia_bruta', 'ch4_ym_forraje', 'ch4_ym_concentrado', 'ch4_dig_forraje',
+                 'ch4_dig_concentrado', 'ch4_b0', 'ch4_mcf_pastura', 'gwp_ch4']
+
+def herd_inputs(herd, effluents, factors):
+    """Herd rows of farms with factors and the per-row arrays the Tier 2 equations need
+
+    Missing weights and intakes are filled from the category defaults, the diet
+    is reduced to its concentrate share and grazing to a fraction of the day.
+    """
+    herd = herd[herd['farm_id'].isin(factors.index)].reset_index(drop=True)
+    farm_factors = factors.reindex(herd['farm_id'].to_numpy())
+
+    # Category defaults fill missing weights and intakes
+    other_weight, other_intake = CATEGORY_DEFAULTS['Otro']
+    default_weight = herd['category'].map({k: w for k, (w, _) in CATEGORY_DEFAULTS.items()}).fillna(other_weight).to_numpy(dtype=float)
+    default_intake = herd['category'].map({k: i for k, (_, i) in CATEGORY_DEFAULTS.items()}).fillna(other_intake).to_numpy(dtype=float) / 100
+
+    weight = _numeric(herd['average_weight'])
+    weight = np.where(np.isnan(weight) | (weight <= 0), default_weight, weight)
+    dmi = _numeric(herd['dry_matter_diet'])
+    dmi = np.where(np.isnan(dmi) | (dmi <= 0), weight * default_intake, dmi)
+
+    # Diet shares: pasture and others are forage; an empty diet counts as all forage
+    forage = np.nan_to_num(_numeric(herd['pasture_percentage'])) + np.nan_to_num(_numeric(herd['others_percentage']))
+    concentrate = np.nan_to_num(_numeric(herd['concentrate_percentage']))
+    total = forage + concentrate
+
+    inputs = {key: farm_factors[key].to_numpy(dtype=float) for key in TIER2_FACTORS}
+    inputs.update(
+        animals=np.nan_to_num(_numeric(herd['animal_count'])),
+        weight=weight,
+        dmi=dmi,
+        concentrate_share=np.divide(concentrate, total, out=np.zeros_like(total), where=total > 0),
+        grazing=np.clip(np.nan_to_num(_numeric(herd['grazing_hours'])), 0, 24) / 24,
+        confined_mcf=confined_mcf(effluents, factors).reindex(herd['farm_id'].to_numpy()).to_numpy(dtype=float)
+    )
+    return herd, inputs
+
+def tier2_methane(inputs, concentrate_share=None, confined_mcf=None):
+    """Yearly kg CH4 per head of the IPCC 2019 Tier 2 equations
+
+    concentrate_share and confined_mcf default to the herd's own values and
+    may be arrays of any shape that broadcasts against the herd rows (e.g.
+    scenarios × rows). Manure methane is returned split into the part
+    dropped on pasture and the part handled by the confined management.
+    """
+    concentrate_share = inputs['concentrate_share'] if concentrate_share is None else concentrate_share
+    confined_mcf = inputs['confined_mcf'] if confined_mcf is None else confined_mcf
+    forage_share = 1 - concentrate_share
+
+    gross_energy = inputs['dmi'] * inputs['ch4_energia_bruta']
+    ym = forage_share * inputs['ch4_ym_forraje'] + concentrate_share * inputs['ch4_ym_concentrado']
+    digestibility = forage_share * inputs['ch4_dig_forraje'] + concentrate_share * inputs['ch4_dig_concentrado']
+
+    enteric = gross_energy * ym / 100 * 365 / CH4_ENERGY
+    volatile_solids = (gross_energy * (1 - digestibility / 100) + URINARY_ENERGY * gross_energy) * (1 - ASH) / inputs['ch4_energia_bruta']
+
+    # Grazing time goes to pasture, the rest to the farm's confined management
+    methane_potential = volatile_solids * 365 * inputs['ch4_b0'] * CH4_DENSITY
+    grazing = inputs['grazing']
+    return {
+        'gross_energy': gross_energy,
+        'ym': ym,
+        'volatile_solids': volatile_solids,
+        'mcf': grazing * inputs['ch4_mcf_pastura'] / 100 + (1 - grazing) * confined_mcf,
+        'enteric': enteric,
+        'manure_pasture': methane_potential * grazing * inputs['ch4_mcf_pastura'] / 100,
+        'manure_confined': methane_potential * (1 - grazing) * confined_mcf
+    }
+
+def herd_methane(herd, effluents, factors):
+    """Tier 2 enteric and manure methane of every herd row, in one array pass
+
+    Returns the herd rows with dry matter intake, gross energy, Ym, volatile
+    solids, manure MCF and yearly kg CH4 / kg CO2e of each row.
+    """
+    if herd.empty:
+        return herd.assign(enteric_ch4_kg=[], manure_ch4_kg=[], enteric_co2e_kg=[], manure_co2e_kg=[])
+
+    herd, inputs = herd_inputs(herd, effluents, factors)
+    result = tier2_methane(inputs)
+    animals = inputs['animals']
+    manure_per_head = result['manure_pasture'] + result['manure_confined']
+    gwp = inputs['gwp_ch4']
+    return herd.assign(
+        weight_kg=inputs['weight'],
+        dmi_kg=inputs['dmi'],
+        gross_energy_mj=result['gross_energy'],
+        ym=result['ym'],
+        volatile_solids_kg=result['volatile_solids'],
+        mcf=result['mcf'],
+        enteric_ch4_kg=result['enteric'] * animals,
+        manure_ch4_kg=manure_per_head * animals,
+        enteric_co2e_kg=result['enteric'] * animals * gwp,
+        manure_co2e_kg=manure_per_head * animals * gwp
+    )
+
+def methane_emissions(detail):
+    """Farm totals of a herd_methane result in the emissions long format"""
+    if detail.empty:
+        return pd.DataFrame(columns=['farm_id', 'source', 'co2e_kg'])
+    totals = detail.groupby('farm_id')[['enteric_co2e_kg', 'manure_co2e_kg']].sum()
+    totals.columns = ['ch4_enterico', 'ch4_estiercol']
+    return totals.reset_index().melt(id_vars='farm_id', var_name='source', value_name='co2e_kg')
@@ -0,0 +1,146 @@
+import datetime
+import threading
+import pandas as pd
+from sqlalchemy import select, insert, delete
+import database as db
+from herd import farm_herd_totals
+from emissions import FACTORS_SECTION
+from kpis import get_farm_kpis, load_farms, fpcm, KPI_SECTIONS, MILK_DENSITY
+
+# name -> (input sections, compute(farm_ids) returning a Series indexed by farm id)
+METRICS = {}
+
+_dependencies_synced = False
+_sync_lock = threading.Lock()
+
+def derived_metric(name, sections):
+    """Register a per-farm metric computed from some sections"""
+    def register(compute):
+        METRICS[name] = (list(sections), compute)
+        return compute
+    return register
+
+@derived_metric('animales', ['rebano'])
+def _animals(farm_ids):
+    return farm_herd_totals(farm_ids)['animal_count']
+
+@derived_metric('peso_total_rebano', ['rebano'])
+def _herd_weight(farm_ids):
+    return farm_herd_totals(farm_ids)['total_weight_kg']
+
+@derived_metric('consumo_ms_rebano', ['rebano'])
+def _herd_dry_matter(farm_ids):
+    return farm_herd_totals(farm_ids)['dry_matter_total_kg']
+
+@derived_metric('fpcm_kg', ['datos_generales'])
+def _fpcm(farm_ids):
+    farms = load_farms(farm_ids)
+    numeric = farms[['milking_cows', 'production_per_cow', 'fat_percentage', 'protein_percentage']].apply(pd.to_numeric, errors='coerce')
+    liters = (numeric['production_per_cow'] * numeric['milking_cows'] * 365).where(lambda liters: liters > 0)
+    return fpcm(liters * MILK_DENSITY, numeric['fat_percentage'], numeric['protein_percentage'])
+
+@derived_metric('co2e_kg', KPI_SECTIONS + [FACTORS_SECTION])
+def _co2e(farm_ids):
+    return get_farm_kpis(farm_ids)['co2e_kg']
+
+@derived_metric('co2e_por_kg_fpcm', KPI_SECTIONS + [FACTORS_SECTION])
+def _co2e_per_fpcm(farm_ids):
+    return get_farm_kpis(farm_ids)['co2e_per_kg_fpcm']
+
+@derived_metric('completitud', list(db.SECTION_MODELS))
+def _completeness(farm_ids):
+    counts = db.get_completeness().reindex(farm_ids, fill_value=0)
+    return (counts > 0).mean(axis=1) * 100
+
+def sync_dependencies():
+    """Store the input sections of every registered metric (once per process)
+
+    Metrics whose inputs changed since the last run are marked dirty, so
+    their stored values are recomputed with the new definition.
+    """
+    global _dependencies_synced
+    with _sync_lock:
+        if _dependencies_synced:
+            return
+        session = db.get_session()
+        try:
+            stored = pd.DataFrame(
+                session.execute(select(db.MetricDependency.metric, db.MetricDependency.section)).all(),
+                columns=['metric', 'section']
+            ).groupby('metric')['section'].apply(set).to_dict()
+            changed = [name for name, (sections, _) in METRICS.items() if stored.get(name) != set(sections)]
+            if changed:
+                session.execute(delete(db.MetricDependency).where(db.MetricDependency.metric.in_(changed)))
+                session.execute(insert(db.MetricDependency), [
+                    {'metric': name, 'section': section} for name in changed for section in set(METRICS[name][0])
+                ])
+                session.execute(
+                    db.DerivedMetric.__table__.update().where(db.DerivedMetric.metric.in_(changed)).values(dirty=True)
+                )
+            session.commit()
+        finally:
+            session.close()
+        _dependencies_synced = True
+
+def recompute_metrics(name, farm_ids):
+    """Compute one metric for some farms and store the values as clean"""
+    _, compute = METRICS[name]
+    # Farms missing from the inputs come back as NaN, never as an object column
+    values = pd.to_numeric(compute(list(farm_ids)).reindex(list(farm_ids)), errors='coerce').astype(float)
+    now = datetime.datetime.utcnow()
+
+    session = db.get_session()
+    try:
+        session.execute(delete(db.DerivedMetric).where(
+            db.DerivedMetric.metric == name, db.DerivedMetric.farm_id.in_(list(farm_ids))
+        ))
+        session.execute(insert(db.DerivedMetric), [
+            {'farm_id': farm_id, 'metric': name, 'value': None if pd.isna(value) else float(value), 'dirty': False, 'computed_at': now}
+            for farm_id, value in values.items()
+        ])
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+    return values
+
+def get_metrics(names=None, farm_ids=None):
+    """Derived metrics of some farms (index) by metric (columns)
+
+    Stored values are returned as they are; only metrics that are missing or
+    were marked dirty by a write to one of their sections are recomputed, in
+    one batch per metric.
+    """
+    sync_dependencies()
+    names = list(METRICS) if names is None else list(names)
+
+    session = db.get_session()
+    try:
+        if farm_ids is None:
+            farm_ids = list(session.scalars(select(db.Farm.id)))
+        farm_ids = [farm_id for farm_id in farm_ids if farm_id is not None]
+        rows = session.execute(
+            select(db.DerivedMetric.farm_id, db.DerivedMetric.metric, db.DerivedMetric.value, db.DerivedMetric.dirty)
+            .where(db.DerivedMetric.metric.in_(names), db.DerivedMetric.farm_id.in_(farm_ids))
+        ).all()
+    finally:
+        session.close()
+
+    stored = pd.DataFrame(rows, columns=['farm_id', 'metric', 'value', 'dirty'])
+    clean = stored[~stored['dirty'].astype(bool)]
+    values = clean.pivot(index='farm_id', columns='metric', values='value').reindex(index=farm_ids, columns=names)
+
+    for name in names:
+        fresh = set(clean.loc[clean['metric'] == name, 'farm_id'])
+        pending = [farm_id for farm_id in farm_ids if farm_id not in fresh]
+        if pending:
+            values.loc[pending, name] = recompute_metrics(name, pending).to_numpy(dtype=float)
+    return values.astype(float)
+
+def get_farm_metrics(farm_id, names=None):
+    """Derived metrics of one farm as a Series"""
+    if farm_id is None:
+        return pd.Series(dtype=float)
+    return get_metrics(names, [farm_id]).iloc[0]
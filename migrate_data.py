@@ -1,99 +1,361 @@
 import os
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
 import pandas as pd
 import database as db
 
-def migrate_csv_to_database():
+# Sections in import order (farms first so related rows can reference them)
+IMPORT_ORDER = [
+    'datos_generales',
+    'superficies_insumos',
+    'manejo',
+    'fertilizacion',
+    'proteccion_cultivos',
+    'riego',
+    'energia',
+    'rebano',
+    'efluentes',
+    'transporte'
+]
+
+DEFAULT_CHUNKSIZE = 5000
+
+def file_signature(csv_path):
+    """Size and modification time used to detect a changed source file"""
+    stat = os.stat(csv_path)
+    return stat.st_size, stat.st_mtime
+
+def get_checkpoint(session, csv_path):
+    """Get the stored checkpoint for a CSV file, or None if it changed since"""
+    checkpoint = session.get(db.ImportCheckpoint, os.path.abspath(csv_path))
+    if checkpoint is None:
+        return None
+
+    file_size, file_mtime = file_signature(csv_path)
+    if checkpoint.file_size != file_size or checkpoint.file_mtime != file_mtime:
+        return None
+    return checkpoint
+
+def save_checkpoint(session, csv_path, rows_done, completed=False):
+    """Record import progress in the same transaction as the imported chunk"""
+    file_size, file_mtime = file_signature(csv_path)
+    session.merge(db.ImportCheckpoint(
+        source=os.path.abspath(csv_path),
+        file_size=file_size,
+        file_mtime=file_mtime,
+        rows_done=rows_done,
+        completed=completed
+    ))
+
+def clear_checkpoints():
+    """Forget all import progress so every file is imported again"""
+    session = db.get_session()
+    session.query(db.ImportCheckpoint).delete()
+    session.commit()
+    session.close()
+
+def assign_farm_ids(chunk, farm_ids_by_name, default_farm_id):
+    """Resolve the farm each related row belongs to"""
+    # Explicit farm_id column wins, then the farm name, then the default farm
+    farm_ids = pd.Series(default_farm_id, index=chunk.index, dtype=object)
+    if 'nombre_tambo' in chunk.columns:
+        by_name = chunk['nombre_tambo'].map(farm_ids_by_name)
+        farm_ids = by_name.where(by_name.notna(), farm_ids)
+    if 'farm_id' in chunk.columns:
+        farm_ids = chunk['farm_id'].where(chunk['farm_id'].notna(), farm_ids)
+    return farm_ids
+
+def import_csv(csv_path, section, chunksize=DEFAULT_CHUNKSIZE, default_farm_id=None):
+    """Stream one CSV file into its section table, resuming from the last checkpoint"""
+    session = db.get_session()
+    checkpoint = get_checkpoint(session, csv_path)
+
+    if checkpoint is not None and checkpoint.completed:
+        print(f"{os.path.basename(csv_path)} already imported. Skipping...")
+        session.close()
+        return 0, None
+
+    rows_done = checkpoint.rows_done if checkpoint is not None else 0
+    if rows_done:
+        print(f"Resuming {os.path.basename(csv_path)} after {rows_done} rows...")
+    else:
+        print(f"Migrating {os.path.basename(csv_path)}...")
+
+    farm_ids_by_name = db.get_farm_ids_by_name(session) if section != 'datos_generales' else {}
+    if section != 'datos_generales' and default_farm_id is None:
+        default_farm_id = db.get_latest_farm_id()
+
+    imported = 0
+    skipped = 0
+    duplicates = 0
+    last_farm_id = None
+    start = time.perf_counter()
+
+    # Stored rows already matched or written by this file, shared by its chunks
+    claimed = set()
+
+    reader = pd.read_csv(csv_path, chunksize=chunksize, skiprows=range(1, rows_done + 1))
+    try:
+        for chunk in reader:
+            chunk_rows = len(chunk)
+            if section != 'datos_generales':
+                chunk['farm_id'] = assign_farm_ids(chunk, farm_ids_by_name, default_farm_id)
+                orphans = chunk['farm_id'].isna()
+                if orphans.any():
+                    print(f"  {int(orphans.sum())} rows without a farm. Skipping them...")
+                    chunk = chunk[~orphans]
+
+            mapped = db.map_section_frame(section, chunk)
+            records = db.frame_to_records(mapped)
+
+            try:
+                result = db.upsert_records(session, section, records, claimed)
+                rows_done += chunk_rows
+                save_checkpoint(session, csv_path, rows_done)
+                session.commit()
+            except Exception:
+                session.rollback()
+                raise
+
+            if section == 'datos_generales' and not mapped.empty:
+                last_farm_id = mapped['id'].iloc[-1]
+                last_farm_id = result['id_map'].get(last_farm_id, last_farm_id)
+
+            imported += result['inserted'] + result['updated']
+            skipped += result['skipped']
+            duplicates += result['duplicates']
+            elapsed = time.perf_counter() - start
+            rate = (imported + skipped + duplicates) / elapsed if elapsed > 0 else 0
+            print(f"  {imported} rows written, {skipped} unchanged, {duplicates} already stored ({rate:.0f} rows/s)")
+
+        save_checkpoint(session, csv_path, rows_done, completed=True)
+        session.commit()
+    finally:
+        session.close()
+
+    return imported, last_farm_id
+
+def migrate_csv_to_database(data_dir="data", chunksize=DEFAULT_CHUNKSIZE):
     """Migrate data from CSV files to the database"""
     print("Starting data migration from CSV files to database...")
-    
-    data_dir = "data"
+
     if not os.path.exists(data_dir):
         print("No data directory found. Nothing to migrate.")
         return
-    
+
     # Check for CSV files
-    csv_files = [f for f in os.listdir(data_dir) if f.endswith('.csv')]
+    csv_files = [f"{section}.csv" for section in IMPORT_ORDER
+                 if os.path.exists(os.path.join(data_dir, f"{section}.csv"))]
     if not csv_files:
         print("No CSV files found. Nothing to migrate.")
         return
+
+    total_rows = 0
+    default_farm_id = None
+    start = time.perf_counter()
+
+    # Farms are imported first; related rows without a farm column go to the last farm
+    for csv_file in csv_files:
+        section = csv_file[:-len('.csv')]
+        rows, last_farm_id = import_csv(
+            os.path.join(data_dir, csv_file),
+            section,
+            chunksize=chunksize,
+            default_farm_id=default_farm_id
+        )
+        if last_farm_id:
+            default_farm_id = last_farm_id
+        total_rows += rows
+
+    elapsed = time.perf_counter() - start
+    rate = total_rows / elapsed if elapsed > 0 else 0
+    print(f"Migration completed successfully! {total_rows} rows written in {elapsed:.1f}s ({rate:.0f} rows/s)")
+
+def folder_signature(folder):
+    """Total size and latest modification time of the CSV files in a farm folder"""
+    stats = [os.stat(os.path.join(folder, f)) for f in os.listdir(folder) if f.endswith('.csv')]
+    return sum(stat.st_size for stat in stats), max((stat.st_mtime for stat in stats), default=0.0)
+
+def parse_farm_folder(folder):
+    """Parse and validate the section CSVs of one farm folder (runs in a worker process)"""
+    farm_path = os.path.join(folder, 'datos_generales.csv')
+    if not os.path.exists(farm_path):
+        return folder, None, ["missing datos_generales.csv"]
+
+    farms = db.map_section_frame('datos_generales', pd.read_csv(farm_path))
+    if len(farms) != 1:
+        return folder, None, [f"expected one farm in datos_generales.csv, found {len(farms)}"]
+    if not farms['name'].iloc[0]:
+        return folder, None, ["farm without nombre_tambo"]
+
+    farm_id = farms['id'].iloc[0]
+    batches = {'datos_generales': db.frame_to_records(farms)}
+    warnings = []
+
+    for section in IMPORT_ORDER[1:]:
+        csv_path = os.path.join(folder, f"{section}.csv")
+        if not os.path.exists(csv_path):
+            continue
+
+        df = pd.read_csv(csv_path)
+        df['farm_id'] = farm_id
+        mapped = db.map_section_frame(section, df)
+
+        # Percentages outside 0-100 are kept but reported
+        percentage_columns = [col for col in mapped.columns if 'percentage' in col or col == 'separation_efficiency']
+        for col in percentage_columns:
+            invalid = ~mapped[col].isna() & ((mapped[col] < 0) | (mapped[col] > 100))
+            if invalid.any():
+                warnings.append(f"{section}.{col}: {int(invalid.sum())} values outside 0-100")
+
+        batches[section] = db.frame_to_records(mapped)
+
+    return folder, batches, warnings
+
+def write_farm_batches(session, folder, batches):
+    """Write all sections of one farm and its checkpoint in a single transaction
     
-    # Map CSV files to database functions
-    file_to_func = {
-        'datos_generales.csv': db.add_farm,
-        'superficies_insumos.csv': db.add_surface,
-        'manejo.csv': db.add_management,
-        'fertilizacion.csv': db.add_fertilization,
-        'proteccion_cultivos.csv': db.add_crop_protection,
-        'riego.csv': db.add_irrigation,
-        'energia.csv': db.add_energy,
-        'rebano.csv': db.add_herd,
-        'efluentes.csv': db.add_effluent,
-        'transporte.csv': db.add_transport
+    Returns the rows written and the rows matched to already stored ones.
+    """
+    try:
+        rows = 0
+        duplicates = 0
+        claimed = set()
+        farm_result = db.upsert_records(session, 'datos_generales', batches['datos_generales'], claimed)
+        rows += farm_result['inserted'] + farm_result['updated']
+        duplicates += farm_result['duplicates']
+
+        # Point related rows at the stored farm when the farm itself was unchanged
+        for section in IMPORT_ORDER[1:]:
+            records = batches.get(section, [])
+            for record in records:
+                record['farm_id'] = farm_result['id_map'].get(record['farm_id'], record['farm_id'])
+            result = db.upsert_records(session, section, records, claimed)
+            rows += result['inserted'] + result['updated']
+            duplicates += result['duplicates']
+
+        file_size, file_mtime = folder_signature(folder)
+        session.merge(db.ImportCheckpoint(
+            source=os.path.abspath(folder),
+            file_size=file_size,
+            file_mtime=file_mtime,
+            rows_done=rows,
+            completed=True
+        ))
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    return rows, duplicates
+
+def pending_farm_folders(farms_dir):
+    """List farm folders that have not been imported since they last changed"""
+    folders = sorted(
+        os.path.join(farms_dir, name) for name in os.listdir(farms_dir)
+        if os.path.isdir(os.path.join(farms_dir, name))
+    )
+
+    session = db.get_session()
+    done = {
+        checkpoint.source: (checkpoint.file_size, checkpoint.file_mtime)
+        for checkpoint in session.query(db.ImportCheckpoint).filter_by(completed=True)
     }
-    
-    # Process each CSV file
-    for csv_file in csv_files:
-        if csv_file in file_to_func:
-            print(f"Migrating {csv_file}...")
-            
-            # Read CSV file
-            csv_path = os.path.join(data_dir, csv_file)
-            df = pd.read_csv(csv_path)
-            
-            # If the dataframe is empty, skip
-            if df.empty:
-                print(f"No data in {csv_file}. Skipping...")
-                continue
-            
-            # Get the appropriate database function
-            db_func = file_to_func[csv_file]
-            
-            # Special case for datos_generales.csv (farm data)
-            if csv_file == 'datos_generales.csv':
-                # Process farm data first
-                farm_id = None
-                for _, row in df.iterrows():
-                    farm_id = db_func(row.to_dict())
-                
-                # Store farm_id for related entities
-                if farm_id:
-                    print(f"Farm ID: {farm_id} migrated.")
-                    
-                    # Now process the related entities using the farm_id
-                    for related_csv in csv_files:
-                        if related_csv != 'datos_generales.csv' and related_csv in file_to_func:
-                            print(f"Migrating {related_csv} for farm {farm_id}...")
-                            
-                            # Read related CSV file
-                            related_csv_path = os.path.join(data_dir, related_csv)
-                            related_df = pd.read_csv(related_csv_path)
-                            
-                            # If the dataframe is empty, skip
-                            if related_df.empty:
-                                print(f"No data in {related_csv}. Skipping...")
-                                continue
-                            
-                            # Get the appropriate database function
-                            related_db_func = file_to_func[related_csv]
-                            
-                            # Process each row
-                            for _, row in related_df.iterrows():
-                                data_dict = row.to_dict()
-                                related_db_func(data_dict, farm_id)
-                    
-                    # Skip further processing as we've already handled all files
+    session.close()
+
+    return [folder for folder in folders if done.get(os.path.abspath(folder)) != folder_signature(folder)]
+
+def migrate_farm_folders(farms_dir, workers=None):
+    """Import a directory of farm folders, parsing in parallel and writing serially"""
+    print(f"Starting parallel migration from {farms_dir}...")
+
+    if not os.path.isdir(farms_dir):
+        print("Farms directory not found. Nothing to migrate.")
+        return
+
+    folders = pending_farm_folders(farms_dir)
+    if not folders:
+        print("No pending farm folders. Nothing to migrate.")
+        return
+
+    workers = workers or os.cpu_count() or 1
+    total_rows = 0
+    imported_farms = 0
+    failed_farms = 0
+    start = time.perf_counter()
+
+    # Keep a bounded number of parsed farms in flight so memory stays flat
+    session = db.get_session()
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            remaining = iter(folders)
+            # Folder of every parse in flight, to name it if the worker fails
+            in_flight = {}
+            for folder in remaining:
+                in_flight[executor.submit(parse_farm_folder, folder)] = folder
+                if len(in_flight) >= workers * 2:
                     break
-            # Regular case for non-farm data (only used if farm data is not present)
-            else:
-                # Process each row
-                for _, row in df.iterrows():
-                    db_func(row.to_dict())
-    
-    print("Migration completed successfully!")
+
+            while in_flight:
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = os.path.basename(in_flight.pop(future))
+                    try:
+                        folder, batches, messages = future.result()
+                        if batches is not None:
+                            # The main process is the only writer
+                            rows, duplicates = write_farm_batches(session, folder, batches)
+                            if duplicates:
+                                messages.append(f"{duplicates} rows already stored")
+                    except Exception as e:
+                        # One malformed farm must not stop the others
+                        batches, messages = None, [f"{type(e).__name__}: {str(e).strip()}"]
+
+                    if batches is None:
+                        failed_farms += 1
+                        print(f"  {name}: skipped ({'; '.join(messages)})")
+                    else:
+                        total_rows += rows
+                        imported_farms += 1
+                        for message in messages:
+                            print(f"  {name}: {message}")
+
+                        if imported_farms % 50 == 0:
+                            elapsed = time.perf_counter() - start
+                            print(f"  {imported_farms} farms, {total_rows} rows ({total_rows / elapsed:.0f} rows/s)")
+
+                    next_folder = next(remaining, None)
+                    if next_folder is not None:
+                        in_flight[executor.submit(parse_farm_folder, next_folder)] = next_folder
+    finally:
+        session.close()
+
+    elapsed = time.perf_counter() - start
+    rate = total_rows / elapsed if elapsed > 0 else 0
+    print(f"Migration completed! {imported_farms} farms ({failed_farms} skipped), "
+          f"{total_rows} rows written in {elapsed:.1f}s ({rate:.0f} rows/s)")
+
+def parse_args(argv=None):
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Import FieldLens CSV files into the database")
+    parser.add_argument("--data-dir", default="data", help="Directory containing the section CSV files")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE, help="Rows read and written per batch")
+    parser.add_argument("--farms-dir", help="Directory with one folder of section CSVs per farm")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes used to parse farm folders")
+    parser.add_argument("--restart", action="store_true", help="Ignore checkpoints and import every file again")
+    return parser.parse_args(argv)
 
 if __name__ == "__main__":
+    args = parse_args()
+
     # Ensure database tables exist
     db.create_tables()
-    
+
+    if args.restart:
+        clear_checkpoints()
+
     # Migrate data from CSV files to database
-    migrate_csv_to_database()
\ No newline at end of file
+    if args.farms_dir:
+        migrate_farm_folders(args.farms_dir, workers=args.workers)
+    else:
+        migrate_csv_to_database(args.data_dir, chunksize=args.chunksize)
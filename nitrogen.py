@@ -0,0 +1,145 @@
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+import database as db
+
+# N content factor of each fertilizer type
+FERTILIZER_N = {
+    'Urea': 'n_urea',
+    'Fosfato diamónico': 'n_fosfato_diamonico',
+    'Nitrato de amonio': 'n_nitrato_amonio',
+    'NPK': 'n_npk',
+    'Orgánico': 'n_organico',
+    'Otro': 'n_otro'
+}
+
+# N2O-N to N2O mass ratio (44/28)
+N2O_PER_N = 44 / 28
+
+def load_fertilization(farm_ids=None):
+    """Fertilization rows of the farms"""
+    model = db.Fertilization
+    columns = ['farm_id', 'type', 'hectares', 'area_percentage', 'applied_quantity_kg_ha', 'applied_quantity_total',
+               'use_inhibitors', 'protected_urea', 'n_adjustment']
+    query = select(*[getattr(model, column) for column in columns])
+    if farm_ids is not None:
+        query = query.where(model.farm_id.in_(list(farm_ids)))
+    session = db.get_session()
+    try:
+        rows = session.execute(query).all()
+    finally:
+        session.close()
+    return pd.DataFrame(rows, columns=columns)
+
+def load_farm_areas(farm_ids=None):
+    """Total area (ha) of the farms"""
+    query = select(db.Farm.id, db.Farm.total_area)
+    if farm_ids is not None:
+        query = query.where(db.Farm.id.in_(list(farm_ids)))
+    session = db.get_session()
+    try:
+        rows = session.execute(query).all()
+    finally:
+        session.close()
+    return pd.to_numeric(pd.Series(dict(rows), dtype=object), errors='coerce')
+
+def _numeric(series):
+    """Column as a float array with NaN for missing or invalid values"""
+    return pd.to_numeric(series, errors='coerce').to_numpy(dtype=float)
+
+def _flag(series):
+    """'Sí'/'No' column as a boolean array"""
+    return series.fillna('').astype(str).str.strip().str.lower().isin(['sí', 'si']).to_numpy()
+
+def fertilizer_nitrogen(fertilization, factors):
+    """Applied N, its losses and N2O of every fertilization row, in one array pass
+
+    Follows the IPCC 2019 Tier 1 equations: direct N2O from the applied N and
+    indirect N2O from the volatilized and leached fractions. Nitrification
+    inhibitors cut direct N2O and protected urea cuts urea volatilization.
+    """
+    if fertilization.empty:
+        return fertilization.assign(n_kg=[], n2o_direct_kg=[], n2o_indirect_kg=[], direct_co2e_kg=[], indirect_co2e_kg=[])
+
+    rows = fertilization[fertilization['farm_id'].isin(factors.index)].reset_index(drop=True)
+    farm_factors = factors.reindex(rows['farm_id'].to_numpy())
+
+    def factor(key):
+        return farm_factors[key].to_numpy(dtype=float)
+
+    def fraction(key):
+        return factor(key) / 100
+
+    # Fertilized area; a missing percentage means the whole plot
+    hectares = np.nan_to_num(_numeric(rows['hectares']))
+    share = _numeric(rows['area_percentage'])
+    share = np.where(np.isnan(share), 100, np.clip(share, 0, 100)) / 100
+    fertilized_ha = hectares * share
+
+    # The total applied wins over the per-hectare rate when both were entered
+    total = _numeric(rows['applied_quantity_total'])
+    per_ha = np.nan_to_num(_numeric(rows['applied_quantity_kg_ha']))
+    product_kg = np.where(np.isnan(total) | (total <= 0), per_ha * fertilized_ha, total)
+
+    keys = rows['type'].map(FERTILIZER_N).fillna('n_otro')
+    n_content = farm_factors.to_numpy(dtype=float)[np.arange(len(rows)), farm_factors.columns.get_indexer(keys)] / 100
+    n_kg = product_kg * n_content
+
+    is_urea = (rows['type'] == 'Urea').to_numpy()
+    is_organic = (rows['type'] == 'Orgánico').to_numpy()
+    inhibitors = _flag(rows['use_inhibitors'])
+    protected = _flag(rows['protected_urea']) & is_urea
+
+    volatilization = np.select(
+        [is_urea, is_organic],
+        [fraction('n2o_frac_vol_urea'), fraction('n2o_frac_vol_organico')],
+        fraction('n2o_frac_vol_sintetico')
+    )
+    volatilization = volatilization * np.where(protected, 1 - fraction('n2o_reduccion_urea_protegida'), 1)
+    direct_ef = fraction('n2o_ef_directo') * np.where(inhibitors, 1 - fraction('n2o_reduccion_inhibidor'), 1)
+
+    n_volatilized = n_kg * volatilization
+    n_leached = n_kg * fraction('n2o_frac_lixiviacion')
+    n2o_n_direct = n_kg * direct_ef
+    n2o_n_indirect = n_volatilized * fraction('n2o_ef_volatilizacion') + n_leached * fraction('n2o_ef_lixiviacion')
+
+    gwp = factor('gwp_n2o')
+    return rows.assign(
+        fertilized_ha=fertilized_ha,
+        product_kg=product_kg,
+        n_kg=n_kg,
+        n_volatilized_kg=n_volatilized,
+        n_leached_kg=n_leached,
+        n2o_n_direct_kg=n2o_n_direct,
+        n2o_n_kg=n2o_n_direct + n2o_n_indirect,
+        n2o_direct_kg=n2o_n_direct * N2O_PER_N,
+        n2o_indirect_kg=n2o_n_indirect * N2O_PER_N,
+        direct_co2e_kg=n2o_n_direct * N2O_PER_N * gwp,
+        indirect_co2e_kg=n2o_n_indirect * N2O_PER_N * gwp,
+        adjusted=_flag(rows['n_adjustment'])
+    )
+
+def nitrogen_balance(detail, areas):
+    """Per-farm N balance of the fertilization: applied N, N per hectare and where it goes"""
+    columns = ['fertilized_ha', 'n_kg', 'n_volatilized_kg', 'n_leached_kg', 'n2o_n_direct_kg', 'n2o_n_kg']
+    if detail.empty:
+        return pd.DataFrame(columns=columns + ['n_per_fertilized_ha', 'n_per_ha', 'n_retained_kg', 'adjusted_share'])
+
+    balance = detail.groupby('farm_id')[columns].sum()
+    balance['n_per_fertilized_ha'] = balance['n_kg'] / balance['fertilized_ha'].where(balance['fertilized_ha'] > 0)
+    balance['n_per_ha'] = balance['n_kg'] / areas.reindex(balance.index).where(lambda area: area > 0)
+    # Indirect N2O comes out of the volatilized and leached N, so only direct N2O is subtracted
+    balance['n_retained_kg'] = balance['n_kg'] - balance['n_volatilized_kg'] - balance['n_leached_kg'] - balance['n2o_n_direct_kg']
+
+    # Share of the applied N whose dose was adjusted (soil test or balance)
+    adjusted_n = detail['n_kg'].where(detail['adjusted'], 0).groupby(detail['farm_id']).sum()
+    balance['adjusted_share'] = adjusted_n / balance['n_kg'].where(balance['n_kg'] > 0)
+    return balance
+
+def n2o_emissions(detail):
+    """Farm totals of a fertilizer_nitrogen result in the emissions long format"""
+    if detail.empty:
+        return pd.DataFrame(columns=['farm_id', 'source', 'co2e_kg'])
+    totals = detail.groupby('farm_id')[['direct_co2e_kg', 'indirect_co2e_kg']].sum()
+    totals.columns = ['n2o_directo', 'n2o_indirecto']
+    return totals.reset_index().melt(id_vars='farm_id', var_name='source', value_name='co2e_kg')
@@ -0,0 +1,203 @@
+import os
+import glob
+import time
+import argparse
+import shutil
+import tempfile
+import zipfile
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import Integer, Float, Boolean, DateTime
+import database as db
+from migrate_data import IMPORT_ORDER
+
+# Rows per Parquet row group (and per database batch on import)
+ROW_GROUP_SIZE = 50000
+
+# Rows per part file inside a section directory
+ROWS_PER_FILE = 1000000
+
+COMPRESSION = 'zstd'
+
+def section_schema(section):
+    """Arrow schema of a section extract, typed from the model columns"""
+    model = db.SECTION_MODELS[section]
+    attributes = {'uuid': 'id', 'farm_id': 'farm_id', 'created_at': 'created_at', **db.SECTION_COLUMNS[section]}
+
+    fields = []
+    for column in db.get_section_columns(section, include_ids=True):
+        column_type = model.__table__.columns[attributes[column]].type
+        if isinstance(column_type, Integer):
+            arrow_type = pa.int64()
+        elif isinstance(column_type, Float):
+            arrow_type = pa.float64()
+        elif isinstance(column_type, Boolean):
+            arrow_type = pa.bool_()
+        elif isinstance(column_type, DateTime):
+            arrow_type = pa.timestamp('us')
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(column, arrow_type))
+    return pa.schema(fields)
+
+def _rows_to_batch(rows, schema):
+    """Build a typed record batch from row tuples"""
+    columns = list(zip(*rows))
+    arrays = []
+    for values, field in zip(columns, schema):
+        if pa.types.is_integer(field.type) or pa.types.is_floating(field.type):
+            # Tolerate text left in numeric columns by older forms
+            values = [_to_number(value) for value in values]
+        arrays.append(pa.array(values, type=field.type, from_pandas=True))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+def _to_number(value):
+    """Convert a stored value to a number, or None when it is not numeric"""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def _chunks(rows, size):
+    """Group an iterator of rows into lists of at most size rows"""
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def export_section(section, out_dir):
+    """Stream one section table into Parquet part files and return the row count"""
+    schema = section_schema(section)
+    section_dir = os.path.join(out_dir, section)
+    os.makedirs(section_dir, exist_ok=True)
+
+    writer = None
+    part = 0
+    rows_in_file = 0
+    rows_written = 0
+    try:
+        for rows in _chunks(db.iter_section_rows(section, include_ids=True, chunk_size=ROW_GROUP_SIZE), ROW_GROUP_SIZE):
+            # Start a new part file once the current one is full
+            if writer is None or rows_in_file >= ROWS_PER_FILE:
+                if writer is not None:
+                    writer.close()
+                    part += 1
+                writer = pq.ParquetWriter(os.path.join(section_dir, f"part-{part:05d}.parquet"), schema, compression=COMPRESSION)
+                rows_in_file = 0
+            writer.write_batch(_rows_to_batch(rows, schema), row_group_size=ROW_GROUP_SIZE)
+            rows_in_file += len(rows)
+            rows_written += len(rows)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    # Empty sections still get a file so the dataset always has every schema
+    if writer is None:
+        pq.write_table(schema.empty_table(), os.path.join(section_dir, "part-00000.parquet"), compression=COMPRESSION)
+
+    return rows_written
+
+def export_parquet(out_dir, progress=None):
+    """Write every section (all farms) as a Parquet dataset with one directory per section"""
+    counts = {}
+    for i, section in enumerate(IMPORT_ORDER, start=1):
+        counts[section] = export_section(section, out_dir)
+        if progress:
+            progress(i, len(IMPORT_ORDER))
+    return counts
+
+def build_parquet_zip(zip_path, progress=None):
+    """Export the Parquet dataset into a ZIP (stored, the files are already compressed)"""
+    out_dir = tempfile.mkdtemp(prefix='fieldlens_parquet_')
+    try:
+        export_parquet(out_dir, progress=progress)
+        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_STORED) as zf:
+            for path in sorted(glob.glob(os.path.join(out_dir, '*', '*.parquet'))):
+                zf.write(path, os.path.relpath(path, out_dir))
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+    return zip_path
+
+def read_section(root, section, columns=None):
+    """Load one section of a Parquet export into a pandas DataFrame"""
+    table = pq.read_table(os.path.join(root, section), columns=columns)
+    return table.to_pandas()
+
+def import_parquet(root, batch_size=ROW_GROUP_SIZE):
+    """Import a Parquet export, writing only new or changed rows"""
+    print(f"Importing Parquet dataset from {root}...")
+    start = time.perf_counter()
+    total_written = 0
+    total_skipped = 0
+
+    # Farms deduplicated against stored ones keep pointing at the stored id
+    farm_id_map = {}
+
+    for section in IMPORT_ORDER:
+        paths = sorted(glob.glob(os.path.join(root, section, '*.parquet')))
+        if not paths:
+            continue
+
+        written = 0
+        skipped = 0
+        duplicates = 0
+        claimed = set()
+        session = db.get_session()
+        try:
+            for path in paths:
+                for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+                    df = batch.to_pandas()
+                    if section != 'datos_generales' and farm_id_map:
+                        df['farm_id'] = df['farm_id'].map(lambda farm_id: farm_id_map.get(farm_id, farm_id))
+
+                    # Keep the original timestamps so 'latest row' lookups survive a round-trip
+                    mapped = db.map_section_frame(section, df, keep_created_at=True)
+                    try:
+                        result = db.upsert_records(session, section, db.frame_to_records(mapped), claimed)
+                        session.commit()
+                    except Exception:
+                        session.rollback()
+                        raise
+
+                    if section == 'datos_generales':
+                        farm_id_map.update(result['id_map'])
+                    written += result['inserted'] + result['updated']
+                    skipped += result['skipped']
+                    duplicates += result['duplicates']
+        finally:
+            session.close()
+
+        print(f"  {section}: {written} rows written, {skipped} unchanged, {duplicates} already stored")
+        total_written += written
+        total_skipped += skipped
+
+    elapsed = time.perf_counter() - start
+    rate = (total_written + total_skipped) / elapsed if elapsed > 0 else 0
+    print(f"Import completed! {total_written} rows written in {elapsed:.1f}s ({rate:.0f} rows/s)")
+    return total_written
+
+def parse_args(argv=None):
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Export or import the FieldLens dataset as Parquet")
+    parser.add_argument("action", choices=["export", "import"], help="Direction of the transfer")
+    parser.add_argument("path", help="Dataset directory (one sub-directory per section)")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    db.create_tables()
+
+    if args.action == "export":
+        start = time.perf_counter()
+        counts = export_parquet(args.path)
+        for section, rows in counts.items():
+            print(f"  {section}: {rows} rows")
+        print(f"Export completed in {time.perf_counter() - start:.1f}s")
+    else:
+        import_parquet(args.path)
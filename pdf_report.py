@@ -0,0 +1,173 @@
+from datetime import datetime
+from io import BytesIO
+import pandas as pd
+from utils import get_all_data
+import database as db
+from kpis import get_farm_kpis, KPI_LABELS
+
+# Landscape A4 in inches
+PAGE_SIZE = (11.69, 8.27)
+
+# Table layout
+ROWS_PER_PAGE = 24
+MAX_CELL_CHARS = 28
+HEADER_COLOR = '#4380fa'
+
+# Sections rendered as tables, in report order
+PDF_SECTIONS = [
+    ("Superficies e Insumos", 'superficies_insumos'),
+    ("Manejo y Recursos", 'manejo'),
+    ("Fertilización", 'fertilizacion'),
+    ("Protección de Cultivos", 'proteccion_cultivos'),
+    ("Riego / Uso de Agua", 'riego'),
+    ("Energía", 'energia'),
+    ("Rebaño", 'rebano'),
+    ("Gestión de Efluentes", 'efluentes'),
+    ("Transporte", 'transporte')
+]
+
+_pyplot = None
+
+def init_process():
+    """Load matplotlib, fonts and page defaults once per process"""
+    global _pyplot
+    if _pyplot is not None:
+        return _pyplot
+
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from matplotlib import font_manager
+
+    plt.rcParams.update({
+        'font.family': 'DejaVu Sans',
+        'font.size': 9,
+        'pdf.fonttype': 42,
+        'axes.spines.top': False,
+        'axes.spines.right': False
+    })
+
+    # Resolve the fonts now so every report reuses the cached lookup
+    font_manager.findfont('DejaVu Sans')
+    font_manager.findfont(font_manager.FontProperties(family='DejaVu Sans', weight='bold'))
+
+    _pyplot = plt
+    return plt
+
+def _new_page(plt, title):
+    """Create a landscape page with a section title"""
+    fig = plt.figure(figsize=PAGE_SIZE)
+    fig.text(0.05, 0.94, title, fontsize=16, fontweight='bold')
+    fig.text(0.95, 0.03, "FieldLens - Recolección de Datos en Tambos", fontsize=7, ha='right', color='grey')
+    return fig
+
+def _format_cell(value):
+    """Shorten a cell value so it fits in the table"""
+    if value is None or value != value:  # None or NaN
+        return ""
+    text = f"{value:.2f}" if isinstance(value, float) else str(value)
+    return text if len(text) <= MAX_CELL_CHARS else text[:MAX_CELL_CHARS - 1] + "…"
+
+def _add_table_pages(pdf, plt, title, df):
+    """Render a dataframe as one or more table pages"""
+    columns = [column for column in df.columns if column != 'uuid']
+    headers = [column.replace('_', ' ').title() for column in columns]
+    values = df[columns].astype(object).to_numpy()
+    pages = max(1, -(-len(values) // ROWS_PER_PAGE))
+
+    for page in range(pages):
+        rows = values[page * ROWS_PER_PAGE:(page + 1) * ROWS_PER_PAGE]
+        page_title = title if pages == 1 else f"{title} ({page + 1}/{pages})"
+        fig = _new_page(plt, page_title)
+        ax = fig.add_axes([0.05, 0.08, 0.9, 0.82])
+        ax.axis('off')
+
+        table = ax.table(
+            cellText=[[_format_cell(value) for value in row] for row in rows],
+            colLabels=headers,
+            loc='upper center',
+            cellLoc='left'
+        )
+        table.auto_set_font_size(False)
+        table.set_fontsize(7 if len(columns) > 6 else 8)
+        table.scale(1, 1.3)
+        for col_idx in range(len(columns)):
+            header = table[0, col_idx]
+            header.set_facecolor(HEADER_COLOR)
+            header.get_text().set_color('white')
+            header.get_text().set_fontweight('bold')
+
+        pdf.savefig(fig)
+        plt.close(fig)
+
+def _add_chart_page(pdf, plt, title, labels, values, xlabel):
+    """Render a horizontal bar chart page"""
+    from visualizations import generate_graph_color_palette
+
+    palette = generate_graph_color_palette()
+    fig = _new_page(plt, title)
+    ax = fig.add_axes([0.25, 0.12, 0.65, 0.74])
+    ax.barh(labels, values, color=[palette[i % len(palette)] for i in range(len(labels))])
+    ax.set_xlabel(xlabel)
+    ax.invert_yaxis()
+    pdf.savefig(fig)
+    plt.close(fig)
+
+def build_pdf_report(farm_id=None):
+    """Build the PDF report of a farm (same content as the Word report) and return its bytes"""
+    plt = init_process()
+    from matplotlib.backends.backend_pdf import PdfPages
+
+    all_data = get_all_data(farm_id)
+
+    farm_name = "tambo"
+    datos_df = all_data['datos_generales']
+    if not datos_df.empty and 'nombre_tambo' in datos_df.columns:
+        farm_name = datos_df['nombre_tambo'].iloc[0]
+
+    pdf_io = BytesIO()
+    with PdfPages(pdf_io) as pdf:
+        # Title page with the general data
+        fig = _new_page(plt, f"Reporte de Tambo: {farm_name}")
+        fig.text(0.05, 0.89, f"Generado el: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}", fontsize=9)
+        if not datos_df.empty:
+            fig.text(0.05, 0.82, "Datos Generales", fontsize=13, fontweight='bold')
+            lines = [
+                f"{column.replace('_', ' ').title()}: {_format_cell(datos_df[column].iloc[0])}"
+                for column in datos_df.columns if column != 'uuid'  # Skip UUID column
+            ]
+            fig.text(0.05, 0.78, "\n".join(lines), fontsize=10, va='top', linespacing=1.6)
+        pdf.savefig(fig)
+        plt.close(fig)
+
+        for section_title, data_key in PDF_SECTIONS:
+            df = all_data[data_key]
+            if df.empty:
+                continue
+            _add_table_pages(pdf, plt, section_title, df)
+
+            # Charts for the sections that have a natural one
+            if data_key == 'rebano' and {'categoría', 'número_animales'} <= set(df.columns):
+                by_category = df.groupby('categoría')['número_animales'].sum()
+                _add_chart_page(pdf, plt, "Animales por Categoría", list(by_category.index), list(by_category.values), "Animales")
+            elif data_key == 'energia':
+                latest = df.iloc[-1]
+                _add_chart_page(
+                    pdf, plt, "Consumo Energético Anual",
+                    ['Diesel (L)', 'Gasolina (L)', 'GNC (m³)', 'Electricidad (kWh)'],
+                    pd.to_numeric(latest.reindex(['consumo_diesel', 'consumo_gasolina', 'consumo_GNC', 'consumo_electricidad']), errors='coerce').fillna(0).tolist(),
+                    "Consumo"
+                )
+
+        # Precomputed KPIs of the farm, one indicator per row
+        farm_id = farm_id or db.get_latest_farm_id()
+        kpis = get_farm_kpis([farm_id])
+        if farm_id in kpis.index:
+            values = kpis.loc[farm_id, list(KPI_LABELS)].astype(float).dropna()
+            _add_table_pages(pdf, plt, "Indicadores y Huella de Carbono", pd.DataFrame({
+                'indicador': [KPI_LABELS[kpi][0] for kpi in values.index],
+                'valor': [f"{value:,.2f}" for value in values],
+                'unidad': [KPI_LABELS[kpi][1] for kpi in values.index]
+            }))
+
+    return pdf_io.getvalue()
@@ -0,0 +1,173 @@
+import functools
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+import database as db
+from emissions import get_farm_factors, load_energy, load_transport, energy_emissions, transport_emissions
+from methane import load_herd, load_effluents, herd_inputs, tier2_methane, CH4_ENERGY
+from nitrogen import load_fertilization, fertilizer_nitrogen
+from kpis import get_farm_kpis
+
+# Mitigation levers: parameter -> (label, unit)
+SCENARIO_PARAMETERS = {
+    'solar_kw': ("Paneles solares adicionales", "kW"),
+    'biodigester': ("Biodigestor nuevo", "sí/no"),
+    'protected_urea': ("Urea protegida", "% de la urea"),
+    'concentrate_share': ("Concentrado en vacas en ordeñe", "% de la dieta")
+}
+
+# Herd category whose diet the concentrate lever changes
+MILKING_CATEGORY = 'Vacas en Ordeñe'
+
+# MJ per kWh
+MJ_PER_KWH = 3.6
+
+def scenario_grid(**values):
+    """Every combination of the given parameter values, one scenario per row
+
+    A NaN concentrate share keeps each herd row's own diet.
+    """
+    unknown = set(values) - set(SCENARIO_PARAMETERS)
+    if unknown:
+        raise ValueError(f"Unknown scenario parameters: {sorted(unknown)}")
+    return pd.MultiIndex.from_product(list(values.values()), names=list(values)).to_frame(index=False)
+
+def _baseline_version(farm_id):
+    """Data version of a farm's scenario inputs (section versions and factor set)"""
+    factor_set_id = get_farm_factors([farm_id])['factor_set_id']
+    return tuple(db.get_section_versions(farm_id)), tuple(factor_set_id)
+
+@functools.lru_cache(maxsize=32)
+def _load_baseline(farm_id, version):
+    """Everything of a farm that no scenario parameter changes, computed once per data version"""
+    factors = get_farm_factors([farm_id])
+    if factors.empty:
+        return None
+
+    herd, inputs = herd_inputs(load_herd([farm_id]), load_effluents([farm_id]), factors)
+
+    # N2O is linear in the protected share of urea, so two evaluations cover any share
+    fertilization = load_fertilization([farm_id])
+    unprotected = fertilizer_nitrogen(fertilization.assign(protected_urea='No'), factors)
+    protected = fertilizer_nitrogen(fertilization.assign(protected_urea='Sí'), factors)
+    current = fertilizer_nitrogen(fertilization, factors)
+    urea_n = current.loc[current['type'] == 'Urea', 'n_kg'].sum() if not current.empty else 0.0
+    flagged_n = current.loc[(current['type'] == 'Urea') & current['protected_urea'].isin(['Sí', 'Si']), 'n_kg'].sum() if not current.empty else 0.0
+
+    energy = load_energy([farm_id])
+    by_source = energy_emissions(energy, factors).groupby('source')['co2e_kg'].sum()
+    electricity_kwh = pd.to_numeric(energy['electricity_consumption'], errors='coerce').fillna(0).sum()
+
+    session = db.get_session()
+    try:
+        existing_biodigester = session.scalar(
+            select(db.Energy.use_biodigesters).where(db.Energy.farm_id == farm_id).order_by(db.Energy.created_at.desc()).limit(1)
+        )
+    finally:
+        session.close()
+
+    kpis = get_farm_kpis([farm_id])
+    return {
+        'factors': factors.iloc[0],
+        'inputs': inputs,
+        'milking': (herd['category'] == MILKING_CATEGORY).to_numpy(),
+        'electricity_kwh': float(electricity_kwh),
+        'other_energy_co2e': float(by_source.drop('electricidad', errors='ignore').sum()),
+        'transport_co2e': float(transport_emissions(load_transport([farm_id]), factors)['co2e_kg'].sum()),
+        'n2o_direct': float(unprotected['direct_co2e_kg'].sum()) if not unprotected.empty else 0.0,
+        'n2o_indirect_unprotected': float(unprotected['indirect_co2e_kg'].sum()) if not unprotected.empty else 0.0,
+        'n2o_indirect_protected': float(protected['indirect_co2e_kg'].sum()) if not protected.empty else 0.0,
+        'protected_urea': flagged_n / urea_n * 100 if urea_n > 0 else 0.0,
+        'existing_biodigester': existing_biodigester in ('Sí', 'Si'),
+        'milk_liters': float(kpis['milk_liters'].iloc[0]) if farm_id in kpis.index and pd.notna(kpis['milk_liters'].iloc[0]) else np.nan,
+        'fpcm_kg': float(kpis['fpcm_kg'].iloc[0]) if farm_id in kpis.index and pd.notna(kpis['fpcm_kg'].iloc[0]) else np.nan
+    }
+
+def load_baseline(farm_id):
+    """Invariant sub-results of a farm, reused by every sweep until its data or factors change"""
+    return _load_baseline(farm_id, _baseline_version(farm_id))
+
+def baseline_parameters(baseline):
+    """Parameter values that describe the farm as it is today
+
+    The emissions pipeline applies no biodigester capture, so today is always
+    'no biodigester' and the lever only adds one.
+    """
+    return {'solar_kw': 0.0, 'biodigester': False, 'protected_urea': baseline['protected_urea'], 'concentrate_share': np.nan}
+
+def evaluate_scenarios(baseline, grid):
+    """Emissions and footprint of every scenario of a grid in one broadcasted pass
+
+    Herd methane only depends on the concentrate share, so the Tier 2
+    equations run once per distinct share as a shares × herd rows matrix and
+    are indexed back onto the scenarios; every other lever is a vector over
+    the scenarios.
+    """
+    factors = baseline['factors']
+    inputs = baseline['inputs']
+    scenarios = len(grid)
+    solar_kw = grid['solar_kw'].to_numpy(dtype=float) if 'solar_kw' in grid else np.zeros(scenarios)
+    biodigester = grid['biodigester'].to_numpy(dtype=bool) if 'biodigester' in grid else np.zeros(scenarios, dtype=bool)
+    protected = grid['protected_urea'].to_numpy(dtype=float) / 100 if 'protected_urea' in grid else np.full(scenarios, baseline['protected_urea'] / 100)
+    concentrate = grid['concentrate_share'].to_numpy(dtype=float) if 'concentrate_share' in grid else np.full(scenarios, np.nan)
+
+    # Methane per distinct concentrate share (NaN keeps the herd's own diet)
+    if len(inputs['animals']):
+        shares, inverse = np.unique(concentrate, return_inverse=True, equal_nan=True)
+        share_matrix = np.where(
+            baseline['milking'][None, :] & ~np.isnan(shares)[:, None],
+            np.nan_to_num(shares)[:, None] / 100,
+            inputs['concentrate_share'][None, :]
+        )
+        methane = tier2_methane(inputs, concentrate_share=share_matrix)
+        animals = inputs['animals'][None, :]
+        enteric = (methane['enteric'] * animals).sum(axis=1)[inverse]
+        pasture = (methane['manure_pasture'] * animals).sum(axis=1)[inverse]
+        confined = (methane['manure_confined'] * animals).sum(axis=1)[inverse]
+        gwp = inputs['gwp_ch4'][0]
+    else:
+        enteric = pasture = confined = np.zeros(scenarios)
+        gwp = 0.0
+
+    # A biodigester captures part of the confined manure methane and burns it for power.
+    # A farm that already runs one reports its electricity net of that power, so
+    # only the methane capture is credited there.
+    capture = np.where(biodigester, factors['biodigestor_captura'] / 100, 0.0)
+    captured = confined * capture
+    methane_co2e = (enteric + pasture + confined - captured) * gwp
+    biogas_kwh = 0.0 if baseline['existing_biodigester'] else captured * CH4_ENERGY * factors['biodigestor_eficiencia_electrica'] / 100 / MJ_PER_KWH
+
+    solar_kwh = solar_kw * factors['solar_rendimiento']
+    grid_kwh = np.maximum(baseline['electricity_kwh'] - solar_kwh - biogas_kwh, 0)
+    electricity_co2e = grid_kwh * factors['electricidad']
+
+    n2o_co2e = baseline['n2o_direct'] + baseline['n2o_indirect_unprotected'] + protected * (
+        baseline['n2o_indirect_protected'] - baseline['n2o_indirect_unprotected']
+    )
+
+    result = grid.copy()
+    result['co2e_energy_kg'] = baseline['other_energy_co2e'] + electricity_co2e
+    result['co2e_transport_kg'] = baseline['transport_co2e']
+    result['co2e_methane_kg'] = methane_co2e
+    result['co2e_n2o_kg'] = n2o_co2e
+    result['co2e_kg'] = result[['co2e_energy_kg', 'co2e_transport_kg', 'co2e_methane_kg', 'co2e_n2o_kg']].sum(axis=1)
+    result['co2e_per_liter'] = result['co2e_kg'] / baseline['milk_liters']
+    result['co2e_per_kg_fpcm'] = result['co2e_kg'] / baseline['fpcm_kg']
+    return result
+
+def run_sweep(farm_id, grid):
+    """Evaluate a scenario grid for a farm, with the current situation as the first row
+
+    Milk production is kept at the farm's current value in every scenario.
+    change_pct is the change of total emissions against the current situation.
+    Returns None for an unknown farm.
+    """
+    baseline = load_baseline(farm_id)
+    if baseline is None:
+        return None
+    current = pd.DataFrame([baseline_parameters(baseline)])[list(grid.columns)]
+    result = evaluate_scenarios(baseline, pd.concat([current, grid], ignore_index=True))
+    result.insert(0, 'scenario', ['Actual'] + [f"Escenario {i}" for i in range(1, len(grid) + 1)])
+    base_total = result['co2e_kg'].iloc[0]
+    result['change_pct'] = (result['co2e_kg'] / base_total - 1) * 100 if base_total else np.nan
+    return result
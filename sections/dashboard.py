@@ -1,26 +1,53 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from utils import load_dataframe
+from utils import load_dataframe, get_current_farm_id, SECTION_TITLES
+import database as db
 from visualizations import (
     visualize_datos_generales,
     visualize_rebano,
     visualize_energia,
-    visualize_superficies
+    visualize_superficies,
+    visualize_benchmarks,
+    visualize_footprint,
+    visualize_scenarios
 )
 
+# Dashboard panels in display order; each one loads its own data when selected
+DASHBOARD_PANELS = {
+    "Datos Generales": visualize_datos_generales,
+    "Rebaño": visualize_rebano,
+    "Energía": visualize_energia,
+    "Superficies": visualize_superficies,
+    "Huella de Carbono": visualize_footprint,
+    "Escenarios": visualize_scenarios,
+    "Comparación": visualize_benchmarks
+}
+
+@st.fragment
+def show_dashboard_panel():
+    """Render only the selected panel; switching panels reruns just this fragment"""
+    panel = st.segmented_control(
+        "Panel",
+        list(DASHBOARD_PANELS),
+        default=next(iter(DASHBOARD_PANELS)),
+        key="dashboard_panel",
+        label_visibility="collapsed"
+    )
+    # Clicking the selected option clears it; fall back to the first panel
+    panel = panel or next(iter(DASHBOARD_PANELS))
+    
+    # Figures of panels viewed before come from the figure cache
+    with st.spinner(f"Cargando {panel}..."):
+        DASHBOARD_PANELS[panel]()
+
 def show_dashboard():
     """Display the general dashboard with data visualizations"""
     st.title("Dashboard General")
     
-    # Check if we have any data
+    # Check if we have any data (counting rows instead of loading every section)
     datos_df = load_dataframe("datos_generales.csv")
-    rebano_df = load_dataframe("rebano.csv")
-    energia_df = load_dataframe("energia.csv")
-    superficies_df = load_dataframe("superficies_insumos.csv")
-    
-    # Check if there's enough data to display visualizations
-    has_basic_data = not datos_df.empty or not rebano_df.empty
+    has_basic_data = not datos_df.empty or db.count_section_rows('rebano', get_current_farm_id()) > 0
     
     if not has_basic_data:
         st.warning("⚠️ No hay suficientes datos para generar visualizaciones. Por favor complete al menos las secciones 'Datos Generales' y 'Rebaño'.")
@@ -31,70 +58,19 @@ def show_dashboard():
         farm_name = datos_df['nombre_tambo'].iloc[-1]
         st.subheader(f"Visualizaciones para: {farm_name}")
     
-    # Create tabbed interface for different visualizations
-    tab1, tab2, tab3, tab4 = st.tabs(["Datos Generales", "Rebaño", "Energía", "Superficies"])
-    
-    with tab1:
-        if not datos_df.empty:
-            visualize_datos_generales()
-        else:
-            st.warning("No hay datos en la sección Datos Generales para visualizar.")
-    
-    with tab2:
-        if not rebano_df.empty:
-            visualize_rebano()
-        else:
-            st.warning("No hay datos en la sección Rebaño para visualizar.")
-    
-    with tab3:
-        if not energia_df.empty:
-            visualize_energia()
-        else:
-            st.warning("No hay datos en la sección Energía para visualizar.")
-    
-    with tab4:
-        if not superficies_df.empty:
-            visualize_superficies()
-        else:
-            st.warning("No hay datos en la sección Superficies e Insumos para visualizar.")
+    # Only the visible panel is built, instead of all four tabs on every run
+    show_dashboard_panel()
     
     # Data completeness indicator
     st.subheader("Completitud de Datos")
     
-    # Define all sections
-    sections = [
-        "Datos Generales",
-        "Superficies e Insumos",
-        "Manejo y Recursos",
-        "Fertilización",
-        "Protección de Cultivos",
-        "Riego / Uso de Agua",
-        "Energía",
-        "Rebaño",
-        "Gestión de Efluentes",
-        "Transporte"
+    # Section row counts are kept per farm on every write, so no section table is loaded
+    counts = db.get_completeness(get_current_farm_id())
+    section_data = [
+        {"Sección": title, "Completado": 100 if not counts.empty and counts[section].iloc[0] > 0 else 0}
+        for section, title in SECTION_TITLES.items()
     ]
     
-    # Check which sections have data
-    section_files = {
-        "Datos Generales": "datos_generales.csv",
-        "Superficies e Insumos": "superficies_insumos.csv",
-        "Manejo y Recursos": "manejo.csv",
-        "Fertilización": "fertilizacion.csv",
-        "Protección de Cultivos": "proteccion_cultivos.csv",
-        "Riego / Uso de Agua": "riego.csv",
-        "Energía": "energia.csv",
-        "Rebaño": "rebano.csv",
-        "Gestión de Efluentes": "efluentes.csv",
-        "Transporte": "transporte.csv"
-    }
-    
-    section_data = []
-    for section, file in section_files.items():
-        df = load_dataframe(file)
-        has_data = not df.empty
-        section_data.append({"Sección": section, "Completado": 100 if has_data else 0})
-    
     completeness_df = pd.DataFrame(section_data)
     
     # Create a horizontal bar chart for data completeness
@@ -123,6 +99,6 @@ def show_dashboard():
     
     # Calculate overall completeness
     completed_sections = sum(1 for section in section_data if section["Completado"] > 0)
-    overall_completeness = (completed_sections / len(sections)) * 100
+    overall_completeness = (completed_sections / len(SECTION_TITLES)) * 100
     
     st.metric("Completitud General", f"{overall_completeness:.0f}%")
@@ -40,6 +40,7 @@ def show_datos_generales():
         st.markdown(f"""
         * **Tambo**: {data['nombre_tambo']}
         * **Localidad**: {data['ciudad']}
+        * **País**: {data.get('país') or '-'}
         * **Raza**: {data['raza']}
         * **Año/Mes**: {data['año']}/{data['mes']}
         * **Superficie Total**: {data['sup_total']:.2f} ha
@@ -105,6 +106,8 @@ def show_datos_generales():
         with col1:
             nombre_tambo = st.text_input("Nombre del Tambo", value=st.session_state.datos_temp_data.get('nombre_tambo', ""))
             ciudad        = st.text_input("Ciudad/Localidad", value=st.session_state.datos_temp_data.get('ciudad', ""))
+            pais          = st.text_input("País", value=st.session_state.datos_temp_data.get('país') or "",
+                                          help="Elige los factores de emisión del país, si hay un conjunto cargado para él")
             raza          = st.selectbox("Raza predominante", ["Holstein","Jersey","Cruza","Otro"], 
                                          index=["Holstein","Jersey","Cruza","Otro"].index(st.session_state.datos_temp_data.get('raza',"Holstein")))
         with col2:
@@ -205,6 +208,7 @@ def show_datos_generales():
                 "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
                 "nombre_tambo": nombre_tambo,
                 "ciudad": ciudad,
+                "país": pais.strip() or None,
                 "raza": raza,
                 "año": año,
                 "mes": mes,
@@ -1,6 +1,7 @@
 import streamlit as st
 import pandas as pd
-from utils import save_dataframe, load_dataframe, validate_numeric, validate_percentage, validate_text, generate_uuid, show_validation_error, show_success_message
+from utils import save_dataframe, load_dataframe, validate_numeric, validate_percentage, validate_text, generate_uuid, show_validation_error, show_success_message, get_current_farm_id
+from data_grid import show_data_grid
 
 def show_efluentes():
     """Display and handle the Gestión de Efluentes form"""
@@ -100,8 +101,7 @@ def show_efluentes():
     # Show existing data if available
     if has_existing_data:
         st.subheader("Datos actuales de Gestión de Efluentes")
-        display_df = df.drop(columns=['uuid']) if 'uuid' in df.columns else df
-        st.dataframe(display_df)
+        show_data_grid('efluentes', get_current_farm_id(), key='grid_efluentes')
         
         # Summary
         if 'sector' in df.columns and 'horas_dia' in df.columns:
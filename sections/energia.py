@@ -1,6 +1,50 @@
 import streamlit as st
 import pandas as pd
-from utils import save_dataframe, load_dataframe, validate_numeric, generate_uuid, show_validation_error, show_success_message
+from utils import save_dataframe, load_dataframe, validate_numeric, generate_uuid, show_validation_error, show_success_message, get_current_farm_id
+from data_grid import show_data_grid
+from jobs import submit_job
+from emissions import (
+    get_farm_factors, list_factor_sets, get_factor_table, save_factor_set,
+    ENERGY_SOURCES, SOURCE_LABELS, DEFAULT_FACTORS
+)
+from kpis import get_farm_emissions, recompute_kpis_job
+
+def show_emission_factors(emissions_df):
+    """Show the factor set used for the farm and allow saving a new version of it"""
+    factor_sets = list_factor_sets()
+    set_id = emissions_df['factor_set_id'].iloc[0] if not emissions_df.empty else factor_sets['id'].iloc[0]
+    factor_set = factor_sets.set_index('id').loc[set_id]
+    
+    with st.expander(f"Factores de emisión: {factor_set['name']} (versión {factor_set['version']})"):
+        factors = get_factor_table([set_id]).loc[set_id]
+        factors_df = pd.DataFrame({
+            'Factor': factors.index,
+            'Valor': factors.to_numpy(),
+            'Unidad': [DEFAULT_FACTORS.get(key, (None, ''))[1] for key in factors.index]
+        })
+        edited_df = st.data_editor(
+            factors_df,
+            hide_index=True,
+            disabled=['Factor', 'Unidad'],
+            key="emission_factors_editor"
+        )
+        
+        if st.button("Guardar nueva versión y recalcular"):
+            if edited_df['Valor'].isna().any() or (edited_df['Valor'] < 0).any():
+                st.error("⚠️ Todos los factores deben ser números positivos.")
+            else:
+                save_factor_set(
+                    factor_set['name'],
+                    dict(zip(edited_df['Factor'], edited_df['Valor'])),
+                    year=None if pd.isna(factor_set['year']) else int(factor_set['year']),
+                    country=factor_set['country']
+                )
+                # Emissions and KPIs of every farm are recomputed in one batch in the background
+                job_id = submit_job('recompute_kpis', recompute_kpis_job, label="Recalcular emisiones e indicadores")
+                if job_id is None:
+                    st.warning("⚠️ Hay demasiadas tareas en curso. Las emisiones se recalcularán más tarde.")
+                else:
+                    st.success("✅ Factores guardados. Recalculando las emisiones de todos los tambos...")
 
 def show_energia():
     """Display and handle the Energía form"""
@@ -30,16 +74,14 @@ def show_energia():
         # Display confirmation summary in a nice format with green checkmark
         st.markdown("### ✅ Resumen de Energía")
         
-        # Calculate CO2 emissions
-        diesel_co2_factor = 2.68  # kg CO2 per L
-        gasolina_co2_factor = 2.31  # kg CO2 per L
-        gnc_co2_factor = 1.86  # kg CO2 per m³
-        electricity_co2_factor = 0.38  # kg CO2 per kWh
+        # Calculate CO2 emissions with the factor set of the farm
+        factors = get_farm_factors([get_current_farm_id()])
+        factors = factors.iloc[0] if not factors.empty else pd.Series({key: value for key, (value, _) in DEFAULT_FACTORS.items()})
         
-        diesel_co2 = data['consumo_diesel'] * diesel_co2_factor
-        gasolina_co2 = data['consumo_gasolina'] * gasolina_co2_factor
-        gnc_co2 = data['consumo_GNC'] * gnc_co2_factor
-        electricity_co2 = data['consumo_electricidad'] * electricity_co2_factor
+        diesel_co2 = data['consumo_diesel'] * factors['diesel']
+        gasolina_co2 = data['consumo_gasolina'] * factors['gasolina']
+        gnc_co2 = data['consumo_GNC'] * factors['gnc']
+        electricity_co2 = data['consumo_electricidad'] * factors['electricidad']
         total_co2 = diesel_co2 + gasolina_co2 + gnc_co2 + electricity_co2
         
         # Create a formatted summary
@@ -218,35 +260,24 @@ def show_energia():
     # Show existing data if available
     if has_existing_data:
         st.subheader("Datos actuales de Energía")
-        display_df = df.drop(columns=['uuid']) if 'uuid' in df.columns else df
-        st.dataframe(display_df)
+        show_data_grid('energia', get_current_farm_id(), key='grid_energia')
         
-        # Calculate approximate CO2 equivalent emissions
+        # CO2 equivalent emissions stored by the KPI pipeline with the farm's factor set
         st.subheader("Estimación de Emisiones CO2 Equivalente")
         
-        # Conversion factors (approximate)
-        diesel_co2_factor = 2.68  # kg CO2 per L
-        gasolina_co2_factor = 2.31  # kg CO2 per L
-        gnc_co2_factor = 1.86  # kg CO2 per m³
-        electricity_co2_factor = 0.38  # kg CO2 per kWh (varies by country)
-        
-        latest_data = df.iloc[-1]
-        
-        diesel_co2 = latest_data['consumo_diesel'] * diesel_co2_factor if 'consumo_diesel' in latest_data else 0
-        gasolina_co2 = latest_data['consumo_gasolina'] * gasolina_co2_factor if 'consumo_gasolina' in latest_data else 0
-        gnc_co2 = latest_data['consumo_GNC'] * gnc_co2_factor if 'consumo_GNC' in latest_data else 0
-        electricity_co2 = latest_data['consumo_electricidad'] * electricity_co2_factor if 'consumo_electricidad' in latest_data else 0
-        
-        total_co2 = diesel_co2 + gasolina_co2 + gnc_co2 + electricity_co2
+        farm_id = get_current_farm_id()
+        emissions_df = get_farm_emissions([farm_id])
+        by_source = emissions_df.set_index('source')['co2e_kg'] if not emissions_df.empty else pd.Series(dtype=float)
         
         col1, col2, col3, col4 = st.columns(4)
-        col1.metric("Diesel", f"{diesel_co2:.2f} kg CO2")
-        col2.metric("Gasolina", f"{gasolina_co2:.2f} kg CO2")
-        col3.metric("GNC", f"{gnc_co2:.2f} kg CO2")
-        col4.metric("Electricidad", f"{electricity_co2:.2f} kg CO2")
+        for col, source in zip([col1, col2, col3, col4], ENERGY_SOURCES):
+            col.metric(SOURCE_LABELS[source], f"{by_source.get(source, 0):.2f} kg CO2")
         
+        total_co2 = sum(by_source.get(source, 0) for source in ENERGY_SOURCES)
         st.metric("Total Emisiones CO2 Equivalente", f"{total_co2:.2f} kg CO2")
         
+        show_emission_factors(emissions_df)
+        
         # Allow deletion of entries
         if st.button("Eliminar Última Entrada"):
             if len(df) > 0:
@@ -1,6 +1,9 @@
 import streamlit as st
 import pandas as pd
-from utils import save_dataframe, load_dataframe, validate_numeric, validate_percentage, validate_text, generate_uuid, show_validation_error, show_success_message
+from utils import save_dataframe, load_dataframe, validate_numeric, validate_percentage, validate_text, generate_uuid, show_validation_error, show_success_message, get_current_farm_id
+from data_grid import show_data_grid
+from emissions import get_farm_factors
+from nitrogen import load_fertilization, load_farm_areas, fertilizer_nitrogen, nitrogen_balance
 
 def show_fertilizacion():
     st.title("Fertilización")
@@ -180,11 +183,42 @@ def show_fertilizacion():
 
     if has_existing_data:
         st.subheader("Datos actuales de Fertilización")
-        display_df = df.drop(columns=['uuid']) if 'uuid' in df.columns else df
-        st.dataframe(display_df)
+        show_data_grid('fertilizacion', get_current_farm_id(), key='grid_fertilizacion')
+        show_nitrogen_balance(get_current_farm_id())
         if st.button("Eliminar Última Entrada"):
             if len(df) > 0:
                 df = df.iloc[:-1]
                 df.to_csv("data/fertilizacion.csv", index=False)
                 st.success("Última entrada eliminada. Recarga la página para ver los cambios.")
                 st.rerun()
+
+def show_nitrogen_balance(farm_id):
+    """N applied, N per hectare, its losses and N2O of the farm's fertilization"""
+    if farm_id is None:
+        return
+    detail = fertilizer_nitrogen(load_fertilization([farm_id]), get_farm_factors([farm_id]))
+    balance = nitrogen_balance(detail, load_farm_areas([farm_id]))
+    if balance.empty:
+        return
+    farm = balance.iloc[0]
+
+    st.subheader("Balance de Nitrógeno y Emisiones de N2O")
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("N Aplicado", f"{farm['n_kg']:,.0f} kg N")
+    with col2:
+        st.metric("N por ha Fertilizada", f"{farm['n_per_fertilized_ha']:,.1f} kg N/ha" if pd.notna(farm['n_per_fertilized_ha']) else "-")
+    with col3:
+        st.metric("N por ha del Establecimiento", f"{farm['n_per_ha']:,.1f} kg N/ha" if pd.notna(farm['n_per_ha']) else "-")
+    with col4:
+        co2e = (detail['direct_co2e_kg'] + detail['indirect_co2e_kg']).sum()
+        st.metric("N2O (CO2e)", f"{co2e / 1000:,.2f} t CO2e")
+
+    destinations = pd.DataFrame({
+        'Destino': ["Retenido en el sistema", "Volatilizado (NH3/NOx)", "Lixiviado", "Emitido como N2O directo"],
+        'kg N': [farm['n_retained_kg'], farm['n_volatilized_kg'], farm['n_leached_kg'], farm['n2o_n_direct_kg']]
+    })
+    st.dataframe(destinations, hide_index=True, use_container_width=True,
+                 column_config={'kg N': st.column_config.NumberColumn(format="%.1f")})
+    adjusted = f"{farm['adjusted_share'] * 100:.0f}% del N aplicado con ajuste de dosis. " if pd.notna(farm['adjusted_share']) else ""
+    st.caption(adjusted + "Contenido de N por tipo de fertilizante y factores IPCC 2019 del conjunto de factores del tambo.")
@@ -1,5 +1,5 @@
 import streamlit as st
-from utils import save_dataframe, load_dataframe, generate_uuid
+from utils import save_dataframe, load_dataframe, generate_uuid, get_farm_completeness, SECTION_TITLES
 import pandas as pd
 import database as db
 
@@ -56,6 +56,26 @@ def show_home():
     if "farm_name" not in st.session_state or not st.session_state.farm_name:
         st.warning("⚠️ Debes crear o seleccionar un establecimiento para comenzar la recolección de datos.")
 
+    # Completion status of every farm, read from the per-farm section counts
+    completeness_df = get_farm_completeness()
+    if not completeness_df.empty:
+        with st.expander(f"📊 Estado de carga de los establecimientos ({len(completeness_df)})"):
+            pending = (completeness_df['Secciones'] < len(SECTION_TITLES)).sum()
+            st.caption(f"{pending} establecimientos con secciones pendientes")
+            st.dataframe(
+                completeness_df,
+                hide_index=True,
+                use_container_width=True,
+                column_config={
+                    'Secciones': st.column_config.ProgressColumn(
+                        "Secciones completas",
+                        format="%d/" + str(len(SECTION_TITLES)),
+                        min_value=0,
+                        max_value=len(SECTION_TITLES)
+                    )
+                }
+            )
+
     # App description
     st.markdown("""
     FieldLens es una aplicación diseñada para la recolección eficiente de datos en establecimientos lecheros (tambos).
@@ -1,6 +1,8 @@
 import streamlit as st
 import pandas as pd
-from utils import save_dataframe, load_dataframe, validate_numeric, validate_text, generate_uuid, show_validation_error, show_success_message
+from utils import save_dataframe, load_dataframe, validate_numeric, validate_text, generate_uuid, show_validation_error, show_success_message, get_current_farm_id
+from data_grid import show_data_grid
+from herd import farm_herd_totals
 
 def show_rebano():
     """Display and handle the Rebaño form"""
@@ -229,20 +231,16 @@ def show_rebano():
     # Show existing data if available
     if has_existing_data:
         st.subheader("Datos actuales de Rebaño")
-        display_df = df.drop(columns=['uuid']) if 'uuid' in df.columns else df
-        st.dataframe(display_df)
+        show_data_grid('rebano', get_current_farm_id(), key='grid_rebano')
         
         # Summary
         st.subheader("Resumen del Rebaño")
-        total_animales = df['número_animales'].sum() if 'número_animales' in df.columns else 0
         
-        # Calculate total weight
-        if 'número_animales' in df.columns and 'peso_promedio' in df.columns:
-            total_weight = sum(df['número_animales'] * df['peso_promedio'])
-            average_weight = total_weight / total_animales if total_animales > 0 else 0
-        else:
-            total_weight = 0
-            average_weight = 0
+        # Totals and animal-weighted average weight of the farm
+        totals = farm_herd_totals([get_current_farm_id()])
+        total_animales = int(totals['animal_count'].iloc[0]) if not totals.empty else 0
+        total_weight = totals['total_weight_kg'].iloc[0] if not totals.empty else 0
+        average_weight = totals['average_weight_kg'].fillna(0).iloc[0] if not totals.empty else 0
         
         col1, col2, col3 = st.columns(3)
         col1.metric("Total Animales", f"{total_animales}")
@@ -2,8 +2,13 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-from utils import load_dataframe
+from utils import load_dataframe, get_current_farm_id
+from data_grid import show_data_grid
 from visualizations import create_pie_chart, create_bar_chart, create_scatter_plot
+from emissions import get_farm_factors
+from methane import load_herd, load_effluents, herd_methane
+from metrics import get_farm_metrics
+from herd import herd_summary, TOTAL_CATEGORY
 
 def show_resumen_rebano():
     """Display a detailed summary of the cattle herd"""
@@ -19,20 +24,12 @@ def show_resumen_rebano():
     # Summary metrics
     st.subheader("Métricas Principales")
     
-    # Total animals and categories
-    total_animals = df['número_animales'].sum() if 'número_animales' in df.columns else 0
+    # Totals come from the stored derived metrics, recomputed only after herd edits
     num_categories = df['categoría'].nunique() if 'categoría' in df.columns else 0
-    
-    # Calculate total weight and consumption
-    if all(col in df.columns for col in ['número_animales', 'peso_promedio']):
-        total_weight = sum(df['número_animales'] * df['peso_promedio'])
-    else:
-        total_weight = 0
-    
-    if all(col in df.columns for col in ['número_animales', 'dieta_materia_seca']):
-        total_dry_matter = sum(df['número_animales'] * df['dieta_materia_seca'])
-    else:
-        total_dry_matter = 0
+    totals = get_farm_metrics(get_current_farm_id(), ['animales', 'peso_total_rebano', 'consumo_ms_rebano']).fillna(0)
+    total_animals = int(totals.get('animales', 0))
+    total_weight = totals.get('peso_total_rebano', 0)
+    total_dry_matter = totals.get('consumo_ms_rebano', 0)
     
     # Display metrics in columns
     col1, col2, col3, col4 = st.columns(4)
@@ -80,17 +77,20 @@ def show_resumen_rebano():
     # Weight and consumption analysis
     st.subheader("Análisis de Peso y Consumo")
     
-    if all(col in df.columns for col in ['categoría', 'peso_promedio', 'número_animales']):
-        # Create weight data
-        weight_data = df.copy()
-        weight_data['peso_total'] = weight_data['número_animales'] * weight_data['peso_promedio']
-        
+    # Per-category totals and animal-weighted averages of the farm
+    summary = herd_summary([get_current_farm_id()])
+    by_category = summary[summary['category'] != TOTAL_CATEGORY].rename(columns={
+        'category': 'categoría', 'average_weight_kg': 'peso_promedio', 'total_weight_kg': 'peso_total'
+    })
+    farm_totals = summary[summary['category'] == TOTAL_CATEGORY]
+    
+    if not by_category.empty:
         col1, col2 = st.columns(2)
         
         with col1:
             # Bar chart of average weight by category
             fig_weight = create_bar_chart(
-                df,
+                by_category,
                 'categoría',
                 'peso_promedio',
                 'Peso Promedio por Categoría (kg)'
@@ -100,7 +100,7 @@ def show_resumen_rebano():
         with col2:
             # Pie chart of total weight distribution
             fig_total_weight = create_pie_chart(
-                weight_data,
+                by_category,
                 'categoría',
                 'peso_total',
                 'Distribución del Peso Total'
@@ -123,18 +123,14 @@ def show_resumen_rebano():
         st.plotly_chart(fig_grazing, use_container_width=True)
     
     # Diet composition if available
-    diet_columns = ['porcentaje_pastura', 'porcentaje_concentrado', 'porcentaje_otros']
-    if all(col in df.columns for col in diet_columns):
+    if not farm_totals[['pasture_pct', 'concentrate_pct', 'others_pct']].isna().all(axis=None):
         st.subheader("Composición de la Dieta")
         
-        # Calculate weighted average diet composition based on animal numbers
+        # Diet composition weighted by the animals of each category
+        diet = farm_totals.iloc[0]
         diet_data = {
             'Componente': ['Pastura', 'Concentrado', 'Otros'],
-            'Porcentaje': [
-                sum(df['porcentaje_pastura'] * df['número_animales']) / total_animals,
-                sum(df['porcentaje_concentrado'] * df['número_animales']) / total_animals,
-                sum(df['porcentaje_otros'] * df['número_animales']) / total_animals
-            ]
+            'Porcentaje': [diet['pasture_pct'], diet['concentrate_pct'], diet['others_pct']]
         }
         
         diet_df = pd.DataFrame(diet_data)
@@ -148,7 +144,46 @@ def show_resumen_rebano():
         )
         st.plotly_chart(fig_diet, use_container_width=True)
     
+    # Methane from the herd (IPCC Tier 2)
+    show_herd_methane(get_current_farm_id())
+
     # Detailed table with all data
     st.subheader("Datos Detallados del Rebaño")
-    display_df = df.drop(columns=['uuid']) if 'uuid' in df.columns else df
-    st.dataframe(display_df)
+    show_data_grid('rebano', get_current_farm_id(), key='grid_resumen_rebano')
+
+def show_herd_methane(farm_id):
+    """Enteric and manure methane of each herd category"""
+    if farm_id is None:
+        return
+    detail = herd_methane(load_herd([farm_id]), load_effluents([farm_id]), get_farm_factors([farm_id]))
+    if detail.empty:
+        return
+
+    st.subheader("Emisiones de Metano")
+    by_category = detail.groupby('category', as_index=False)[['animal_count', 'enteric_ch4_kg', 'manure_ch4_kg']].sum()
+    enteric = by_category['enteric_ch4_kg'].sum()
+    manure = by_category['manure_ch4_kg'].sum()
+    co2e = (detail['enteric_co2e_kg'] + detail['manure_co2e_kg']).sum()
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("CH4 Entérico", f"{enteric / 1000:,.1f} t/año")
+    with col2:
+        st.metric("CH4 Estiércol", f"{manure / 1000:,.1f} t/año")
+    with col3:
+        st.metric("Total CO2e", f"{co2e / 1000:,.1f} t/año")
+
+    chart_df = by_category.melt(
+        id_vars='category',
+        value_vars=['enteric_ch4_kg', 'manure_ch4_kg'],
+        var_name='Fuente',
+        value_name='kg CH4/año'
+    ).rename(columns={'category': 'Categoría'})
+    chart_df['Fuente'] = chart_df['Fuente'].map({'enteric_ch4_kg': 'Entérico', 'manure_ch4_kg': 'Estiércol'})
+    fig = px.bar(chart_df, x='Categoría', y='kg CH4/año', color='Fuente', barmode='stack', title='Metano por Categoría')
+    st.plotly_chart(fig, use_container_width=True)
+
+    per_head = by_category['enteric_ch4_kg'] / by_category['animal_count'].where(by_category['animal_count'] > 0)
+    st.caption("Modelo IPCC 2019 Nivel 2: energía bruta desde el consumo de materia seca, Ym según la proporción de concentrado "
+               "y estiércol repartido entre pastoreo y los sectores de efluentes. "
+               f"Entérico promedio: {per_head.mean():.0f} kg CH4/cabeza/año.")
@@ -1,6 +1,7 @@
 import streamlit as st
 import pandas as pd
-from utils import save_dataframe, load_dataframe, validate_numeric, validate_percentage, validate_text, generate_uuid, show_validation_error, show_success_message
+from utils import save_dataframe, load_dataframe, validate_numeric, validate_percentage, validate_text, generate_uuid, show_validation_error, show_success_message, get_current_farm_id
+from data_grid import show_data_grid
 
 def show_riego():
     """Display and handle the Riego / Uso de Agua form"""
@@ -202,8 +203,7 @@ def show_riego():
     # Show existing data if available
     if has_existing_data:
         st.subheader("Datos actuales de Riego / Uso de Agua")
-        display_df = df.drop(columns=['uuid']) if 'uuid' in df.columns else df
-        st.dataframe(display_df)
+        show_data_grid('riego', get_current_farm_id(), key='grid_riego')
         
         # Allow deletion of entries
         if st.button("Eliminar Última Entrada"):
@@ -2,7 +2,8 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime
-from utils import save_dataframe, load_dataframe, validate_numeric, validate_percentage, validate_text, generate_uuid, show_validation_error, show_success_message
+from utils import save_dataframe, load_dataframe, validate_numeric, validate_percentage, validate_text, generate_uuid, show_validation_error, show_success_message, get_current_farm_id
+from data_grid import show_data_grid
 
 def show_superficies_insumos():
     """Display and handle the Superficies e Insumos form"""
@@ -200,8 +201,7 @@ def show_superficies_insumos():
     # Show existing data if available
     if has_existing_data:
         st.subheader("Datos actuales de Superficies e Insumos")
-        display_df = df.drop(columns=['uuid']) if 'uuid' in df.columns else df
-        st.dataframe(display_df)
+        show_data_grid('superficies_insumos', get_current_farm_id(), key='grid_superficies_insumos')
         
         # Allow deletion of entries
         if st.button("Eliminar Última Entrada"):
@@ -1,6 +1,7 @@
 import streamlit as st
 import pandas as pd
-from utils import save_dataframe, load_dataframe, validate_numeric, validate_text, generate_uuid, show_validation_error, show_success_message
+from utils import save_dataframe, load_dataframe, validate_numeric, validate_text, generate_uuid, show_validation_error, show_success_message, get_current_farm_id
+from data_grid import show_data_grid
 
 def show_transporte():
     """Display and handle the Transporte form"""
@@ -97,8 +98,7 @@ def show_transporte():
     # Show existing data if available
     if has_existing_data:
         st.subheader("Datos actuales de Transporte")
-        display_df = df.drop(columns=['uuid']) if 'uuid' in df.columns else df
-        st.dataframe(display_df)
+        show_data_grid('transporte', get_current_farm_id(), key='grid_transporte')
         
         # Summary
         st.subheader("Resumen")
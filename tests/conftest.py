@@ -0,0 +1,8 @@
+import os
+import sys
+import tempfile
+
+# The app opens its database when database.py is imported: point it at a
+# throwaway SQLite file so tests never touch data/fieldlens.db
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='fieldlens-tests-'), 'fieldlens.db')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,81 @@
+import uuid
+import numpy as np
+import pandas as pd
+import pytest
+import database as db
+import benchmarking
+from emissions import save_factor_set, DEFAULT_FACTORS, DEFAULT_SET_NAME
+from kpis import recompute_kpis
+from benchmarking import benchmark_version, compute_percentiles
+
+def _new_farm():
+    farm_id = str(uuid.uuid4())
+    session = db.get_session()
+    try:
+        records = db.frame_to_records(db.map_section_frame('datos_generales', pd.DataFrame({
+            'uuid': [farm_id], 'nombre_tambo': ['Tambo benchmark'], 'vacas_ordeñe': [120], 'produccion_ind': [21.0]
+        })))
+        db.upsert_records(session, 'datos_generales', records)
+        session.commit()
+    finally:
+        session.close()
+    return farm_id
+
+def test_benchmark_key_follows_factor_sets_and_kpi_recomputes():
+    _new_farm()
+    version = benchmark_version()
+    assert benchmark_version() == version
+
+    # Same data, new factors: the footprints change, so must the key
+    save_factor_set(DEFAULT_SET_NAME, {key: value for key, (value, _) in DEFAULT_FACTORS.items()})
+    after_factors = benchmark_version()
+    assert after_factors != version
+
+    recompute_kpis()
+    assert benchmark_version() != after_factors
+
+def _peer_kpis():
+    # Six Holando farms in Rafaela, two Jersey farms in Esperanza
+    kpis = pd.DataFrame({
+        'raza': ['Holando'] * 6 + ['Jersey'] * 2,
+        'ciudad': ['Rafaela'] * 6 + ['Esperanza'] * 2,
+        'tamaño': ['Mediano (100-299 VO)'] * 8,
+        'produccion_por_vaca': [10.0, 20.0, 30.0, 40.0, 50.0, np.nan, 15.0, 25.0],
+        'animales_por_ha': [1.0, 1.0, 2.0, 2.0, 3.0, 3.0, 1.5, 1.5],
+    }, index=[f"farm-{i}" for i in range(8)])
+    for kpi in ['diesel_por_litro', 'agua_por_vaca', 'huella_fpcm']:
+        kpis[kpi] = np.nan
+    return kpis
+
+def test_percentiles_rank_within_each_peer_group_and_skip_missing_values():
+    tables = compute_percentiles(_peer_kpis())
+
+    by_breed_city = tables[('raza', 'ciudad')]
+    assert by_breed_city.loc['farm-0', 'produccion_por_vaca_pct'] == pytest.approx(20.0)
+    assert by_breed_city.loc['farm-4', 'produccion_por_vaca_pct'] == pytest.approx(100.0)
+    assert pd.isna(by_breed_city.loc['farm-5', 'produccion_por_vaca_pct'])
+    assert by_breed_city.loc['farm-0', 'produccion_por_vaca_n'] == 5
+    assert by_breed_city.loc['farm-7', 'produccion_por_vaca_pct'] == pytest.approx(100.0)
+    assert by_breed_city.loc['farm-7', 'produccion_por_vaca_n'] == 2
+    # Ties share the average rank
+    assert by_breed_city.loc['farm-0', 'animales_por_ha_pct'] == by_breed_city.loc['farm-1', 'animales_por_ha_pct']
+
+    everyone = tables[()]
+    assert (everyone['produccion_por_vaca_n'] == 7).all()
+    assert everyone.loc['farm-6', 'produccion_por_vaca_pct'] == pytest.approx(200 / 7)
+
+def test_farm_with_a_small_peer_group_falls_back_to_a_wider_one(monkeypatch):
+    kpis = _peer_kpis()
+    monkeypatch.setattr(benchmarking, 'benchmark_version', lambda: None)
+    monkeypatch.setattr(benchmarking, 'get_benchmarks', lambda version: (kpis, compute_percentiles(kpis)))
+
+    results = {result['kpi']: result for result in benchmarking.benchmark_farm('farm-0')}
+    assert results['produccion_por_vaca']['peer_group'] == "tambos Holando en Rafaela"
+    assert results['produccion_por_vaca']['peers'] == 5
+    assert set(results) == {'produccion_por_vaca', 'animales_por_ha'}
+
+    # Only two Jersey farms: compared against the farms of the same size
+    jersey = {result['kpi']: result for result in benchmarking.benchmark_farm('farm-6')}
+    assert jersey['produccion_por_vaca']['peer_group'] == "tambos mediano"
+    assert jersey['produccion_por_vaca']['peers'] == 7
+    assert benchmarking.benchmark_farm('otra') == []
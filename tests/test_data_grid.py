@@ -0,0 +1,53 @@
+import uuid
+import pandas as pd
+import streamlit as st
+import database as db
+from data_grid import parse_filter
+from utils import load_dataframe
+
+def _import(section, df):
+    session = db.get_session()
+    try:
+        db.upsert_records(session, section, db.frame_to_records(db.map_section_frame(section, df)))
+        session.commit()
+    finally:
+        session.close()
+
+def _farm_with_routes(name, distances):
+    farm_id = str(uuid.uuid4())
+    _import('datos_generales', pd.DataFrame({'uuid': [farm_id], 'nombre_tambo': [name]}))
+    _import('transporte', pd.DataFrame({
+        'farm_id': farm_id,
+        'tipo_vehiculo': ['Camión', 'Camioneta', 'Tractor', 'Camión'][:len(distances)],
+        'distancia_km': distances
+    }))
+    return farm_id
+
+def test_parse_filter():
+    assert parse_filter('transporte', 'distancia_km', ">= 12,5") == ('distancia_km', '>=', 12.5)
+    assert parse_filter('transporte', 'distancia_km', "40") == ('distancia_km', '=', 40.0)
+    assert parse_filter('transporte', 'distancia_km', "cerca") is None
+    assert parse_filter('transporte', 'tipo_vehiculo', " cami ") == ('tipo_vehiculo', 'contains', 'cami')
+    assert parse_filter('transporte', 'tipo_vehiculo', "  ") is None
+
+def test_filters_sorting_and_paging_run_in_the_database():
+    farm_id = _farm_with_routes("Tambo grilla", [10.0, 25.0, 40.0, 55.0])
+
+    numeric = [parse_filter('transporte', 'distancia_km', "> 20")]
+    assert db.count_section_rows('transporte', farm_id, filters=numeric) == 3
+    text = [parse_filter('transporte', 'tipo_vehiculo', "TRACT")]
+    assert db.count_section_rows('transporte', farm_id, filters=text) == 1
+
+    page = db.get_section_page('transporte', farm_id, filters=numeric, sort_by='distancia_km', descending=True, limit=2, offset=0)
+    assert page['distancia_km'].tolist() == [55.0, 40.0]
+    page = db.get_section_page('transporte', farm_id, filters=numeric, sort_by='distancia_km', descending=True, limit=2, offset=2)
+    assert page['distancia_km'].tolist() == [25.0]
+
+def test_section_pages_and_grid_show_the_same_farm_when_none_is_selected():
+    _farm_with_routes("Tambo anterior", [5.0])
+    latest = _farm_with_routes("Tambo reciente", [7.0, 9.0])
+    st.session_state.pop('farm_id', None)
+
+    rows = load_dataframe("transporte.csv")
+    assert sorted(rows['distancia_km']) == [7.0, 9.0]
+    assert db.count_section_rows('transporte', latest) == len(rows)
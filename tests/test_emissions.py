@@ -0,0 +1,39 @@
+import uuid
+import pandas as pd
+import database as db
+from emissions import save_factor_set, list_factor_sets, get_farm_factor_set_ids, DEFAULT_SET_NAME
+
+def _new_farm(country, year):
+    farm_id = str(uuid.uuid4())
+    session = db.get_session()
+    try:
+        records = db.frame_to_records(db.map_section_frame('datos_generales', pd.DataFrame({
+            'uuid': [farm_id], 'nombre_tambo': ['Tambo factores'], 'país': [country], 'año': [year]
+        })))
+        db.upsert_records(session, 'datos_generales', records)
+        session.commit()
+    finally:
+        session.close()
+    return farm_id
+
+def test_farms_use_the_factor_sets_of_their_country():
+    older = save_factor_set("Uruguay 2020", {'electricidad': 0.1}, year=2020, country="Uruguay")
+    newer = save_factor_set("Uruguay 2023", {'electricidad': 0.2}, year=2023, country="Uruguay")
+    sets = list_factor_sets()
+    default = sets.loc[sets['name'] == DEFAULT_SET_NAME, 'id'].iloc[-1]
+
+    farms = {
+        'uy_2022': _new_farm("Uruguay", 2022),
+        'uy_2024': _new_farm(" uruguay ", 2024),
+        # Before the country's first set: the general factors apply
+        'uy_2019': _new_farm("Uruguay", 2019),
+        'cl_2022': _new_farm("Chile", 2022),
+        'none_2022': _new_farm(None, 2022)
+    }
+    set_ids = get_farm_factor_set_ids(list(farms.values()))
+
+    assert set_ids[farms['uy_2022']] == older
+    assert set_ids[farms['uy_2024']] == newer
+    assert set_ids[farms['uy_2019']] == default
+    assert set_ids[farms['cl_2022']] == default
+    assert set_ids[farms['none_2022']] == default
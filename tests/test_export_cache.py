@@ -0,0 +1,79 @@
+import os
+import threading
+import pytest
+import export_cache
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(export_cache, 'CACHE_DIR', str(tmp_path))
+    return tmp_path
+
+def _artifact(cache_dir, name, size, mtime):
+    path = cache_dir / name
+    path.write_bytes(b'x' * size)
+    os.utime(path, (mtime, mtime))
+    return path
+
+def _writer(data):
+    def write(path):
+        with open(path, 'wb') as f:
+            f.write(data)
+    return write
+
+def test_evict_drops_least_recently_used_first(cache_dir):
+    oldest = _artifact(cache_dir, 'a.xlsx', 100, 1000)
+    middle = _artifact(cache_dir, 'b.xlsx', 100, 2000)
+    newest = _artifact(cache_dir, 'c.xlsx', 100, 3000)
+    in_flight = _artifact(cache_dir, 'd.tmp', 500, 500)
+
+    export_cache.evict(max_bytes=250)
+    assert not oldest.exists()
+    assert middle.exists() and newest.exists()
+    # Artifacts still being written are never evicted
+    assert in_flight.exists()
+
+    export_cache.evict(max_bytes=100)
+    assert not middle.exists() and newest.exists()
+
+def test_cache_hit_counts_as_recent_use(cache_dir, monkeypatch):
+    monkeypatch.setattr(export_cache, 'cache_key', lambda kind, farm_id, template_version: kind)
+    first = export_cache.get_or_build_path('first', None, _writer(b'1' * 100), 1)
+    second = export_cache.get_or_build_path('second', None, _writer(b'2' * 100), 1)
+    os.utime(first, (1000, 1000))
+    os.utime(second, (2000, 2000))
+
+    # Reading the older artifact again makes the other one the eviction candidate
+    assert export_cache.get_or_build_path('first', None, lambda path: pytest.fail("rebuilt"), 1) == first
+    export_cache.evict(max_bytes=100)
+    assert os.path.exists(first) and not os.path.exists(second)
+
+def test_concurrent_writers_use_separate_temp_files(cache_dir, monkeypatch):
+    monkeypatch.setattr(export_cache, 'cache_key', lambda kind, farm_id, template_version: kind)
+    both_writing = threading.Barrier(2)
+    temp_paths = []
+
+    def write(path):
+        temp_paths.append(path)
+        both_writing.wait(timeout=5)
+        with open(path, 'wb') as f:
+            f.write(b'report')
+
+    threads = [threading.Thread(target=export_cache.get_or_build_path, args=('report', None, write, 1)) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(set(temp_paths)) == 2
+    assert (cache_dir / 'report').read_bytes() == b'report'
+    assert not any(name.endswith('.tmp') for name in os.listdir(cache_dir))
+
+def test_failed_write_leaves_no_temp_file(cache_dir, monkeypatch):
+    monkeypatch.setattr(export_cache, 'cache_key', lambda kind, farm_id, template_version: kind)
+
+    def write(path):
+        raise RuntimeError("render failed")
+
+    with pytest.raises(RuntimeError):
+        export_cache.get_or_build_path('broken', None, write, 1)
+    assert os.listdir(cache_dir) == []
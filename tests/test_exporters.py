@@ -0,0 +1,38 @@
+from io import BytesIO
+import pandas as pd
+from docx import Document
+from exporters import add_dataframe_table
+
+def _table_text(table):
+    return [[cell.text for cell in row.cells] for row in table.rows]
+
+def test_word_table_matches_row_by_row_table():
+    df = pd.DataFrame({
+        'uuid': ['a', 'b'],
+        'tipo_vehiculo': ['Camión <3t> & acoplado', 'Tractor\x0b'],
+        'distancia_km': [12.5, None]
+    })
+
+    doc = Document()
+    add_dataframe_table(doc, df)
+
+    # Same content as filling the table with table.add_row().cells
+    expected = Document().add_table(rows=1, cols=2)
+    expected.rows[0].cells[0].text = 'Tipo Vehiculo'
+    expected.rows[0].cells[1].text = 'Distancia Km'
+    for values in [('Camión <3t> & acoplado', '12.5'), ('Tractor', 'nan')]:
+        cells = expected.add_row().cells
+        for cell, value in zip(cells, values):
+            cell.text = value
+
+    # The document survives a save and reload with the same cells and widths
+    buffer = BytesIO()
+    doc.save(buffer)
+    table = Document(BytesIO(buffer.getvalue())).tables[0]
+    assert table.style.name == 'Table Grid'
+    assert _table_text(table) == _table_text(expected)
+    assert [cell.width for cell in table.rows[1].cells] == [cell.width for cell in expected.rows[1].cells]
+
+def test_word_table_of_empty_dataframe_has_only_the_header():
+    table = add_dataframe_table(Document(), pd.DataFrame(columns=['uuid', 'cultivo']))
+    assert _table_text(table) == [['Cultivo']]
@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+import pytest
+from herd import herd_summary, TOTAL_CATEGORY
+
+def _herd_row(farm_id, category, animals, weight, dry_matter, pasture=None, concentrate=None, grazing=None):
+    return {
+        'farm_id': farm_id, 'category': category, 'animal_count': animals, 'average_weight': weight,
+        'grazing_hours': grazing, 'dry_matter_diet': dry_matter, 'pasture_percentage': pasture,
+        'concentrate_percentage': concentrate, 'others_percentage': None
+    }
+
+def test_herd_summary_weights_averages_by_animals():
+    herd = pd.DataFrame([
+        _herd_row('a', 'Vacas en Ordeñe', 10, 600, 20),
+        _herd_row('a', 'Vacas en Ordeñe', 30, 500, None),
+        _herd_row('a', 'Vacas Secas', 20, 550, 12)
+    ])
+    summary = herd_summary(herd=herd).set_index('category')
+
+    assert summary.index[-1] == TOTAL_CATEGORY
+    milking = summary.loc['Vacas en Ordeñe']
+    assert milking['animal_count'] == 40
+    assert milking['total_weight_kg'] == pytest.approx(21000.0)
+    assert milking['average_weight_kg'] == pytest.approx(525.0)
+    # Only the row with an intake weighs in its average
+    assert milking['dry_matter_kg'] == pytest.approx(20.0)
+    assert milking['dry_matter_total_kg'] == pytest.approx(200.0)
+
+    total = summary.loc[TOTAL_CATEGORY]
+    assert total['animal_count'] == 60
+    assert total['average_weight_kg'] == pytest.approx(32000.0 / 60)
+    assert total['dry_matter_kg'] == pytest.approx(440.0 / 30)
+    assert np.isnan(total['grazing_hours'])
@@ -0,0 +1,100 @@
+import datetime
+import threading
+import time
+import uuid
+import pytest
+import database as db
+import jobs
+
+@pytest.fixture(autouse=True)
+def results_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, 'RESULTS_DIR', str(tmp_path))
+    monkeypatch.setattr(jobs, 'PROGRESS_INTERVAL', 0)
+    return tmp_path
+
+def _wait_until_finished(job_id, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = jobs.get_job(job_id)
+        if job['status'] in jobs.FINISHED_STATUSES:
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} did not finish")
+
+def _write_result(context, text):
+    context.progress(0.5, "Escribiendo")
+    path = context.result_path('.txt')
+    with open(path, 'w') as f:
+        f.write(text)
+    return path
+
+def test_job_runs_to_done_with_its_result_file():
+    job_id = jobs.submit_job('test', _write_result, "hola", label="Prueba")
+    job = _wait_until_finished(job_id)
+    assert job['status'] == 'done'
+    assert job['progress'] == 1.0
+    with open(job['result_path']) as f:
+        assert f.read() == "hola"
+
+def test_failing_job_records_the_error():
+    def fail(context):
+        raise ValueError("sin datos")
+
+    job = _wait_until_finished(jobs.submit_job('test', fail))
+    assert job['status'] == 'failed'
+    assert job['message'] == "sin datos"
+    assert 'ValueError' in job['error']
+
+def test_running_job_stops_at_its_next_progress_report_after_cancel():
+    started = threading.Event()
+    release = threading.Event()
+    reports = []
+
+    def long_job(context):
+        started.set()
+        release.wait(5)
+        for step in range(10):
+            context.progress(step / 10)
+            reports.append(step)
+        return None
+
+    job_id = jobs.submit_job('test', long_job)
+    assert started.wait(5)
+    jobs.request_cancel(job_id)
+    release.set()
+
+    job = _wait_until_finished(job_id)
+    assert job['status'] == 'cancelled'
+    assert reports == []
+
+def test_cancel_of_a_finished_job_is_ignored():
+    job_id = jobs.submit_job('test', _write_result, "listo")
+    _wait_until_finished(job_id)
+    jobs.request_cancel(job_id)
+    assert jobs.get_job(job_id)['status'] == 'done'
+
+def _add_job(owner, heartbeat_at):
+    job_id = str(uuid.uuid4())
+    session = db.get_session()
+    session.add(db.Job(id=job_id, kind='test', status='running', progress=0.2, owner=owner, heartbeat_at=heartbeat_at))
+    session.commit()
+    session.close()
+    return job_id
+
+def test_only_jobs_of_gone_processes_are_marked_failed():
+    now = datetime.datetime.utcnow()
+    stale = _add_job('otro-host:123:abcd', now - jobs.HEARTBEAT_TIMEOUT * 2)
+    alive = _add_job('otro-host:123:abcd', now)
+    own = _add_job(jobs.PROCESS_OWNER, now - jobs.HEARTBEAT_TIMEOUT * 2)
+    # Earlier server process with this pid, before a restart
+    restarted = _add_job(jobs.PROCESS_OWNER.rsplit(':', 1)[0] + ':0000', now)
+
+    jobs.fail_orphaned_jobs()
+    assert jobs.get_job(stale)['status'] == 'failed'
+    assert jobs.get_job(restarted)['status'] == 'failed'
+    assert jobs.get_job(alive)['status'] == 'running'
+    assert jobs.get_job(own)['status'] == 'running'
+
+    # Leave no active jobs behind for the pending-job limit of other tests
+    for job_id in (alive, own):
+        jobs._update_job(job_id, status='failed')
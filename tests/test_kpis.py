@@ -0,0 +1,47 @@
+import uuid
+import numpy as np
+import pandas as pd
+import pytest
+import database as db
+from kpis import fpcm, get_farm_kpis
+
+def test_fpcm_uses_standard_composition_for_missing_data():
+    milk = pd.Series([1000.0, 1000.0])
+    result = fpcm(milk, pd.Series([3.5, np.nan]), pd.Series([3.0, 0.0]))
+    # 1000 × (0.1226 × 3.5 + 0.0776 × 3.0 + 0.2534), then with 4.0 % fat and 3.3 % protein
+    assert result.tolist() == pytest.approx([915.3, 999.88])
+
+def _import(section, df):
+    session = db.get_session()
+    try:
+        db.upsert_records(session, section, db.frame_to_records(db.map_section_frame(section, df)))
+        session.commit()
+    finally:
+        session.close()
+
+def test_farm_without_emission_rows_has_no_footprint():
+    farm_id = str(uuid.uuid4())
+    _import('datos_generales', pd.DataFrame({
+        'uuid': [farm_id], 'nombre_tambo': ['Tambo sin emisiones'], 'sup_total': [150.0], 'vacas_ordeñe': [80],
+        'produccion_ind': [20.0]
+    }))
+
+    kpis = get_farm_kpis([farm_id]).loc[farm_id]
+    assert kpis['fpcm_kg'] > 0
+    # Missing data is not a zero footprint
+    assert pd.isna(kpis['co2e_kg'])
+    assert pd.isna(kpis['co2e_per_kg_fpcm'])
+    assert pd.isna(kpis['co2e_methane_kg'])
+
+def test_footprint_adds_only_the_components_with_data():
+    farm_id = str(uuid.uuid4())
+    _import('datos_generales', pd.DataFrame({
+        'uuid': [farm_id], 'nombre_tambo': ['Tambo solo energía'], 'vacas_ordeñe': [50], 'produccion_ind': [18.0]
+    }))
+    _import('energia', pd.DataFrame({'farm_id': [farm_id], 'consumo_diesel': [1000.0]}))
+
+    kpis = get_farm_kpis([farm_id]).loc[farm_id]
+    # 1000 L of diesel × 2.68 kg CO2e/L
+    assert kpis['co2e_energy_kg'] == pytest.approx(2680.0)
+    assert pd.isna(kpis['co2e_methane_kg'])
+    assert kpis['co2e_kg'] == pytest.approx(2680.0)
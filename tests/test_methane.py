@@ -0,0 +1,47 @@
+import pandas as pd
+import pytest
+from emissions import DEFAULT_FACTORS
+from methane import herd_methane, confined_mcf
+
+def _factors(*farm_ids):
+    return pd.DataFrame([{key: value for key, (value, _) in DEFAULT_FACTORS.items()}] * len(farm_ids), index=list(farm_ids))
+
+def _herd_row(farm_id, category, animals, weight, dry_matter, pasture=None, concentrate=None, grazing=None):
+    return {
+        'farm_id': farm_id, 'category': category, 'animal_count': animals, 'average_weight': weight,
+        'grazing_hours': grazing, 'dry_matter_diet': dry_matter, 'pasture_percentage': pasture,
+        'concentrate_percentage': concentrate, 'others_percentage': None
+    }
+
+def test_herd_methane_matches_tier2_by_hand():
+    herd = pd.DataFrame([_herd_row('a', 'Vacas en Ordeñe', 10, 600, 20, pasture=60, concentrate=40, grazing=12)])
+    row = herd_methane(herd, pd.DataFrame(), _factors('a')).iloc[0]
+
+    # GE = 20 kg MS × 18.45 MJ = 369 MJ/day; Ym = 0.6 × 6.5 + 0.4 × 3.0 = 5.1 %
+    assert row['gross_energy_mj'] == pytest.approx(369.0)
+    assert row['ym'] == pytest.approx(5.1)
+    # Enteric: 369 × 0.051 × 365 / 55.65 kg CH4 per head, for 10 heads
+    assert row['enteric_ch4_kg'] == pytest.approx(1234.30997305, rel=1e-9)
+    # VS = 369 × (1 - 0.71 + 0.04) × 0.92 / 18.45 = 6.072 kg/day; B0 potential = 6.072 × 365 × 0.24 × 0.67
+    assert row['volatile_solids_kg'] == pytest.approx(6.072)
+    # Half the day on pasture (MCF 0.47 %), half in an open corral (MCF 1.5 %, no effluent rows)
+    assert row['mcf'] == pytest.approx(0.5 * 0.0047 + 0.5 * 0.015)
+    assert row['manure_ch4_kg'] == pytest.approx(356.377824 * 0.5 * (0.0047 + 0.015) * 10)
+    assert row['enteric_co2e_kg'] == pytest.approx(1234.30997305 * 27, rel=1e-9)
+
+def test_confined_mcf_weights_managements_by_hours_and_skips_pasture():
+    effluents = pd.DataFrame({
+        'farm_id': ['a', 'a', 'a', 'b'],
+        'sector': ['Corral', 'Sala de ordeñe', 'Pastura', 'Corral'],
+        'hours_per_day': [4, 4, 12, 6],
+        'excreta_management': ['Laguna anaeróbica', 'Almacenaje sólidos', 'Sin manejo', 'Separación sólidos/líquidos'],
+        'separation_efficiency': [None, None, None, 60]
+    })
+    mcf = confined_mcf(effluents, _factors('a', 'b', 'c'))
+
+    # (77 % × 4 h + 4 % × 4 h) / 8 h
+    assert mcf['a'] == pytest.approx(0.405)
+    # Separation: 60 % to solid storage (4 %), 40 % to liquid (35 %)
+    assert mcf['b'] == pytest.approx(0.6 * 0.04 + 0.4 * 0.35)
+    # No effluent rows: open corral
+    assert mcf['c'] == pytest.approx(0.015)
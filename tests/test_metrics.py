@@ -0,0 +1,56 @@
+import uuid
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import select
+import database as db
+import metrics
+
+def _import(section, df):
+    session = db.get_session()
+    try:
+        db.upsert_records(session, section, db.frame_to_records(db.map_section_frame(section, df)))
+        session.commit()
+    finally:
+        session.close()
+
+def _new_farm(name):
+    farm_id = str(uuid.uuid4())
+    _import('datos_generales', pd.DataFrame({'uuid': [farm_id], 'nombre_tambo': [name]}))
+    return farm_id
+
+def _herd(farm_id, animals):
+    return pd.DataFrame({'farm_id': farm_id, 'categoría': 'Vacas en Ordeñe', 'número_animales': [animals], 'peso_promedio': [500.0]})
+
+def _dirty(farm_id):
+    session = db.get_session()
+    try:
+        rows = session.execute(
+            select(db.DerivedMetric.metric, db.DerivedMetric.dirty).where(db.DerivedMetric.farm_id == farm_id)
+        ).all()
+    finally:
+        session.close()
+    return {metric for metric, dirty in rows if dirty}
+
+def test_farm_without_herd_rows_gets_empty_herd_metrics():
+    farm_id = _new_farm("Tambo sin rebaño")
+    values = metrics.get_farm_metrics(farm_id, ['animales', 'peso_total_rebano', 'consumo_ms_rebano'])
+    assert values.dtype == float
+    assert values.isna().all()
+
+def test_section_write_marks_dependent_metrics_dirty_and_they_are_recomputed():
+    farm_id = _new_farm("Tambo métricas")
+    _import('rebano', _herd(farm_id, 10))
+    assert metrics.get_farm_metrics(farm_id)['animales'] == 10
+    assert _dirty(farm_id) == set()
+
+    _import('rebano', _herd(farm_id, 15))
+    # Only the metrics that read the herd (or every section) go stale
+    dirty = _dirty(farm_id)
+    assert {'animales', 'peso_total_rebano', 'consumo_ms_rebano', 'completitud'} <= dirty
+    assert 'fpcm_kg' not in dirty
+
+    values = metrics.get_farm_metrics(farm_id)
+    assert values['animales'] == 25
+    assert values['peso_total_rebano'] == pytest.approx(25 * 500.0)
+    assert _dirty(farm_id) == set()
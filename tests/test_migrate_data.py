@@ -0,0 +1,112 @@
+import os
+import uuid
+import pandas as pd
+import pytest
+import database as db
+import migrate_data
+
+def _farm_rows(prefix, count):
+    return pd.DataFrame({
+        'uuid': [str(uuid.uuid4()) for _ in range(count)],
+        'nombre_tambo': [f"{prefix} {i}" for i in range(count)],
+        'vacas_ordeñe': [100 + i for i in range(count)]
+    })
+
+def _farm_count(prefix):
+    session = db.get_session()
+    try:
+        return session.query(db.Farm).filter(db.Farm.name.like(f"{prefix} %")).count()
+    finally:
+        session.close()
+
+def test_interrupted_csv_import_resumes_and_completed_file_is_skipped(tmp_path, monkeypatch):
+    prefix = f"Reanudar {uuid.uuid4().hex[:8]}"
+    csv_path = tmp_path / 'datos_generales.csv'
+    _farm_rows(prefix, 5).to_csv(csv_path, index=False)
+
+    # Fail on the second chunk: the first one stays committed with its checkpoint
+    upsert_records = db.upsert_records
+    calls = []
+    def failing_upsert(*args, **kwargs):
+        calls.append(1)
+        if len(calls) == 2:
+            raise RuntimeError("connection lost")
+        return upsert_records(*args, **kwargs)
+    monkeypatch.setattr(db, 'upsert_records', failing_upsert)
+
+    with pytest.raises(RuntimeError):
+        migrate_data.import_csv(str(csv_path), 'datos_generales', chunksize=2)
+    assert _farm_count(prefix) == 2
+
+    session = db.get_session()
+    checkpoint = migrate_data.get_checkpoint(session, str(csv_path))
+    session.close()
+    assert checkpoint.rows_done == 2 and not checkpoint.completed
+
+    monkeypatch.setattr(db, 'upsert_records', upsert_records)
+    imported, last_farm_id = migrate_data.import_csv(str(csv_path), 'datos_generales', chunksize=2)
+    assert imported == 3
+    assert last_farm_id is not None
+    assert _farm_count(prefix) == 5
+
+    # A completed, unchanged file is not read again
+    assert migrate_data.import_csv(str(csv_path), 'datos_generales', chunksize=2) == (0, None)
+    assert _farm_count(prefix) == 5
+
+def test_changed_csv_is_imported_again(tmp_path):
+    prefix = f"Cambiado {uuid.uuid4().hex[:8]}"
+    csv_path = tmp_path / 'datos_generales.csv'
+    _farm_rows(prefix, 2).to_csv(csv_path, index=False)
+    migrate_data.import_csv(str(csv_path), 'datos_generales')
+
+    _farm_rows(prefix, 3).to_csv(csv_path, index=False)
+    stat = os.stat(csv_path)
+    os.utime(csv_path, (stat.st_atime, stat.st_mtime + 10))
+    imported, _ = migrate_data.import_csv(str(csv_path), 'datos_generales')
+    assert imported == 3
+
+def _farm_folder(farms_dir, name, animals):
+    folder = farms_dir / name
+    folder.mkdir()
+    farm_id = str(uuid.uuid4())
+    pd.DataFrame({'uuid': [farm_id], 'nombre_tambo': [name]}).to_csv(folder / 'datos_generales.csv', index=False)
+    pd.DataFrame({
+        'categoría': ['Vacas en Ordeñe'], 'número_animales': [animals], 'peso_promedio': [550.0]
+    }).to_csv(folder / 'rebano.csv', index=False)
+    return folder
+
+def _herd_animals(farm_name):
+    session = db.get_session()
+    try:
+        rows = session.query(db.Herd.animal_count).join(db.Farm).filter(db.Farm.name == farm_name).all()
+    finally:
+        session.close()
+    return sorted(count for count, in rows)
+
+def test_farm_folders_import_once_and_changed_folders_are_reimported(tmp_path, capsys):
+    tag = uuid.uuid4().hex[:8]
+    first = _farm_folder(tmp_path, f"Carpeta A {tag}", 40)
+    _farm_folder(tmp_path, f"Carpeta B {tag}", 60)
+    # A malformed folder is reported and the others still import
+    (tmp_path / 'sin_tambo').mkdir()
+    pd.DataFrame({'categoría': ['Vacas Secas']}).to_csv(tmp_path / 'sin_tambo' / 'rebano.csv', index=False)
+
+    migrate_data.migrate_farm_folders(str(tmp_path), workers=2)
+    assert _herd_animals(f"Carpeta A {tag}") == [40]
+    assert _herd_animals(f"Carpeta B {tag}") == [60]
+    assert migrate_data.pending_farm_folders(str(tmp_path)) == [str(tmp_path / 'sin_tambo')]
+
+    # Re-running only retries the folder that failed
+    capsys.readouterr()
+    migrate_data.migrate_farm_folders(str(tmp_path), workers=2)
+    output = capsys.readouterr().out
+    assert "sin_tambo: skipped" in output
+    assert "Migration completed! 0 farms (1 skipped)" in output
+    assert _herd_animals(f"Carpeta A {tag}") == [40]
+
+    pd.DataFrame({
+        'categoría': ['Vacas en Ordeñe'], 'número_animales': [45], 'peso_promedio': [550.0]
+    }).to_csv(first / 'rebano.csv', index=False)
+    stat = os.stat(first / 'rebano.csv')
+    os.utime(first / 'rebano.csv', (stat.st_atime, stat.st_mtime + 10))
+    assert migrate_data.pending_farm_folders(str(tmp_path)) == [str(first), str(tmp_path / 'sin_tambo')]
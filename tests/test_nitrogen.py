@@ -0,0 +1,31 @@
+import pandas as pd
+import pytest
+from emissions import DEFAULT_FACTORS
+from nitrogen import fertilizer_nitrogen
+
+def _factors(*farm_ids):
+    return pd.DataFrame([{key: value for key, (value, _) in DEFAULT_FACTORS.items()}] * len(farm_ids), index=list(farm_ids))
+
+def test_fertilizer_nitrogen_matches_tier1_by_hand():
+    fertilization = pd.DataFrame([
+        # 80 % of 50 ha at 100 kg/ha = 4000 kg of urea, 46 % N = 1840 kg N, protected
+        {'farm_id': 'a', 'type': 'Urea', 'hectares': 50, 'area_percentage': 80, 'applied_quantity_kg_ha': 100,
+         'applied_quantity_total': None, 'use_inhibitors': 'No', 'protected_urea': 'Sí', 'n_adjustment': 'No'},
+        # 1000 kg in total of NPK, 15 % N = 150 kg N, with nitrification inhibitors
+        {'farm_id': 'a', 'type': 'NPK', 'hectares': 10, 'area_percentage': None, 'applied_quantity_kg_ha': 500,
+         'applied_quantity_total': 1000, 'use_inhibitors': 'Sí', 'protected_urea': 'No', 'n_adjustment': 'No'}
+    ])
+    urea, npk = fertilizer_nitrogen(fertilization, _factors('a')).itertuples(index=False)
+
+    assert urea.n_kg == pytest.approx(1840.0)
+    # Volatilization 15 % halved by the protection, leaching 24 %
+    assert urea.n_volatilized_kg == pytest.approx(138.0)
+    assert urea.n_leached_kg == pytest.approx(441.6)
+    # kg N2O-N × 44/28 × GWP 273 = kg N2O-N × 429 kg CO2e
+    assert urea.direct_co2e_kg == pytest.approx(18.4 * 429)
+    assert urea.indirect_co2e_kg == pytest.approx((138.0 * 0.01 + 441.6 * 0.011) * 429)
+
+    assert npk.n_kg == pytest.approx(150.0)
+    # Inhibitors cut the 1 % direct emission factor by 35 %
+    assert npk.direct_co2e_kg == pytest.approx(150.0 * 0.0065 * 429)
+    assert npk.indirect_co2e_kg == pytest.approx((150.0 * 0.11 * 0.01 + 150.0 * 0.24 * 0.011) * 429)
@@ -0,0 +1,66 @@
+import datetime
+import uuid
+import zipfile
+import pandas as pd
+import database as db
+import parquet_io
+
+def _import(section, df):
+    session = db.get_session()
+    try:
+        db.upsert_records(session, section, db.frame_to_records(db.map_section_frame(section, df)))
+        session.commit()
+    finally:
+        session.close()
+
+def _stored_herd(farm_id):
+    session = db.get_session()
+    try:
+        rows = session.query(db.Herd.id, db.Herd.category, db.Herd.animal_count, db.Herd.average_weight, db.Herd.created_at).filter(
+            db.Herd.farm_id == farm_id
+        ).order_by(db.Herd.id).all()
+    finally:
+        session.close()
+    return [tuple(row) for row in rows]
+
+def _delete_farm(farm_id):
+    session = db.get_session()
+    session.query(db.Herd).filter(db.Herd.farm_id == farm_id).delete()
+    session.query(db.Farm).filter(db.Farm.id == farm_id).delete()
+    session.commit()
+    session.close()
+
+def test_parquet_export_and_import_round_trip_keeps_rows_and_timestamps(tmp_path):
+    farm_id = str(uuid.uuid4())
+    _import('datos_generales', pd.DataFrame({'uuid': [farm_id], 'nombre_tambo': ["Tambo Parquet"], 'vacas_ordeñe': [120]}))
+    _import('rebano', pd.DataFrame({
+        'uuid': [str(uuid.uuid4()), str(uuid.uuid4())],
+        'farm_id': farm_id,
+        'categoría': ['Vacas en Ordeñe', 'Vaquillonas'],
+        'número_animales': [120, 35],
+        'peso_promedio': [560.0, None]
+    }))
+    herd = _stored_herd(farm_id)
+
+    zip_path = parquet_io.build_parquet_zip(str(tmp_path / 'export.zip'))
+    with zipfile.ZipFile(zip_path) as zf:
+        zf.extractall(tmp_path / 'dataset')
+    root = str(tmp_path / 'dataset')
+
+    # Columns keep the types of the model
+    exported = parquet_io.read_section(root, 'rebano')
+    exported = exported[exported['farm_id'] == farm_id]
+    assert len(exported) == 2
+    assert exported['número_animales'].dtype == 'int64'
+    assert exported['peso_promedio'].isna().sum() == 1
+    assert isinstance(exported['created_at'].iloc[0], (pd.Timestamp, datetime.datetime))
+
+    _delete_farm(farm_id)
+    assert parquet_io.import_parquet(root) == 3
+    assert _stored_herd(farm_id) == herd
+    session = db.get_session()
+    assert db.get_farm_ids_by_name(session)["Tambo Parquet"] == farm_id
+    session.close()
+
+    # Importing the same dataset again writes nothing
+    assert parquet_io.import_parquet(root) == 0
@@ -0,0 +1,46 @@
+import uuid
+import pandas as pd
+import pytest
+import database as db
+from kpis import get_farm_kpis
+from scenarios import scenario_grid, run_sweep
+
+def _import(section, df):
+    session = db.get_session()
+    try:
+        db.upsert_records(session, section, db.frame_to_records(db.map_section_frame(section, df)))
+        session.commit()
+    finally:
+        session.close()
+
+def test_current_scenario_equals_stored_footprint():
+    farm_id = str(uuid.uuid4())
+    _import('datos_generales', pd.DataFrame({
+        'uuid': [farm_id], 'nombre_tambo': ['Tambo escenarios'], 'sup_total': [200.0], 'vacas_ordeñe': [100],
+        'produccion_ind': [22.0], 'porcentaje_grasa': [3.6], 'porcentaje_proteina': [3.2]
+    }))
+    _import('rebano', pd.DataFrame({
+        'farm_id': farm_id, 'categoría': ['Vacas en Ordeñe', 'Vaquillonas'], 'número_animales': [100, 40],
+        'peso_promedio': [580.0, 350.0], 'horas_pastoreo': [8, 20], 'dieta_materia_seca': [19.0, 8.0],
+        'porcentaje_pastura': [60, 90], 'porcentaje_concentrado': [40, 10], 'porcentaje_otros': [0, 0]
+    }))
+    _import('fertilizacion', pd.DataFrame({
+        'farm_id': [farm_id], 'tipo': ['Urea'], 'hectareas': [80.0], 'cantidad_aplicada_kg_ha': [120.0],
+        'uso_inhibidores': ['No'], 'urea_protegida': ['Sí']
+    }))
+    _import('energia', pd.DataFrame({
+        'farm_id': [farm_id], 'consumo_diesel': [3000.0], 'consumo_electricidad': [45000.0], 'uso_biodigestores': ['Sí']
+    }))
+    _import('efluentes', pd.DataFrame({
+        'farm_id': [farm_id], 'sector': ['Corral'], 'horas_dia': [4], 'manejo_excretas': ['Laguna anaeróbica']
+    }))
+
+    stored = get_farm_kpis([farm_id]).loc[farm_id]
+    results = run_sweep(farm_id, scenario_grid(solar_kw=[0, 50], biodigester=[False, True]))
+
+    current = results.iloc[0]
+    assert current['scenario'] == "Actual"
+    assert current['co2e_kg'] == pytest.approx(stored['co2e_kg'], rel=1e-9)
+    assert current['co2e_per_kg_fpcm'] == pytest.approx(stored['co2e_per_kg_fpcm'], rel=1e-9)
+    # The scenario without any lever is the current situation
+    assert results['co2e_kg'].iloc[1] == pytest.approx(current['co2e_kg'])
@@ -0,0 +1,51 @@
+import os
+import shutil
+import pytest
+from sqlalchemy import create_engine, select, func
+from sqlalchemy.orm import sessionmaker
+import database as db
+
+BASELINE_DB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'fieldlens.db')
+
+@pytest.fixture
+def baseline_db(tmp_path, monkeypatch):
+    """A copy of the shipped database, opened as the app's database"""
+    path = tmp_path / 'fieldlens.db'
+    shutil.copy(BASELINE_DB, path)
+    engine = create_engine(f"sqlite:///{path}")
+    monkeypatch.setattr(db, 'engine', engine)
+    monkeypatch.setattr(db, 'Session', sessionmaker(bind=engine))
+    yield engine
+    engine.dispose()
+
+def test_create_tables_counts_baseline_data(baseline_db):
+    db.create_tables()
+
+    session = db.get_session()
+    try:
+        farms = session.scalar(select(func.count(db.Farm.id)))
+    finally:
+        session.close()
+    counts = db.get_completeness()
+    assert farms > 0
+    assert len(counts) == farms
+    assert (counts['datos_generales'] == 1).all()
+    assert db.get_data_version()[0] > 0
+
+def test_create_tables_backfills_missing_states(baseline_db):
+    db.create_tables()
+    session = db.get_session()
+    try:
+        session.execute(db.SectionState.__table__.delete().where(db.SectionState.section == 'fertilizacion'))
+        session.commit()
+        assert db.has_uncounted_sections(session)
+    finally:
+        session.close()
+
+    db.create_tables()
+    session = db.get_session()
+    try:
+        assert not db.has_uncounted_sections(session)
+    finally:
+        session.close()
+    assert db.get_completeness()['fertilizacion'].sum() > 0
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+from uncertainty import simulate_footprints, sample_multipliers
+
+def _farms():
+    emissions = pd.DataFrame({
+        'farm_id': ['a', 'a', 'a', 'b', 'b'],
+        'source': ['diesel', 'ch4_enterico', 'n2o_directo', 'electricidad', 'ch4_enterico'],
+        'co2e_kg': [10000.0, 250000.0, 40000.0, 5000.0, 80000.0]
+    })
+    kpis = pd.DataFrame({
+        'milk_liters': [1000000.0, np.nan],
+        'fpcm_kg': [1040000.0, np.nan]
+    }, index=pd.Index(['a', 'b'], name='farm_id'))
+    return emissions, kpis
+
+def _band(result, farm_id, metric):
+    return result[(result['farm_id'] == farm_id) & (result['metric'] == metric)].iloc[0]
+
+@pytest.mark.parametrize('distribution, uncertainty', [('normal', 20), ('lognormal', 150)])
+def test_multipliers_have_mean_one(distribution, uncertainty):
+    values = sample_multipliers(np.random.default_rng(1), distribution, uncertainty, 200000)
+    assert values.min() >= 0
+    assert values.mean() == pytest.approx(1.0, abs=0.02)
+
+def test_same_seed_gives_the_same_bands():
+    emissions, kpis = _farms()
+    first = simulate_footprints(emissions, kpis, draws=2000, seed=42)
+    assert first.equals(simulate_footprints(emissions, kpis, draws=2000, seed=42))
+    assert not first.equals(simulate_footprints(emissions, kpis, draws=2000, seed=7))
+
+def test_band_contains_the_point_estimate():
+    emissions, kpis = _farms()
+    result = simulate_footprints(emissions, kpis, draws=20000, seed=0)
+
+    total = _band(result, 'a', 'co2e_kg')
+    assert total['p2.5'] < 300000.0 < total['p97.5']
+    assert total['mean'] == pytest.approx(300000.0, rel=0.02)
+
+    intensity = _band(result, 'a', 'co2e_per_kg_fpcm')
+    assert intensity['p2.5'] < 300000.0 / 1040000.0 < intensity['p97.5']
+
+def test_farm_without_milk_has_a_total_band_but_no_intensity():
+    emissions, kpis = _farms()
+    result = simulate_footprints(emissions, kpis, draws=1000, seed=0)
+
+    assert _band(result, 'b', 'co2e_kg')['p50'] > 0
+    assert _band(result, 'b', 'co2e_per_liter')[['mean', 'p2.5', 'p50', 'p97.5']].isna().all()
+
+def test_no_farms_gives_an_empty_frame():
+    emissions, kpis = _farms()
+    result = simulate_footprints(emissions.iloc[:0], kpis.iloc[:0], draws=100, seed=0)
+    assert result.empty
+    assert list(result.columns) == ['farm_id', 'metric', 'mean', 'p2.5', 'p50', 'p97.5']
@@ -0,0 +1,59 @@
+import uuid
+import pandas as pd
+from sqlalchemy import select, func
+import database as db
+
+def _transport_frame(farm_id, routes):
+    return pd.DataFrame({'farm_id': farm_id, 'tipo_vehiculo': 'Camión', 'distancia_km': routes})
+
+def _stored_rows(farm_id):
+    session = db.get_session()
+    try:
+        return session.scalar(select(func.count()).select_from(db.Transport).where(db.Transport.farm_id == farm_id))
+    finally:
+        session.close()
+
+def _import(section, df, claimed=None):
+    session = db.get_session()
+    try:
+        result = db.upsert_records(session, section, db.frame_to_records(db.map_section_frame(section, df)), claimed)
+        session.commit()
+        return result
+    finally:
+        session.close()
+
+def test_repeated_rows_without_ids_are_kept_and_reimport_is_idempotent():
+    farm_id = str(uuid.uuid4())
+    _import('datos_generales', pd.DataFrame({'uuid': [farm_id], 'nombre_tambo': ['Tambo upsert']}))
+    routes = _transport_frame(farm_id, [12.5, 12.5, 30.0])
+
+    first = _import('transporte', routes)
+    assert first['inserted'] == 3
+    assert _stored_rows(farm_id) == 3
+
+    again = _import('transporte', routes)
+    assert again['inserted'] == 0 and again['duplicates'] == 3
+    assert _stored_rows(farm_id) == 3
+
+    # One more identical route than stored is a new row
+    more = _import('transporte', _transport_frame(farm_id, [12.5, 12.5, 12.5]))
+    assert more['inserted'] == 1 and more['duplicates'] == 2
+
+def test_rows_with_ids_are_matched_by_id_only():
+    farm_id = str(uuid.uuid4())
+    _import('datos_generales', pd.DataFrame({'uuid': [farm_id], 'nombre_tambo': ['Tambo ids']}))
+    routes = _transport_frame(farm_id, [50.0, 50.0]).assign(uuid=[str(uuid.uuid4()), str(uuid.uuid4())])
+
+    assert _import('transporte', routes)['inserted'] == 2
+    result = _import('transporte', routes)
+    assert result['skipped'] == 2 and result['inserted'] == 0
+    assert _stored_rows(farm_id) == 2
+
+def test_claimed_rows_are_not_matched_by_a_later_batch():
+    farm_id = str(uuid.uuid4())
+    _import('datos_generales', pd.DataFrame({'uuid': [farm_id], 'nombre_tambo': ['Tambo chunks']}))
+    claimed = set()
+    _import('transporte', _transport_frame(farm_id, [8.0]), claimed)
+    # The same route again in the next chunk of the same file is another row
+    assert _import('transporte', _transport_frame(farm_id, [8.0]), claimed)['inserted'] == 1
+    assert _stored_rows(farm_id) == 2
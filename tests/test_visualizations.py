@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pytest
+import visualizations as viz
+
+def test_lttb_keeps_endpoints_and_peaks():
+    x = np.arange(10000, dtype=float)
+    y = np.zeros(10000)
+    y[3333] = 50.0
+    y[7777] = -20.0
+
+    kept = viz.lttb_indices(x, y, 100)
+    assert len(kept) == 100
+    assert kept[0] == 0 and kept[-1] == 9999
+    assert np.all(np.diff(kept) > 0)
+    # Spikes a uniform stride would miss survive
+    assert {3333, 7777} <= set(kept)
+
+def test_lttb_returns_every_point_when_under_the_threshold():
+    x = np.arange(50, dtype=float)
+    assert np.array_equal(viz.lttb_indices(x, x, 100), np.arange(50))
+
+def test_downsample_series_thins_datetime_series_and_drops_missing_values():
+    n = 10000
+    data = pd.DataFrame({
+        'fecha': pd.date_range('2024-01-01', periods=n, freq='h'),
+        'litros': np.sin(np.arange(n) / 100.0)
+    })
+    data.loc[10, 'litros'] = np.nan
+
+    thinned = viz.downsample_series(data, 'fecha', 'litros', max_points=500)
+    assert len(thinned) == 500
+    assert thinned['litros'].notna().all()
+    assert thinned['fecha'].is_monotonic_increasing
+    assert thinned['litros'].max() == pytest.approx(1.0, abs=1e-3)
+
+    # Short or non-numeric series are drawn as they are
+    assert len(viz.downsample_series(data.head(100), 'fecha', 'litros', max_points=500)) == 100
+    labels = data.assign(fecha=data['fecha'].astype(str))
+    assert len(viz.downsample_series(labels, 'fecha', 'litros', max_points=500)) == n
+
+def test_bin_scatter_averages_points_per_cell_and_color():
+    rng = np.random.default_rng(0)
+    n = 50000
+    data = pd.DataFrame({
+        'area': rng.uniform(0, 100, n),
+        'vacas': rng.uniform(0, 500, n),
+        'raza': rng.choice(['Holando', 'Jersey'], n)
+    })
+
+    binned = viz.bin_scatter(data, 'area', 'vacas', color='raza', bins=20)
+    assert len(binned) <= 20 * 20 * 2
+    assert set(binned['raza']) == {'Holando', 'Jersey'}
+    assert binned['area'].between(0, 100).all()
+    assert binned['vacas'].mean() == pytest.approx(data['vacas'].mean(), rel=0.05)
+
+def test_large_charts_use_webgl_with_a_bounded_point_count():
+    n = viz.MAX_SCATTER_POINTS + 1000
+    data = pd.DataFrame({'x': np.arange(n, dtype=float), 'y': np.cos(np.arange(n) / 50.0)})
+
+    line = viz.create_line_chart(data, 'x', 'y', "Serie")
+    assert line.data[0].type == 'scattergl'
+    assert len(line.data[0].x) == viz.MAX_LINE_POINTS
+
+    scatter = viz.create_scatter_plot(data, 'x', 'y', "Dispersión")
+    assert scatter.data[0].type == 'scattergl'
+    assert len(scatter.data[0].x) <= viz.SCATTER_BINS ** 2
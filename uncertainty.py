@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+from kpis import get_farm_kpis, get_farm_emissions
+
+# Uncertainty of the emission factor behind each source: (distribution, ±% of the mean at 95%)
+# One value per draw is shared by all farms, since they use the same factor sets
+FACTOR_UNCERTAINTY = {
+    'diesel': ('normal', 5),
+    'gasolina': ('normal', 5),
+    'gnc': ('normal', 7),
+    'electricidad': ('normal', 15),
+    'transporte': ('normal', 25),
+    'ch4_enterico': ('normal', 20),
+    'ch4_estiercol': ('normal', 30),
+    'n2o_directo': ('lognormal', 150),
+    'n2o_indirecto': ('lognormal', 200)
+}
+
+# Uncertainty of the reported inputs: (distribution, ±% of the mean at 95%)
+# Drawn per farm and draw; sources computed from the same input move together
+INPUT_UNCERTAINTY = {
+    'energia': ('normal', 5),
+    'transporte': ('normal', 15),
+    'rebano': ('normal', 10),
+    'fertilizacion': ('normal', 10),
+    'leche': ('normal', 5)
+}
+
+# Reported input each source is computed from
+SOURCE_INPUTS = {
+    'diesel': 'energia',
+    'gasolina': 'energia',
+    'gnc': 'energia',
+    'electricidad': 'energia',
+    'transporte': 'transporte',
+    'ch4_enterico': 'rebano',
+    'ch4_estiercol': 'rebano',
+    'n2o_directo': 'fertilizacion',
+    'n2o_indirecto': 'fertilizacion'
+}
+
+DEFAULT_DRAWS = 5000
+DEFAULT_PERCENTILES = (2.5, 50, 97.5)
+
+# Farms simulated at once; memory grows with FARM_CHUNK × draws
+FARM_CHUNK = 100
+
+def sample_multipliers(rng, distribution, uncertainty, size):
+    """Random multipliers with mean 1 for a ±uncertainty % (95%) relative error
+
+    Normal multipliers are clipped at zero; lognormal ones suit skewed
+    factors whose range is wider than the mean (e.g. N2O).
+    """
+    cv = uncertainty / 196
+    if distribution == 'lognormal':
+        sigma = np.sqrt(np.log1p(cv ** 2))
+        return rng.lognormal(-sigma ** 2 / 2, sigma, size)
+    return np.maximum(rng.normal(1.0, cv, size), 0.0)
+
+def simulate_footprints(emissions, kpis, draws=DEFAULT_DRAWS, seed=None, percentiles=DEFAULT_PERCENTILES, farm_chunk=FARM_CHUNK):
+    """Monte Carlo bands of total emissions and footprint intensities per farm
+
+    emissions is the long frame of stored emissions and kpis the stored KPIs
+    (indexed by farm id). Every source is scaled by a factor multiplier
+    (shared by all farms in a draw) and an input multiplier (per farm and
+    draw), then the farms × draws matrices are summed and divided by the
+    simulated milk. Farms are processed in chunks so memory stays bounded
+    for any number of farms and draws; results are reproducible for the same
+    seed and chunk size.
+
+    Returns one row per farm and metric with the mean and the percentiles.
+    """
+    rng = np.random.default_rng(seed)
+    by_source = emissions.pivot_table(index='farm_id', columns='source', values='co2e_kg', aggfunc='sum')
+    by_source = by_source.reindex(index=kpis.index, columns=list(SOURCE_INPUTS)).fillna(0)
+
+    # Factor draws are common to every farm chunk
+    factor_draws = {
+        source: sample_multipliers(rng, *FACTOR_UNCERTAINTY[source], draws)
+        for source in SOURCE_INPUTS
+    }
+
+    milk = kpis['milk_liters'].astype(float).to_numpy()
+    fpcm_ratio = (kpis['fpcm_kg'].astype(float) / kpis['milk_liters'].astype(float)).to_numpy()
+    quantiles = np.array(percentiles) / 100
+
+    frames = []
+    for start in range(0, len(kpis), farm_chunk):
+        chunk = slice(start, start + farm_chunk)
+        farms = len(kpis.index[chunk])
+        input_draws = {
+            name: sample_multipliers(rng, distribution, uncertainty, (farms, draws))
+            for name, (distribution, uncertainty) in INPUT_UNCERTAINTY.items()
+        }
+
+        total = np.zeros((farms, draws))
+        for source, input_name in SOURCE_INPUTS.items():
+            base = by_source[source].to_numpy()[chunk, None]
+            total += base * factor_draws[source][None, :] * input_draws[input_name]
+
+        # Milk volume error scales both milk and FPCM; the composition is kept
+        liters = milk[chunk, None] * input_draws['leche']
+        with np.errstate(divide='ignore', invalid='ignore'):
+            per_liter = total / liters
+            per_fpcm = per_liter / fpcm_ratio[chunk, None]
+
+        for metric, values in [('co2e_kg', total), ('co2e_per_liter', per_liter), ('co2e_per_kg_fpcm', per_fpcm)]:
+            bands = np.quantile(values, quantiles, axis=1).T
+            frame = pd.DataFrame(bands, columns=[f"p{percentile:g}" for percentile in percentiles])
+            frame.insert(0, 'mean', values.mean(axis=1))
+            frame.insert(0, 'metric', metric)
+            frame.insert(0, 'farm_id', kpis.index[chunk])
+            frames.append(frame)
+
+    if not frames:
+        return pd.DataFrame(columns=['farm_id', 'metric', 'mean'] + [f"p{percentile:g}" for percentile in percentiles])
+    result = pd.concat(frames, ignore_index=True)
+    # Intensities without milk data have no band
+    return result.replace([np.inf, -np.inf], np.nan)
+
+def farm_uncertainty(farm_ids=None, draws=DEFAULT_DRAWS, seed=None, percentiles=DEFAULT_PERCENTILES):
+    """Footprint percentile bands of some farms (all farms by default) from their stored emissions and KPIs"""
+    kpis = get_farm_kpis(farm_ids)
+    emissions = get_farm_emissions(farm_ids)
+    return simulate_footprints(emissions, kpis, draws=draws, seed=seed, percentiles=percentiles)
@@ -5,6 +5,20 @@ import uuid
 import re
 import database as db
 
+# Display name of each section, in form order
+SECTION_TITLES = {
+    'datos_generales': "Datos Generales",
+    'superficies_insumos': "Superficies e Insumos",
+    'manejo': "Manejo y Recursos",
+    'fertilizacion': "Fertilización",
+    'proteccion_cultivos': "Protección de Cultivos",
+    'riego': "Riego / Uso de Agua",
+    'energia': "Energía",
+    'rebano': "Rebaño",
+    'efluentes': "Gestión de Efluentes",
+    'transporte': "Transporte"
+}
+
 def save_dataframe(df, filename):
     """Save a dataframe to the database based on filename"""
     # Map filename to the appropriate database function
@@ -64,12 +78,9 @@ def load_dataframe(filename):
     if filename == "datos_generales.csv":
         return db.get_farm_data()
     
-    # For other files, filter by current farm if one is selected
-    if "farm_id" in st.session_state:
-        farm_id = st.session_state.farm_id
-    else:
-        farm_id = None
-        
+    # Other files show the same farm as the data grid: the selected one, or the latest
+    farm_id = get_current_farm_id()
+    
     # Map filename to the appropriate database function
     file_to_func = {
         'datos_generales.csv': db.get_farm_data,
@@ -87,7 +98,7 @@ def load_dataframe(filename):
     # Get the appropriate database function
     db_func = file_to_func.get(filename)
     if db_func:
-        return db_func()
+        return db_func(farm_id)
     
     # Fallback to file-based storage for backward compatibility
     file_path = os.path.join("data", filename)
@@ -95,6 +106,26 @@ def load_dataframe(filename):
         return pd.read_csv(file_path)
     return pd.DataFrame()
 
+def get_current_farm_id():
+    """Id of the farm selected in the session, or the most recent farm"""
+    return st.session_state.get('farm_id') or db.get_latest_farm_id()
+
+def get_farm_completeness():
+    """Completed sections, missing sections and a status badge for every farm"""
+    completeness = db.get_completeness()
+    farms = pd.DataFrame(db.list_farms(), columns=['farm_id', 'Establecimiento']).set_index('farm_id')
+    has_data = completeness.reindex(farms.index, fill_value=0) > 0
+    
+    farms['Secciones'] = has_data.sum(axis=1)
+    missing = pd.Series('', index=farms.index)
+    for section, title in SECTION_TITLES.items():
+        missing = missing + (~has_data[section]).map({True: title + ", ", False: ""})
+    farms['Faltan'] = missing.str.rstrip(", ")
+    farms['Estado'] = "🟡 Parcial"
+    farms.loc[farms['Secciones'] == len(SECTION_TITLES), 'Estado'] = "✅ Completo"
+    farms.loc[farms['Secciones'] <= 1, 'Estado'] = "🔴 Sin datos"
+    return farms[['Estado', 'Establecimiento', 'Secciones', 'Faltan']]
+
 def validate_numeric(value, min_val=None, max_val=None, allow_empty=False):
     """Validate if a value is numeric and within range"""
     if allow_empty and (value == "" or value is None):
@@ -148,9 +179,9 @@ def format_filename(farm_name):
     # Remove special characters, replace spaces with underscores
     return re.sub(r'[^\w\s]', '', farm_name).replace(' ', '_').lower()
 
-def get_all_data():
+def get_all_data(farm_id=None):
     """Get all data from database"""
-    return db.get_all_data()
+    return db.get_all_data(farm_id)
 
 def check_data_exists():
     """Check if any data has been collected"""
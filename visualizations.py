@@ -2,8 +2,67 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
+import plotly.io as pio
 import numpy as np
-from utils import load_dataframe
+import functools
+import hashlib
+import threading
+from collections import OrderedDict
+from utils import load_dataframe, get_current_farm_id
+from emissions import ENERGY_SOURCES, SOURCE_LABELS
+from kpis import get_farm_kpis, get_farm_emissions, KPI_LABELS, SOURCE_GROUPS
+from uncertainty import farm_uncertainty, DEFAULT_DRAWS
+from scenarios import scenario_grid, run_sweep, SCENARIO_PARAMETERS
+from benchmarking import benchmark_farm
+
+# Above this many points charts are drawn with WebGL instead of SVG
+WEBGL_POINT_THRESHOLD = 5000
+
+# Point budgets: line series are thinned with LTTB, scatter plots binned on a grid
+MAX_LINE_POINTS = 2000
+MAX_SCATTER_POINTS = 20000
+SCATTER_BINS = 150
+
+# Serialized figures kept in memory, shared by all sessions (least recently used dropped first)
+FIGURE_CACHE_SIZE = 256
+_figure_cache = OrderedDict()
+_figure_cache_lock = threading.Lock()
+
+def _fingerprint(value):
+    """Fast content hash of a chart argument (dataframes are hashed by their values)"""
+    if isinstance(value, pd.DataFrame):
+        digest = hashlib.sha1(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+        digest.update(repr([(str(col), str(dtype)) for col, dtype in value.dtypes.items()]).encode('utf-8'))
+        return digest.hexdigest()
+    return repr(value)
+
+def cached_figure(build):
+    """Memoize a figure builder as figure JSON keyed by its data and parameters"""
+    @functools.wraps(build)
+    def wrapper(*args, **kwargs):
+        try:
+            key = (build.__name__,) + tuple(_fingerprint(arg) for arg in args) + tuple(
+                (name, _fingerprint(value)) for name, value in sorted(kwargs.items())
+            )
+        except TypeError:
+            # Unhashable cell values (lists, dicts): build without caching
+            return build(*args, **kwargs)
+        
+        with _figure_cache_lock:
+            cached = _figure_cache.get(key)
+            if cached is not None:
+                _figure_cache.move_to_end(key)
+        if cached is not None:
+            return pio.from_json(cached)
+        
+        fig = build(*args, **kwargs)
+        with _figure_cache_lock:
+            _figure_cache[key] = fig.to_json()
+            _figure_cache.move_to_end(key)
+            while len(_figure_cache) > FIGURE_CACHE_SIZE:
+                _figure_cache.popitem(last=False)
+        return fig
+    return wrapper
 
 def generate_graph_color_palette(num_colors=10):
     """Generate a color palette for graphs"""
@@ -11,6 +70,69 @@ def generate_graph_color_palette(num_colors=10):
                    "#fa43c6", "#43faed", "#fa9c43", "#c6fa43", "#b243fa"]
     return base_colors[:num_colors]
 
+def lttb_indices(x, y, threshold):
+    """Indices of the points kept by Largest-Triangle-Three-Buckets downsampling"""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    
+    # First and last points are always kept; the rest is split into equal buckets
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    kept = np.empty(threshold, dtype=int)
+    kept[0] = 0
+    kept[-1] = n - 1
+    previous = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        # Average of the next bucket (the last point for the final bucket)
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        next_x = x[end:next_end].mean()
+        next_y = y[end:next_end].mean()
+        # Keep the point forming the largest triangle with the previous kept point
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        kept[i + 1] = previous
+    return kept
+
+def downsample_series(data, x, y, max_points=MAX_LINE_POINTS):
+    """Thin a line series with LTTB so its shape survives with fewer points"""
+    if len(data) <= max_points or not isinstance(y, str):
+        return data
+    x_values = data[x]
+    if pd.api.types.is_datetime64_any_dtype(x_values):
+        x_values = x_values.astype('int64')
+    elif not pd.api.types.is_numeric_dtype(x_values):
+        return data
+    
+    x_values = x_values.to_numpy(dtype=float)
+    y_values = pd.to_numeric(data[y], errors='coerce').to_numpy(dtype=float)
+    valid = ~(np.isnan(x_values) | np.isnan(y_values))
+    data = data[valid]
+    return data.iloc[lttb_indices(x_values[valid], y_values[valid], max_points)]
+
+def bin_scatter(data, x, y, size=None, color=None, bins=SCATTER_BINS):
+    """Aggregate a large scatter onto a grid: one averaged point per occupied cell (and color)"""
+    columns = list(dict.fromkeys(col for col in (x, y, size) if col is not None))
+    if not all(pd.api.types.is_numeric_dtype(data[col]) for col in columns):
+        return data
+    
+    # Continuous colors are averaged like the axes, categorical ones keep their own cells
+    group_color = color is not None and not pd.api.types.is_numeric_dtype(data[color])
+    if color is not None and not group_color and color not in columns:
+        columns.append(color)
+    
+    data = data.dropna(subset=[x, y]).assign(
+        _bin_x=lambda df: pd.cut(df[x], bins, labels=False, include_lowest=True),
+        _bin_y=lambda df: pd.cut(df[y], bins, labels=False, include_lowest=True)
+    )
+    keys = ['_bin_x', '_bin_y'] + ([color] if group_color else [])
+    binned = data.groupby(keys, observed=True, sort=False)[columns].mean().reset_index()
+    return binned.drop(columns=['_bin_x', '_bin_y'])
+
+@cached_figure
 def create_pie_chart(data, names, values, title):
     """Create a pie chart"""
     fig = px.pie(
@@ -30,6 +152,7 @@ def create_pie_chart(data, names, values, title):
     )
     return fig
 
+@cached_figure
 def create_bar_chart(data, x, y, title, orientation='v'):
     """Create a bar chart"""
     fig = px.bar(
@@ -49,14 +172,18 @@ def create_bar_chart(data, x, y, title, orientation='v'):
     )
     return fig
 
+@cached_figure
 def create_line_chart(data, x, y, title):
-    """Create a line chart"""
+    """Create a line chart (long series are downsampled and drawn with WebGL)"""
+    points = len(data)
+    data = downsample_series(data, x, y)
     fig = px.line(
         data, 
         x=x, 
         y=y, 
         title=title,
-        markers=True,
+        markers=len(data) <= WEBGL_POINT_THRESHOLD,
+        render_mode='webgl' if points > WEBGL_POINT_THRESHOLD else 'svg',
         color_discrete_sequence=generate_graph_color_palette()
     )
     fig.update_layout(
@@ -68,8 +195,12 @@ def create_line_chart(data, x, y, title):
     )
     return fig
 
+@cached_figure
 def create_scatter_plot(data, x, y, title, size=None, color=None):
-    """Create a scatter plot"""
+    """Create a scatter plot (large ones are binned and drawn with WebGL)"""
+    points = len(data)
+    if points > MAX_SCATTER_POINTS:
+        data = bin_scatter(data, x, y, size=size, color=color)
     fig = px.scatter(
         data, 
         x=x, 
@@ -77,6 +208,7 @@ def create_scatter_plot(data, x, y, title, size=None, color=None):
         title=title,
         size=size,
         color=color,
+        render_mode='webgl' if points > WEBGL_POINT_THRESHOLD else 'svg',
         color_discrete_sequence=generate_graph_color_palette()
     )
     fig.update_layout(
@@ -88,6 +220,7 @@ def create_scatter_plot(data, x, y, title, size=None, color=None):
     )
     return fig
 
+@cached_figure
 def create_gauge_chart(value, min_val, max_val, title, suffix=""):
     """Create a gauge chart"""
     fig = go.Figure(go.Indicator(
@@ -231,33 +364,29 @@ def visualize_energia():
         st.warning("Faltan datos de consumo energético para visualizar correctamente.")
         return
     
-    # Create energy consumption summary
+    # Create energy consumption summary (latest entry, like the emissions)
     energy_data = pd.DataFrame({
         'Tipo': ['Diesel (L)', 'Gasolina (L)', 'GNC (m³)', 'Electricidad (kWh)'],
         'Consumo': [
-            df['consumo_diesel'].iloc[0], 
-            df['consumo_gasolina'].iloc[0], 
-            df['consumo_GNC'].iloc[0], 
-            df['consumo_electricidad'].iloc[0]
+            df['consumo_diesel'].iloc[-1], 
+            df['consumo_gasolina'].iloc[-1], 
+            df['consumo_GNC'].iloc[-1], 
+            df['consumo_electricidad'].iloc[-1]
         ]
     })
     
     fig_energy = create_bar_chart(energy_data, 'Tipo', 'Consumo', 'Consumo Energético Anual')
     st.plotly_chart(fig_energy, use_container_width=True)
     
-    # Calculate approximate equivalent CO2 emissions
-    # These are rough conversion factors for illustration
+    # Equivalent CO2 emissions stored by the KPI pipeline (factor set of the farm)
+    emissions_df = get_farm_emissions([get_current_farm_id()])
+    emissions_df = emissions_df[emissions_df['source'].isin(list(ENERGY_SOURCES))]
     co2_data = pd.DataFrame({
-        'Fuente': ['Diesel', 'Gasolina', 'GNC', 'Electricidad'],
-        'CO2 (kg)': [
-            df['consumo_diesel'].iloc[0] * 2.68,  # kg CO2 per L of diesel
-            df['consumo_gasolina'].iloc[0] * 2.31,  # kg CO2 per L of gasoline
-            df['consumo_GNC'].iloc[0] * 1.86,  # kg CO2 per m³ of CNG
-            df['consumo_electricidad'].iloc[0] * 0.38  # kg CO2 per kWh (varies by country)
-        ]
+        'Fuente': emissions_df['source'].map(SOURCE_LABELS),
+        'CO2 (kg)': emissions_df['co2e_kg']
     })
     
-    fig_co2 = create_pie_chart(co2_data, 'Fuente', 'CO2 (kg)', 'Emisiones Aproximadas de CO2 por Fuente')
+    fig_co2 = create_pie_chart(co2_data, 'Fuente', 'CO2 (kg)', 'Emisiones de CO2 por Fuente')
     st.plotly_chart(fig_co2, use_container_width=True)
 
 def visualize_superficies():
@@ -290,3 +419,132 @@ def visualize_superficies():
             'Distribución de Área por Temporada'
         )
         st.plotly_chart(fig_season, use_container_width=True)
+
+def visualize_benchmarks():
+    """Show where the current farm stands against its peers for each KPI"""
+    results = benchmark_farm(get_current_farm_id())
+    if not results:
+        st.warning("No hay datos suficientes para comparar este tambo con otros.")
+        return
+    
+    columns = st.columns(len(results))
+    for column, result in zip(columns, results):
+        with column:
+            st.metric(result['label'], f"{result['value']:,.2f} {result['unit']}")
+            hint = ""
+            if result['higher_is_better'] is True:
+                hint = " · mayor es mejor"
+            elif result['higher_is_better'] is False:
+                hint = " · menor es mejor"
+            st.caption(f"P{result['percentile']:.0f} de {result['peer_group']} (n={result['peers']}){hint}")
+    
+    percentile_data = pd.DataFrame({
+        'Indicador': [result['label'] for result in results],
+        'Percentil': [result['percentile'] for result in results]
+    })
+    fig = create_bar_chart(percentile_data, 'Indicador', 'Percentil', 'Percentil frente a tambos comparables', orientation='h')
+    fig.update_xaxes(range=[0, 100])
+    st.plotly_chart(fig, use_container_width=True)
+
+@functools.lru_cache(maxsize=FIGURE_CACHE_SIZE)
+def footprint_band(farm_id, computed_at):
+    """95% band of a farm's footprint per kg FPCM from a seeded Monte Carlo
+
+    Keyed on the time the farm's KPIs were computed, so the simulation only
+    runs again after they change and the numbers are stable between reruns.
+    """
+    bands = farm_uncertainty([farm_id], seed=0).set_index('metric')
+    return bands.loc['co2e_per_kg_fpcm']
+
+def visualize_footprint():
+    """Carbon footprint of the current farm from its precomputed KPIs"""
+    farm_id = get_current_farm_id()
+    kpis = get_farm_kpis([farm_id])
+    if farm_id not in kpis.index or pd.isna(kpis.loc[farm_id, 'co2e_kg']):
+        st.warning("No hay datos suficientes para calcular la huella de carbono de este tambo.")
+        return
+    farm = kpis.loc[farm_id]
+    
+    col1, col2, col3, col4 = st.columns(4)
+    for column, kpi in zip([col1, col2, col3, col4], ['co2e_per_liter', 'co2e_per_kg_fpcm', 'co2e_per_ha', 'co2e_per_cow']):
+        label, unit = KPI_LABELS[kpi]
+        column.metric(label, f"{farm[kpi]:,.2f} {unit}" if pd.notna(farm[kpi]) else "-")
+    st.caption(
+        f"Emisiones totales: {farm['co2e_kg'] / 1000:,.1f} t CO2e/año · "
+        f"Leche: {farm['milk_liters']:,.0f} L/año · Todas las emisiones asignadas a la leche"
+        if pd.notna(farm['milk_liters']) else
+        f"Emisiones totales: {farm['co2e_kg'] / 1000:,.1f} t CO2e/año · Sin datos de producción de leche"
+    )
+    
+    band = footprint_band(farm_id, farm['computed_at'])
+    if pd.notna(band['p50']):
+        st.caption(
+            f"Incertidumbre (Monte Carlo, {DEFAULT_DRAWS} simulaciones): huella por kg FPCM entre "
+            f"{band['p2.5']:,.2f} y {band['p97.5']:,.2f} kg CO2e/kg FPCM (IC 95%)"
+        )
+    
+    components = pd.DataFrame({
+        'Componente': [KPI_LABELS[column][0].replace("Emisiones de ", "").capitalize() for column in SOURCE_GROUPS],
+        'kg CO2e': [farm[column] for column in SOURCE_GROUPS]
+    })
+    fig = create_pie_chart(components, 'Componente', 'kg CO2e', 'Emisiones por Componente')
+    st.plotly_chart(fig, use_container_width=True)
+    
+    emissions_df = get_farm_emissions([farm_id])
+    emissions_df = emissions_df[emissions_df['co2e_kg'] > 0]
+    sources = pd.DataFrame({
+        'Fuente': emissions_df['source'].map(SOURCE_LABELS),
+        'kg CO2e': emissions_df['co2e_kg']
+    })
+    fig = create_bar_chart(sources, 'Fuente', 'kg CO2e', 'Emisiones por Fuente', orientation='h')
+    st.plotly_chart(fig, use_container_width=True)
+
+def visualize_scenarios():
+    """What-if comparison of mitigation levers for the current farm"""
+    st.caption("Combine medidas de mitigación; se evalúan todas las combinaciones a la vez. La producción de leche se mantiene.")
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        solar_kw = st.multiselect("Paneles solares adicionales (kW)", [0, 10, 25, 50, 100, 200], default=[0, 25, 100], key="scenario_solar")
+    with col2:
+        biodigester = st.multiselect("Biodigestor nuevo", ["No", "Sí"], default=["No", "Sí"], key="scenario_biodigester")
+    with col3:
+        protected_urea = st.multiselect("Urea protegida (% de la urea)", [0, 25, 50, 75, 100], default=[0, 100], key="scenario_urea")
+    with col4:
+        concentrate = st.multiselect("Concentrado en vacas en ordeñe (%)", ["Actual", 20, 30, 40, 50], default=["Actual", 40], key="scenario_concentrate")
+    
+    if not (solar_kw and biodigester and protected_urea and concentrate):
+        st.info("Elija al menos un valor para cada medida.")
+        return
+    
+    grid = scenario_grid(
+        solar_kw=solar_kw,
+        biodigester=[option == "Sí" for option in biodigester],
+        protected_urea=protected_urea,
+        concentrate_share=[np.nan if option == "Actual" else option for option in concentrate]
+    )
+    results = run_sweep(get_current_farm_id(), grid)
+    if results is None:
+        st.warning("No hay datos suficientes para evaluar escenarios en este tambo.")
+        return
+    
+    # Best scenarios first, the current situation always on top
+    best = pd.concat([results.iloc[:1], results.iloc[1:].sort_values('co2e_kg').head(15)])
+    table = pd.DataFrame({
+        'Escenario': best['scenario'],
+        SCENARIO_PARAMETERS['solar_kw'][0]: best['solar_kw'],
+        SCENARIO_PARAMETERS['biodigester'][0]: best['biodigester'].map({True: "Sí", False: "No"}),
+        SCENARIO_PARAMETERS['protected_urea'][0]: best['protected_urea'],
+        SCENARIO_PARAMETERS['concentrate_share'][0]: best['concentrate_share'].map(lambda share: "Actual" if pd.isna(share) else f"{share:g}%"),
+        'Emisiones (t CO2e/año)': best['co2e_kg'] / 1000,
+        'Huella (kg CO2e/kg FPCM)': best['co2e_per_kg_fpcm'],
+        'Cambio (%)': best['change_pct']
+    })
+    st.markdown(f"**{len(grid)} escenarios evaluados** · mejores 15 frente a la situación actual")
+    st.dataframe(table, hide_index=True, use_container_width=True, column_config={
+        'Emisiones (t CO2e/año)': st.column_config.NumberColumn(format="%.1f"),
+        'Huella (kg CO2e/kg FPCM)': st.column_config.NumberColumn(format="%.3f"),
+        'Cambio (%)': st.column_config.NumberColumn(format="%.1f")
+    })
+    
+    fig = create_bar_chart(table.iloc[1:], 'Escenario', 'Cambio (%)', 'Cambio de Emisiones frente a la Situación Actual', orientation='h')
+    st.plotly_chart(fig, use_container_width=True)